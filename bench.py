@@ -0,0 +1,308 @@
+"""Microbenchmarks for the contest core logic.
+
+    python bench.py                          # all benchmarks at 10, 1k, 100k
+    python bench.py --sizes 10,1000 -k parse
+    python bench.py --output bench_output.txt
+    python bench.py --compare baseline.jsonl --threshold 1.25
+
+Each result is one JSON object per line on stdout (and in --output):
+{"bench": ..., "n": ..., "runs": ..., "min_s": ..., "median_s": ..., "per_item_ns": ...}.
+With --compare, the exit status is 1 when any median is slower than the
+baseline by more than --threshold.
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from contest_logic import parse_entry_author, votes_from_counts, unique_votes, eligible_entries, select_winners
+from jobs import next_weekday_dt
+from stores import WinnersStore, MonthlyStore, VoteTally, SubmissionIndex
+import ranked
+
+DEFAULT_SIZES = (10, 1_000, 100_000)
+VOTE_EMOJI = "🗳️"
+TZ = ZoneInfo("Europe/Paris")
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+# --- synthetic data ---
+def make_entries(n: int, rng: random.Random):
+    entries = []
+    for i in range(n):
+        counts = {VOTE_EMOJI: rng.randint(1, 40)} if rng.random() > 0.05 else {"✅": rng.randint(1, 40)}
+        entries.append({
+            "message_id": 10**17 + i,
+            "author_id": 10**16 + i,
+            "author_mention": f"<@{10**16 + i}>",
+            "image_url": f"https://cdn.discordapp.com/attachments/1/{i}/photo.jpg",
+            "counts": counts,
+            "votes": votes_from_counts(counts, VOTE_EMOJI),
+        })
+    return entries
+
+
+def tally_snapshot(entries):
+    return {"threads": {"1": {
+        str(e["message_id"]): {
+            "kind": "weekly",
+            "author_id": e["author_id"],
+            "author_mention": e["author_mention"],
+            "image_url": e["image_url"],
+            "counts": e["counts"],
+        } for e in entries
+    }}}
+
+
+def monthly_snapshot(weeks: int):
+    # One winner per week: 100k weeks stands in for "years of history" with
+    # a wide margin.
+    return {
+        "weekly": [{
+            "author_id": 10**16 + w,
+            "author_mention": f"<@{10**16 + w}>",
+            "image_url": f"https://cdn.discordapp.com/attachments/1/{w}/photo.jpg",
+            "votes": 12,
+            "week_no": w + 1,
+            "created_at": "2025-01-05T18:00:00+01:00",
+        } for w in range(weeks)],
+        "week_no": weeks,
+        "last_monthly_week_no": weeks - weeks % 4,
+        "active": None,
+    }
+
+
+def write_snapshot(path: Path, data: dict):
+    path.write_text(json.dumps(data, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+
+
+# --- benchmarks: each returns a zero-argument callable to time ---
+@benchmark("parse_entry_author.weekly")
+def bench_parse_weekly(n, rng, workdir):
+    contents = [f"Photo de <@{10**16 + i}>:" for i in range(n)]
+    return lambda: [parse_entry_author(c, "weekly") for c in contents]
+
+
+@benchmark("parse_entry_author.monthly")
+def bench_parse_monthly(n, rng, workdir):
+    contents = [f"Gagnant semaine #{i % 52} • <@!{10**16 + i}>" for i in range(n)]
+    return lambda: [parse_entry_author(c, "monthly") for c in contents]
+
+
+@benchmark("votes_from_counts")
+def bench_votes(n, rng, workdir):
+    counts = [e["counts"] for e in make_entries(n, rng)]
+    return lambda: [votes_from_counts(c, VOTE_EMOJI) for c in counts]
+
+
+@benchmark("unique_votes")
+def bench_unique_votes(n, rng, workdir):
+    # One entry with n voters split across the vote emoji and ✅.
+    voters = [rng.randrange(10**16, 10**16 + 2 * n) for _ in range(n)]
+    voter_sets = [set(voters[::2]), set(voters[1::2])]
+    return lambda: unique_votes(voter_sets, {1, voters[0]})
+
+
+@benchmark("tally.entries_for")
+def bench_entries_for(n, rng, workdir):
+    path = workdir / "votes.json"
+    write_snapshot(path, tally_snapshot(make_entries(n, rng)))
+    tally = VoteTally(path, VOTE_EMOJI, VOTE_EMOJI)
+    return lambda: tally.entries_for(1, VOTE_EMOJI)
+
+
+@benchmark("select_winners")
+def bench_select(n, rng, workdir):
+    entries = make_entries(n, rng)
+    return lambda: select_winners(entries)
+
+
+if ranked.AVAILABLE:
+    @benchmark("ranked.schulze")
+    def bench_schulze(n, rng, workdir):
+        # n voters ranking 5 of 200 photos, popularity skewed like real votes.
+        photos = list(range(200))
+        weights = [1 / (i + 1) for i in photos]
+        ballots = [list(dict.fromkeys(rng.choices(photos, weights, k=5))) for _ in range(n)]
+        return lambda: ranked.schulze(ballots, photos)
+
+
+@benchmark("eligible_entries.winners_contains")
+def bench_eligible(n, rng, workdir):
+    entries = make_entries(n, rng)
+    path = workdir / "winners.json"
+    write_snapshot(path, {"winners": [e["author_id"] for e in entries[::10]], "monthly_winners": []})
+    winners = WinnersStore(path)
+    return lambda: eligible_entries(entries, winners.contains)
+
+
+@benchmark("close.weekly_pipeline")
+def bench_close_pipeline(n, rng, workdir):
+    # What a weekly close computes once the tally is in memory.
+    entries = make_entries(n, rng)
+    path = workdir / "votes.json"
+    write_snapshot(path, tally_snapshot(entries))
+    tally = VoteTally(path, VOTE_EMOJI, VOTE_EMOJI)
+    wpath = workdir / "winners.json"
+    write_snapshot(wpath, {"winners": [e["author_id"] for e in entries[::10]], "monthly_winners": []})
+    winners = WinnersStore(wpath)
+    return lambda: select_winners(eligible_entries(tally.entries_for(1, VOTE_EMOJI), winners.contains))
+
+
+@benchmark("next_weekday_dt")
+def bench_next_weekday(n, rng, workdir):
+    base = datetime(2025, 1, 1, tzinfo=TZ)
+    starts = [base.replace(day=1 + i % 28, hour=i % 24) for i in range(n)]
+    return lambda: [next_weekday_dt(s, 6, 18, 0) for s in starts]
+
+
+@benchmark("store.tally.compact")
+def bench_tally_compact(n, rng, workdir):
+    path = workdir / "votes.json"
+    write_snapshot(path, tally_snapshot(make_entries(n, rng)))
+    tally = VoteTally(path, VOTE_EMOJI, VOTE_EMOJI)
+    return lambda: tally.flush_sync(compact=True)
+
+
+@benchmark("store.tally.load")
+def bench_tally_load(n, rng, workdir):
+    path = workdir / "votes.json"
+    write_snapshot(path, tally_snapshot(make_entries(n, rng)))
+    return lambda: VoteTally(path, VOTE_EMOJI, VOTE_EMOJI)
+
+
+@benchmark("store.tally.journal_replay")
+def bench_tally_replay(n, rng, workdir):
+    # n reaction ops on top of a 1k-entry snapshot, as after a crash mid-vote.
+    entries = make_entries(1_000, rng)
+    path = workdir / "votes.json"
+    write_snapshot(path, tally_snapshot(entries))
+    journal = path.with_name(path.name + ".journal")
+    with journal.open("w", encoding="utf-8") as f:
+        for seq in range(1, n + 1):
+            op = {"op": "reaction", "message_id": entries[seq % len(entries)]["message_id"], "emoji": VOTE_EMOJI,
+                  "delta": 1, "seq": seq}
+            f.write(json.dumps(op, separators=(",", ":")) + "\n")
+    return lambda: VoteTally(path, VOTE_EMOJI, VOTE_EMOJI)
+
+
+@benchmark("store.monthly.compact")
+def bench_monthly_compact(n, rng, workdir):
+    path = workdir / "monthly.json"
+    write_snapshot(path, monthly_snapshot(n))
+    store = MonthlyStore(path, TZ)
+    return lambda: store.flush_sync(compact=True)
+
+
+@benchmark("store.monthly.last_4_weeks")
+def bench_monthly_last4(n, rng, workdir):
+    path = workdir / "monthly.json"
+    write_snapshot(path, monthly_snapshot(n))
+    store = MonthlyStore(path, TZ)
+    return store.get_last_4_weeks_entries
+
+
+@benchmark("store.submissions.load")
+def bench_submissions_load(n, rng, workdir):
+    path = workdir / "submissions.json"
+    write_snapshot(path, {
+        "call_at": "2025-01-06T17:00:00+00:00",
+        "last_seen_at": "2025-01-10T12:00:00+00:00",
+        "submissions": {str(10**16 + i): {
+            "message_id": 10**17 + i,
+            "attachment_url": f"https://cdn.discordapp.com/attachments/1/{i}/photo.jpg",
+            "created_at": "2025-01-07T12:00:00+00:00",
+        } for i in range(n)},
+    })
+    return lambda: SubmissionIndex(path)
+
+
+# --- runner ---
+def measure(func, min_time: float = 0.2, max_runs: int = 50):
+    started = time.perf_counter()
+    func()
+    first = time.perf_counter() - started
+    runs = max(3, min(max_runs, int(min_time / max(first, 1e-9))))
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def run(sizes, pattern: str = ""):
+    for name, setup in BENCHMARKS.items():
+        if pattern and pattern not in name:
+            continue
+        for n in sizes:
+            with tempfile.TemporaryDirectory() as tmp:
+                func = setup(n, random.Random(n), Path(tmp))
+                timings = measure(func)
+            median = statistics.median(timings)
+            yield {
+                "bench": name,
+                "n": n,
+                "runs": len(timings),
+                "min_s": min(timings),
+                "median_s": median,
+                "per_item_ns": median / n * 1e9,
+            }
+
+
+def load_results(path: Path):
+    with path.open("r", encoding="utf-8") as f:
+        return {(r["bench"], r["n"]): r for r in map(json.loads, filter(str.strip, f))}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES),
+                        help="comma-separated entry counts")
+    parser.add_argument("-k", dest="pattern", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--output", type=Path, help="also write the JSON lines to this file")
+    parser.add_argument("--compare", type=Path, help="baseline JSON lines from a previous run")
+    parser.add_argument("--threshold", type=float, default=1.25, help="allowed median slowdown ratio")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    baseline = load_results(args.compare) if args.compare else {}
+    out = args.output.open("w", encoding="utf-8") if args.output else None
+    regressions = []
+    try:
+        for result in run(sizes, args.pattern):
+            base = baseline.get((result["bench"], result["n"]))
+            if base:
+                result["baseline_median_s"] = base["median_s"]
+                result["ratio"] = result["median_s"] / base["median_s"] if base["median_s"] else None
+                if result["ratio"] and result["ratio"] > args.threshold:
+                    regressions.append(result)
+            line = json.dumps(result, ensure_ascii=False)
+            print(line, flush=True)
+            if out:
+                out.write(line + "\n")
+    finally:
+        if out:
+            out.close()
+
+    for r in regressions:
+        print(f"REGRESSION {r['bench']} n={r['n']}: {r['ratio']:.2f}x slower than baseline", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
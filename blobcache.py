@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+from pathlib import Path
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs
+
+# Local copies of contest photos, keyed by the SHA-256 of their bytes.
+# Discord attachment URLs are signed and stop working a day or so after they
+# were issued ("ex" query parameter); anything posted again weeks later
+# (monthly contest, results) is re-uploaded from here instead.
+
+
+def url_key(url: str) -> str:
+    # The signature changes every time Discord refreshes a URL; the path
+    # (channel / attachment id / filename) does not.
+    parts = urlsplit(url)
+    return parts.netloc + parts.path
+
+
+def url_expires_at(url: str):
+    try:
+        return int(parse_qs(urlsplit(url).query)["ex"][0], 16)
+    except (KeyError, IndexError, ValueError):
+        return None
+
+
+def url_expired(url: str, now: float = None, margin: float = 3600.0) -> bool:
+    # URLs without "ex" predate signed attachments and are treated as expired
+    # too: there is no way to tell whether they still resolve.
+    expires_at = url_expires_at(url)
+    if expires_at is None:
+        return True
+    return expires_at - margin <= (time.time() if now is None else now)
+
+
+class BlobCache:
+    def __init__(self, directory: Path, max_bytes: int, pinned=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Callable returning the hashes eviction must skip (photos still due
+        # in a monthly contest).
+        self.pinned = pinned or frozenset
+        self.urls_path = directory / "urls.json"
+        # sha256 -> size, least recently used first.
+        self._blobs = OrderedDict()
+        self._urls = {}
+        self.total_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "bytes_saved": 0, "evictions": 0}
+        self._urls_dirty = False
+        self._load()
+
+    def _path(self, sha: str) -> Path:
+        return self.directory / sha[:2] / sha
+
+    def _load(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        found = []
+        for path in self.directory.glob("??/*"):
+            if path.suffix:
+                continue
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            found.append((st.st_mtime, path.name, st.st_size))
+        for _, sha, size in sorted(found):
+            self._blobs[sha] = size
+            self.total_bytes += size
+        try:
+            with self.urls_path.open("r", encoding="utf-8") as f:
+                self._urls = {k: v for k, v in json.load(f).items() if v in self._blobs}
+        except (OSError, ValueError):
+            self._urls = {}
+
+    def __len__(self):
+        return len(self._blobs)
+
+    def __contains__(self, sha: str):
+        return sha in self._blobs
+
+    def path_for(self, sha: str):
+        # Where the bytes are on disk, for readers outside the event loop.
+        return self._path(sha) if sha in self._blobs else None
+
+    def sha_for(self, url: str):
+        sha = self._urls.get(url_key(url))
+        return sha if sha in self._blobs else None
+
+    def remember(self, url: str, sha: str):
+        if sha in self._blobs and self._urls.get(url_key(url)) != sha:
+            self._urls[url_key(url)] = sha
+            self._urls_dirty = True
+
+    def _write_blob(self, sha: str, data: bytes):
+        path = self._path(sha)
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with tmp.open("wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _evict(self, keep: str):
+        removed = []
+        if self.total_bytes <= self.max_bytes:
+            return removed
+        pinned = set(self.pinned()) | {keep}
+        for sha, size in list(self._blobs.items()):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if sha in pinned:
+                continue
+            del self._blobs[sha]
+            self.total_bytes -= size
+            self.stats["evictions"] += 1
+            removed.append(sha)
+        if removed:
+            gone = set(removed)
+            self._urls = {k: v for k, v in self._urls.items() if v not in gone}
+            self._urls_dirty = True
+        return removed
+
+    def _delete_blobs(self, shas):
+        for sha in shas:
+            try:
+                self._path(sha).unlink()
+            except OSError:
+                pass
+
+    async def put(self, data: bytes, url: str = None) -> str:
+        sha = hashlib.sha256(data).hexdigest()
+        if sha in self._blobs:
+            self._blobs.move_to_end(sha)
+        else:
+            await asyncio.to_thread(self._write_blob, sha, data)
+            self._blobs[sha] = len(data)
+            self.total_bytes += len(data)
+            removed = self._evict(keep=sha)
+            if removed:
+                await asyncio.to_thread(self._delete_blobs, removed)
+        if url:
+            self.remember(url, sha)
+        await self.save_urls()
+        return sha
+
+    def _read(self, sha: str) -> bytes:
+        path = self._path(sha)
+        data = path.read_bytes()
+        os.utime(path)
+        return data
+
+    async def get(self, sha: str):
+        if sha not in self._blobs:
+            return None
+        try:
+            data = await asyncio.to_thread(self._read, sha)
+        except OSError:
+            self.total_bytes -= self._blobs.pop(sha)
+            return None
+        self._blobs.move_to_end(sha)
+        return data
+
+    async def serve(self, sha: str):
+        # get() for bytes that would otherwise have been downloaded.
+        data = await self.get(sha)
+        if data is not None:
+            self.stats["hits"] += 1
+            self.stats["bytes_saved"] += len(data)
+        return data
+
+    async def fetch(self, url: str, download):
+        # Returns (sha256, bytes); download(url) is only awaited on a miss.
+        sha = self.sha_for(url)
+        if sha is not None:
+            data = await self.serve(sha)
+            if data is not None:
+                return sha, data
+        self.stats["misses"] += 1
+        data = await download(url)
+        return await self.put(data, url), data
+
+    def _write_urls(self, urls: dict):
+        tmp = self.urls_path.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(urls, f, separators=(",", ":"))
+        os.replace(tmp, self.urls_path)
+
+    async def save_urls(self):
+        if self._urls_dirty:
+            self._urls_dirty = False
+            await asyncio.to_thread(self._write_urls, dict(self._urls))
@@ -0,0 +1,98 @@
+import re
+
+# Pure contest rules, kept free of discord.py and of the stores so they can
+# be benchmarked (bench.py) and reused from tools that run offline.
+
+FALLBACK_VOTE_EMOJI = "✅"
+WEEKLY_ENTRY_PREFIX = "Photo de "
+WEEKLY_THREAD_PREFIX = "📊 Votes - "
+MONTHLY_THREAD_PREFIX = "🏅 Concours Mensuel - "
+
+_MENTION_SEARCH = re.compile(r"<@!?(\d+)>")
+
+
+def parse_entry_author(content: str, kind: str):
+    # Recovers the author of a vote-thread entry from its text:
+    #   weekly:  "Photo de <@123>:"
+    #   monthly: "Gagnant semaine #4 • <@123>"
+    # Returns (author_id, author_mention), either of which may be None.
+    content = (content or "").strip()
+    if kind == "monthly":
+        m = _MENTION_SEARCH.search(content)
+        if m:
+            author_id = int(m.group(1))
+            return author_id, f"<@{author_id}>"
+        return None, None
+    if not content.startswith(WEEKLY_ENTRY_PREFIX):
+        return None, None
+    part = content[len(WEEKLY_ENTRY_PREFIX):].rstrip(":").strip()
+    m = _MENTION_SEARCH.match(part)
+    return (int(m.group(1)) if m else None), part
+
+
+def thread_kind(name: str):
+    # "weekly" or "monthly" for a vote thread, from the name the bot gave it.
+    if name.startswith(WEEKLY_THREAD_PREFIX):
+        return "weekly"
+    if name.startswith(MONTHLY_THREAD_PREFIX):
+        return "monthly"
+    return None
+
+
+def votes_from_counts(counts: dict, vote_emoji: str) -> int:
+    # Same rule as the reaction scan: the bot's own reaction is not a vote,
+    # and ✅ only counts when the vote emoji could not be added.
+    if counts.get(vote_emoji, 0) > 0:
+        return max(0, counts[vote_emoji] - 1)
+    return max(0, counts.get(FALLBACK_VOTE_EMOJI, 0) - 1)
+
+
+def unique_votes(voter_sets, excluded) -> int:
+    # Exact count from reaction users: someone who reacted with several vote
+    # emojis counts once, and the excluded ids (the bot, the photo's author)
+    # not at all.
+    return len(set().union(*voter_sets) - set(excluded))
+
+
+def eligible_entries(entries, past_winner) -> list:
+    # past_winner is a membership test such as WinnersStore.contains.
+    return [e for e in entries if not past_winner(e["author_id"])]
+
+
+def select_winners(entries):
+    # Returns (max_votes, winners); every entry tied on the top score wins.
+    max_votes = None
+    winners = []
+    for e in entries:
+        votes = e["votes"]
+        if max_votes is None or votes > max_votes:
+            max_votes = votes
+            winners = [e]
+        elif votes == max_votes:
+            winners.append(e)
+    return max_votes, winners
+
+
+def participant_ranks(entries, winners):
+    # One (author_id, rank, votes, tied) per participant, best rank first.
+    # Winners share rank 1 (a ranked tally may crown a photo with fewer
+    # ballots); the others follow by votes, equal votes sharing a rank. An
+    # author with several entries (two weekly wins in one month) keeps the
+    # best.
+    winner_ids = {e["message_id"] for e in winners}
+    ordered = sorted(entries, key=lambda e: (e["message_id"] not in winner_ids, -e["votes"]))
+    ranks = []
+    previous = None
+    for position, e in enumerate(ordered, 1):
+        key = "won" if e["message_id"] in winner_ids else e["votes"]
+        rank = ranks[-1][1] if key == previous else position
+        previous = key
+        ranks.append((e["author_id"], rank, e["votes"]))
+    shared = {}
+    for _, rank, _ in ranks:
+        shared[rank] = shared.get(rank, 0) + 1
+    best = {}
+    for author_id, rank, votes in ranks:
+        if author_id and author_id not in best:
+            best[author_id] = (author_id, rank, votes, shared[rank] > 1)
+    return list(best.values())
@@ -0,0 +1,155 @@
+import json
+import asyncio
+from pathlib import Path
+
+from stores import (WinnersStore, MonthlyStore, WeeklyStore, VoteTally, SubmissionIndex, ImageHashIndex, ExifIndex,
+                    BallotBox, ResultNotices)
+from results_db import ResultsDB
+
+# contests.json is a list of contests, for example:
+# [
+#   {
+#     "id": "eps-paris",
+#     "name": "EPS Paris",
+#     "guild_id": 123,
+#     "photo_channel_id": 456,
+#     "result_channel_id": 789,
+#     "role_ids": [111, 222],
+#     "vote_emoji": "🗳️",
+#     "monthly_enabled": true,
+#     "monthly_vote_emoji": "🗳️",
+#     "monthly_vote_duration_min": 1380,
+#     "exact_votes": false,
+#     "ranked_votes": false,
+#     "notify_participants": false,
+#     "schedule": {"share": [0, 18, 0], "open": [5, 8, 0], "result": [6, 18, 0]}
+#   }
+# ]
+# Without the file, a single "default" contest is built from the .env settings
+# and keeps its data next to main.py, as before.
+
+SCHEDULE_EVENTS = ("share", "open", "result")
+
+
+class Contest:
+    def __init__(self, config: dict, data_dir: Path, tz, store_options: dict, tally_options: dict):
+        self.id = str(config["id"])
+        self.name = config.get("name") or self.id
+        self.guild_id = int(config.get("guild_id") or 0)
+        self.photo_channel_id = int(config["photo_channel_id"])
+        self.result_channel_id = int(config["result_channel_id"])
+        self.role_ids = [str(r) for r in config.get("role_ids", []) if r]
+        self.vote_emoji = config.get("vote_emoji") or "🗳️"
+        self.monthly_enabled = bool(config.get("monthly_enabled", True))
+        self.monthly_vote_emoji = config.get("monthly_vote_emoji") or self.vote_emoji
+        self.monthly_vote_duration_min = int(config.get("monthly_vote_duration_min", 1380))
+        # Count votes from reaction users at close time instead of reaction counts.
+        self.exact_votes = bool(config.get("exact_votes", False))
+        # Rank photos with a menu under each one (Schulze tally) instead of reacting.
+        self.ranked_votes = bool(config.get("ranked_votes", False))
+        # DM every participant their rank and votes after each close.
+        self.notify_participants = bool(config.get("notify_participants", False))
+        self.schedule = {event: tuple(int(x) for x in config["schedule"][event]) for event in SCHEDULE_EVENTS}
+        self.data_dir = data_dir
+        self.tz = tz
+
+        data_dir.mkdir(parents=True, exist_ok=True)
+        self.winners = WinnersStore(data_dir / "winners.json", **store_options)
+        self.monthly = MonthlyStore(data_dir / "monthly.json", tz, **store_options)
+        self.weekly = WeeklyStore(data_dir / "weekly.json", **store_options)
+        self.tally = VoteTally(data_dir / "votes.json", self.vote_emoji, self.monthly_vote_emoji, **tally_options)
+        self.submissions = SubmissionIndex(data_dir / "submissions.json", **store_options)
+        self.hashes = ImageHashIndex(data_dir / "image_hashes.json", **store_options)
+        self.exif = ExifIndex(data_dir / "exif.json", **store_options)
+        self.ballots = BallotBox(data_dir / "ballots.json", **store_options)
+        self.notices = ResultNotices(data_dir / "notices.json", **store_options)
+        self.results = ResultsDB(data_dir / "results.db")
+        if self.results.created:
+            self.results.backfill_weekly_winners(self.monthly.data.get("weekly", []))
+
+        # Serializes the phases (share/open/close) of this contest only; other
+        # contests keep running while this one closes.
+        self.lock = asyncio.Lock()
+
+    @property
+    def role_mentions(self) -> str:
+        return " ".join(f"<@&{r}>" for r in self.role_ids)
+
+    def stores(self):
+        return (self.winners, self.monthly, self.weekly, self.tally, self.submissions, self.hashes, self.exif,
+                self.ballots, self.notices)
+
+    def thread_ids(self):
+        ids = set(self.tally.thread_ids())
+        for active in (self.weekly.get_active(), self.monthly.get_active()):
+            if active:
+                ids.add(int(active["thread_id"]))
+        return ids
+
+    async def flush(self) -> bool:
+        results = await asyncio.gather(*(store.flush() for store in self.stores()))
+        return all(results)
+
+    def __repr__(self):
+        return f"<Contest {self.id} photo={self.photo_channel_id} result={self.result_channel_id}>"
+
+
+class ContestRegistry:
+    # Routes gateway events to contests with a single dict lookup on the
+    # channel id (photo channel, results channel or one of its vote threads).
+
+    def __init__(self):
+        self._contests = {}
+        self._by_channel = {}
+
+    def add(self, contest: Contest):
+        if contest.id in self._contests:
+            raise ValueError(f"duplicate contest id {contest.id!r}")
+        for channel_id in (contest.photo_channel_id, contest.result_channel_id):
+            other = self._by_channel.get(channel_id)
+            if other is not None and other is not contest:
+                raise ValueError(f"channel {channel_id} is used by both {other.id!r} and {contest.id!r}")
+        self._contests[contest.id] = contest
+        self._by_channel[contest.photo_channel_id] = contest
+        self._by_channel[contest.result_channel_id] = contest
+        for thread_id in contest.thread_ids():
+            self._by_channel[thread_id] = contest
+
+    def get(self, contest_id: str):
+        return self._contests.get(contest_id)
+
+    def for_channel(self, channel_id: int):
+        return self._by_channel.get(channel_id)
+
+    def bind_thread(self, thread_id: int, contest: Contest):
+        self._by_channel[thread_id] = contest
+
+    def unbind_thread(self, thread_id: int):
+        contest = self._by_channel.get(thread_id)
+        if contest is not None and thread_id not in (contest.photo_channel_id, contest.result_channel_id):
+            del self._by_channel[thread_id]
+
+    def for_guild(self, guild_id: int):
+        bound = [c for c in self._contests.values() if c.guild_id == guild_id]
+        return bound or [c for c in self._contests.values() if c.guild_id == 0]
+
+    def __iter__(self):
+        return iter(self._contests.values())
+
+    def __len__(self):
+        return len(self._contests)
+
+
+def load_contests(config_path: Path, default_config: dict, base_dir: Path, tz, store_options: dict,
+                  tally_options: dict) -> ContestRegistry:
+    registry = ContestRegistry()
+    if config_path.exists():
+        with config_path.open("r", encoding="utf-8") as f:
+            configs = json.load(f)
+        for config in configs:
+            config = dict(default_config, **config)
+            config["schedule"] = dict(default_config["schedule"], **config.get("schedule", {}))
+            registry.add(Contest(config, base_dir / "data" / str(config["id"]), tz, store_options, tally_options))
+    else:
+        registry.add(Contest(default_config, base_dir, tz, store_options, tally_options))
+    return registry
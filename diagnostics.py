@@ -0,0 +1,188 @@
+import io
+import sys
+import time
+import signal
+import asyncio
+import threading
+import tracemalloc
+from collections import Counter
+
+# Nothing here runs until an admin asks for it: the sampler thread and
+# tracemalloc only exist for the duration of one capture.
+MAX_CAPTURE_SEC = 60
+_capture_lock = asyncio.Lock()
+
+
+def capture_running() -> bool:
+    return _capture_lock.locked()
+
+
+def deep_size(obj) -> int:
+    # Approximate retained size of plain containers (what the stores hold).
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif not isinstance(o, type):
+            if hasattr(o, "__dict__"):
+                stack.append(vars(o))
+            # The stores' records use __slots__.
+            for cls in type(o).__mro__:
+                for name in getattr(cls, "__slots__", ()):
+                    if hasattr(o, name):
+                        stack.append(getattr(o, name))
+    return total
+
+
+def format_bytes(n: float) -> str:
+    for unit in ("o", "Kio", "Mio"):
+        if n < 1024:
+            return f"{n:.0f} {unit}" if unit == "o" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} Gio"
+
+
+def task_summary(loop=None):
+    names = Counter()
+    for task in asyncio.all_tasks(loop):
+        coro = task.get_coro()
+        names[getattr(coro, "__qualname__", None) or repr(coro)] += 1
+    return names
+
+
+def cache_sizes(bot) -> dict:
+    guilds = bot.guilds
+    return {
+        "guilds": len(guilds),
+        "users": len(bot.users),
+        "members": sum(len(g.members) for g in guilds),
+        "channels": sum(len(g.channels) for g in guilds),
+        "threads": sum(len(g.threads) for g in guilds),
+        "messages": len(bot.cached_messages),
+    }
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({code.co_filename}:{frame.f_lineno})"
+
+
+def _stack_of(frame):
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    return tuple(reversed(stack))
+
+
+def _sample_stacks(thread_id: int, duration: float, interval: float, stop: threading.Event) -> Counter:
+    stacks = Counter()
+    deadline = time.monotonic() + duration
+    while not stop.is_set() and time.monotonic() < deadline:
+        stack = _stack_of(sys._current_frames().get(thread_id))
+        if stack:
+            stacks[stack] += 1
+        stop.wait(interval)
+    return stacks
+
+
+async def _sample_with_signals(duration: float, interval: float) -> Counter:
+    # SIGPROF fires every `interval` seconds of CPU time and its handler runs
+    # on the loop thread between bytecodes, so samples land where the CPU is
+    # actually spent instead of wherever the GIL happens to be released.
+    stacks = Counter()
+
+    def on_sample(signum, frame):
+        stacks[_stack_of(frame)] += 1
+
+    previous = signal.signal(signal.SIGPROF, on_sample)
+    signal.setitimer(signal.ITIMER_PROF, interval, interval)
+    try:
+        await asyncio.sleep(duration)
+    finally:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, previous)
+    return stacks
+
+
+async def profile_cpu(duration: float, top: int = 15, interval: float = 0.005):
+    # Sampling profiler: the event loop is never instrumented, only looked at
+    # every `interval` seconds. Where SIGPROF is unavailable (Windows), a
+    # short-lived thread samples the loop thread's stack instead.
+    duration = max(1.0, min(float(duration), MAX_CAPTURE_SEC))
+    async with _capture_lock:
+        if hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread():
+            stacks = await _sample_with_signals(duration, interval)
+        else:
+            stop = threading.Event()
+            try:
+                stacks = await asyncio.to_thread(_sample_stacks, threading.get_ident(), duration, interval, stop)
+            finally:
+                stop.set()
+
+    total = sum(stacks.values())
+    own = Counter()
+    inclusive = Counter()
+    for stack, n in stacks.items():
+        own[stack[-1]] += n
+        for label in set(stack):
+            inclusive[label] += n
+
+    lines = [f"{total} échantillon(s) sur {duration:.0f}s (toutes les {interval * 1000:.0f} ms de CPU)", "",
+             "Temps propre :"]
+    for label, n in own.most_common(top):
+        lines.append(f"{100 * n / max(total, 1):5.1f}%  {label}")
+    lines += ["", "Temps cumulé :"]
+    for label, n in inclusive.most_common(top):
+        lines.append(f"{100 * n / max(total, 1):5.1f}%  {label}")
+
+    # Collapsed stacks, the input format of flamegraph.pl / speedscope.
+    collapsed = io.StringIO()
+    for stack, n in stacks.most_common():
+        collapsed.write(";".join(stack) + f" {n}\n")
+    return "\n".join(lines), collapsed.getvalue().encode("utf-8")
+
+
+async def profile_memory(duration: float, top: int = 15, frames: int = 10):
+    # tracemalloc is only enabled for the capture; it slows allocations
+    # noticeably while active.
+    duration = max(1.0, min(float(duration), MAX_CAPTURE_SEC))
+    async with _capture_lock:
+        already = tracemalloc.is_tracing()
+        if not already:
+            tracemalloc.start(frames)
+        try:
+            await asyncio.sleep(duration)
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            if not already:
+                tracemalloc.stop()
+
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    by_line = snapshot.statistics("lineno")
+    lines = [f"Mémoire suivie après {duration:.0f}s : {format_bytes(current)} (pic {format_bytes(peak)})", ""]
+    for stat in by_line[:top]:
+        frame = stat.traceback[0]
+        lines.append(f"{format_bytes(stat.size):>10}  {stat.count:>7} bloc(s)  {frame.filename}:{frame.lineno}")
+
+    report = io.StringIO()
+    for stat in snapshot.statistics("traceback")[:200]:
+        report.write(f"{format_bytes(stat.size)} in {stat.count} block(s)\n")
+        for line in stat.traceback.format():
+            report.write(line + "\n")
+        report.write("\n")
+    return "\n".join(lines), report.getvalue().encode("utf-8")
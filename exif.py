@@ -0,0 +1,285 @@
+import re
+import struct
+from datetime import datetime
+
+# EXIF shooting data from the first bytes of a photo: the same header the
+# submission check already reads (imageprobe.read_head), so indexing a JPEG
+# or PNG costs no extra download. A WebP keeps its EXIF after the image data:
+# one more ranged read fetches the chunks past it (webp_exif_offset). Pure
+# Python; a missing or truncated block just yields fewer fields.
+
+# IFD0
+_MAKE, _MODEL, _DATETIME, _EXIF_IFD = 0x010F, 0x0110, 0x0132, 0x8769
+# Exif IFD
+_EXPOSURE, _FNUMBER, _ISO, _DATETIME_ORIGINAL = 0x829A, 0x829D, 0x8827, 0x9003
+_FOCAL, _FOCAL_35MM, _LENS_MAKE, _LENS_MODEL = 0x920A, 0xA405, 0xA433, 0xA434
+
+_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 7: 1, 9: 4, 10: 8, 11: 4, 12: 8}
+_EXIF_HEADER = b"Exif\x00\x00"
+# VP8X flags byte: the file has an EXIF chunk.
+_VP8X_EXIF = 0x08
+# Bytes read past the image data of a WebP to reach its EXIF chunk.
+MAX_TAIL_BYTES = 64 * 1024
+
+# Capture hours counted as night for the "nuit" search word.
+NIGHT_HOURS = frozenset((21, 22, 23, 0, 1, 2, 3, 4, 5))
+
+
+def exif_block(head: bytes):
+    # The TIFF structure holding the EXIF data, or None.
+    if head[:2] == b"\xff\xd8":
+        i, n = 2, len(head)
+        while i + 4 <= n and head[i] == 0xFF:
+            marker = head[i + 1]
+            if marker == 0xDA:
+                break
+            length = struct.unpack(">H", head[i + 2:i + 4])[0]
+            if marker == 0xE1 and head[i + 4:i + 10] == _EXIF_HEADER:
+                return head[i + 10:i + 2 + length]
+            i += 2 + length
+        return None
+    if head[:8] == b"\x89PNG\r\n\x1a\n":
+        i = 8
+        while i + 8 <= len(head):
+            length, kind = struct.unpack(">I4s", head[i:i + 8])
+            if kind == b"eXIf":
+                return head[i + 8:i + 8 + length]
+            if kind == b"IDAT":
+                break
+            i += 12 + length
+        return None
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return _webp_exif(head, 12)[0]
+    return None
+
+
+def _webp_exif(data: bytes, i: int):
+    # (EXIF block or None, offset of the first chunk not complete in data),
+    # walking RIFF chunks from offset i.
+    while i + 8 <= len(data):
+        kind, length = struct.unpack("<4sI", data[i:i + 8])
+        if kind == b"EXIF" and i + 8 + length <= len(data):
+            block = data[i + 8:i + 8 + length]
+            return (block[6:] if block.startswith(_EXIF_HEADER) else block), i
+        if kind == b"EXIF":
+            break
+        i += 8 + length + (length & 1)
+    return None, i
+
+
+def webp_exif_offset(head: bytes):
+    # WebP writers put the EXIF chunk after the image data, usually at the
+    # end of the file, far past the header bytes. When the VP8X header says
+    # there is one and head does not reach it: the file offset to read from
+    # (see parse_webp_tail). None otherwise.
+    if head[:4] != b"RIFF" or head[8:12] != b"WEBP" or head[12:16] != b"VP8X" or len(head) < 21:
+        return None
+    if not head[20] & _VP8X_EXIF:
+        return None
+    block, offset = _webp_exif(head, 12)
+    return offset if block is None else None
+
+
+class _Tiff:
+    def __init__(self, data: bytes):
+        if data[:2] == b"II":
+            self.order = "<"
+        elif data[:2] == b"MM":
+            self.order = ">"
+        else:
+            raise ValueError("not a TIFF header")
+        self.data = data
+
+    def unpack(self, fmt: str, offset: int):
+        size = struct.calcsize(self.order + fmt)
+        if offset < 0 or offset + size > len(self.data):
+            raise ValueError("truncated")
+        return struct.unpack(self.order + fmt, self.data[offset:offset + size])
+
+    def first_ifd(self) -> int:
+        return self.unpack("I", 4)[0]
+
+    def ifd(self, offset: int) -> dict:
+        # tag -> value, skipping entries that point past the bytes we have.
+        tags = {}
+        try:
+            count = self.unpack("H", offset)[0]
+        except ValueError:
+            return tags
+        for k in range(count):
+            entry = offset + 2 + 12 * k
+            try:
+                tag, kind, n = self.unpack("HHI", entry)
+                size = _TYPE_SIZES.get(kind, 0) * n
+                if not size:
+                    continue
+                at = entry + 8 if size <= 4 else self.unpack("I", entry + 8)[0]
+                tags[tag] = self._value(kind, n, at)
+            except (ValueError, ZeroDivisionError):
+                continue
+        return tags
+
+    def _value(self, kind: int, n: int, at: int):
+        if kind == 2:
+            raw = self.data[at:at + n]
+            if len(raw) < n:
+                raise ValueError("truncated")
+            return raw.split(b"\x00", 1)[0].decode("utf-8", "replace").strip()
+        if kind in (5, 10):
+            num, den = self.unpack("ii" if kind == 10 else "II", at)
+            return (num, den)
+        if kind == 3:
+            return self.unpack("H", at)[0]
+        if kind in (4, 9):
+            return self.unpack("i" if kind == 9 else "I", at)[0]
+        if kind in (11, 12):
+            return self.unpack("f" if kind == 11 else "d", at)[0]
+        return self.data[at:at + n]
+
+
+def _ratio(value):
+    if isinstance(value, tuple):
+        num, den = value
+        return num / den if den else None
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+def _camera(make: str, model: str):
+    make, model = (make or "").strip(), (model or "").strip()
+    if not model:
+        return make or None
+    # "Canon" + "Canon EOS R5", "NIKON CORPORATION" + "NIKON Z 6"
+    brand = make.split(" ", 1)[0]
+    if not brand or model.lower().startswith(brand.lower()):
+        return model
+    return f"{brand} {model}"
+
+
+def parse_exif(head: bytes) -> dict:
+    # camera, lens, focal_mm, aperture, iso, exposure, taken_at (ISO 8601,
+    # camera local time); only the fields found.
+    return _parse_block(exif_block(head))
+
+
+def parse_webp_tail(tail: bytes) -> dict:
+    # parse_exif() for the bytes read from webp_exif_offset() on.
+    return _parse_block(_webp_exif(tail, 0)[0])
+
+
+def _parse_block(block) -> dict:
+    if not block:
+        return {}
+    try:
+        tiff = _Tiff(block)
+        ifd0 = tiff.ifd(tiff.first_ifd())
+    except ValueError:
+        return {}
+    exif = tiff.ifd(ifd0[_EXIF_IFD]) if isinstance(ifd0.get(_EXIF_IFD), int) else {}
+
+    info = {}
+    camera = _camera(ifd0.get(_MAKE), ifd0.get(_MODEL))
+    if camera:
+        info["camera"] = camera
+    lens = exif.get(_LENS_MODEL)
+    if isinstance(lens, str) and lens:
+        info["lens"] = lens
+    focal = _ratio(exif.get(_FOCAL))
+    if not focal and isinstance(exif.get(_FOCAL_35MM), int):
+        focal = float(exif[_FOCAL_35MM])
+    if focal:
+        info["focal_mm"] = round(focal, 1)
+    aperture = _ratio(exif.get(_FNUMBER))
+    if aperture:
+        info["aperture"] = round(aperture, 1)
+    iso = exif.get(_ISO)
+    if isinstance(iso, int) and iso:
+        info["iso"] = iso
+    exposure = exif.get(_EXPOSURE)
+    if isinstance(exposure, tuple) and exposure[0] and exposure[1]:
+        num, den = exposure
+        info["exposure"] = f"1/{round(den / num)}" if num < den else f"{num / den:g}"
+    taken = exif.get(_DATETIME_ORIGINAL) or ifd0.get(_DATETIME)
+    if isinstance(taken, str):
+        try:
+            info["taken_at"] = datetime.strptime(taken[:19], "%Y:%m:%d %H:%M:%S").isoformat()
+        except ValueError:
+            pass
+    return info
+
+
+# --- search terms ---
+
+_WORD = re.compile(r"[a-z0-9]+(?:[.-][a-z0-9]+)*")
+
+
+def _words(text: str):
+    return {w for w in _WORD.findall(text.lower()) if len(w) > 1}
+
+
+def search_terms(info: dict) -> set:
+    # Inverted index keys for one photo.
+    terms = set()
+    for field in ("camera", "lens"):
+        if info.get(field):
+            terms.update(f"word:{w}" for w in _words(info[field]))
+    if info.get("focal_mm"):
+        terms.add(f"focal:{round(info['focal_mm'])}")
+    if info.get("aperture"):
+        terms.add(f"f:{info['aperture']:g}")
+    if info.get("iso"):
+        terms.add(f"iso:{info['iso']}")
+    if info.get("taken_at"):
+        taken = datetime.fromisoformat(info["taken_at"])
+        terms.add(f"year:{taken.year}")
+        terms.add(f"month:{taken.year}-{taken.month:02d}")
+        terms.add("moment:nuit" if taken.hour in NIGHT_HOURS else "moment:jour")
+    return terms
+
+
+WINNER_WORDS = frozenset(("gagnant", "gagnante", "gagnants", "gagnantes", "winner", "winners"))
+_QUERY_WORDS = {"nuit": "moment:nuit", "night": "moment:nuit", "jour": "moment:jour", "day": "moment:jour"}
+
+
+def parse_query(text: str):
+    # "50mm, f/1,8, 2025, nuit" -> (["focal:50", "f:1.8", "year:2025",
+    # "moment:nuit"], winners_only). Every term must match.
+    text = re.sub(r"(\d),(\d)", r"\1.\2", text.lower())
+    text = re.sub(r"\b(iso)\s+(\d+)", r"\1\2", text)
+    text = re.sub(r"(\d)\s+mm\b", r"\1mm", text)
+    terms = []
+    winners_only = False
+    for token in re.split(r"[\s,;]+", text):
+        if not token:
+            continue
+        if token in WINNER_WORDS:
+            winners_only = True
+        elif token in _QUERY_WORDS:
+            terms.append(_QUERY_WORDS[token])
+        elif m := re.fullmatch(r"(\d+(?:\.\d+)?)mm", token):
+            terms.append(f"focal:{round(float(m.group(1)))}")
+        elif m := re.fullmatch(r"f/?(\d+(?:\.\d+)?)", token):
+            terms.append(f"f:{float(m.group(1)):g}")
+        elif m := re.fullmatch(r"iso(\d+)", token):
+            terms.append(f"iso:{int(m.group(1))}")
+        elif re.fullmatch(r"(19|20)\d\d", token):
+            terms.append(f"year:{token}")
+        elif m := re.fullmatch(r"((?:19|20)\d\d)-(\d{1,2})", token):
+            terms.append(f"month:{m.group(1)}-{int(m.group(2)):02d}")
+        else:
+            terms.extend(f"word:{w}" for w in _words(token))
+    return terms, winners_only
+
+
+def describe(info: dict) -> str:
+    parts = [info.get("camera"), info.get("lens")]
+    if info.get("focal_mm"):
+        parts.append(f"{info['focal_mm']:g} mm")
+    if info.get("aperture"):
+        parts.append(f"f/{info['aperture']:g}")
+    if info.get("exposure"):
+        parts.append(f"{info['exposure']} s")
+    if info.get("iso"):
+        parts.append(f"ISO {info['iso']}")
+    if info.get("taken_at"):
+        parts.append(datetime.fromisoformat(info["taken_at"]).strftime("%d/%m/%Y %H:%M"))
+    return ", ".join(p for p in parts if p)
@@ -0,0 +1,272 @@
+"""Streaming export of the weekly and monthly vote threads of a photo channel.
+
+    python export.py --channel 123456789 --out exports/votes.jsonl
+    python export.py --channel 123456789 --out exports/parquet --format parquet --contest eps-paris
+
+One record per contest entry (thread, message, author, image URL, per-emoji
+reaction counts, timestamps), written in batches so memory stays flat however
+large the archive. The bot token comes from DISCORD_TOKEN (.env is read); only
+the HTTP API is used. Admins can run the same export from Discord with /export.
+
+Exports are incremental: a cursors file next to the output keeps, for every
+thread, the last message exported, and later runs fetch only what came after
+it. Threads still open (not locked) are exported in full each time with
+"final": false, since their votes are still moving; keep the last record per
+message_id when reading.
+"""
+import os
+import json
+import asyncio
+import argparse
+from pathlib import Path
+from datetime import datetime, timezone
+
+import discord
+
+from contest_logic import thread_kind, parse_entry_author, votes_from_counts
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+PARQUET_AVAILABLE = pa is not None
+FORMATS = ("jsonl", "parquet")
+BATCH_SIZE = 500
+
+
+class JsonlWriter:
+    # Appends to one file; every batch is a single write.
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+    def write(self, records):
+        lines = "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in records)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def close(self):
+        pass
+
+
+class ParquetWriter:
+    # Parquet files cannot be appended to, and one left open by an interrupted
+    # run has no footer: every batch is a complete part file of its own,
+    # renamed into place before the cursors move past it.
+    def __init__(self, directory: Path):
+        if not PARQUET_AVAILABLE:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+        directory.mkdir(parents=True, exist_ok=True)
+        self.directory = directory
+        self.stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        self.parts = 0
+        self.schema = pa.schema([
+            ("contest_id", pa.string()),
+            ("kind", pa.string()),
+            ("thread_id", pa.int64()),
+            ("thread_name", pa.string()),
+            ("message_id", pa.int64()),
+            ("author_id", pa.int64()),
+            ("author_mention", pa.string()),
+            ("image_url", pa.string()),
+            ("reactions", pa.map_(pa.string(), pa.int64())),
+            ("votes", pa.int64()),
+            ("created_at", pa.string()),
+            ("edited_at", pa.string()),
+            ("final", pa.bool_()),
+            ("exported_at", pa.string()),
+        ])
+
+    def write(self, records):
+        rows = [dict(r, reactions=list(r["reactions"].items())) for r in records]
+        table = pa.Table.from_pylist(rows, schema=self.schema)
+        self.parts += 1
+        path = self.directory / f"part-{self.stamp}-{self.parts:05d}.parquet"
+        tmp = path.with_suffix(".tmp")
+        pq.write_table(table, str(tmp))
+        os.replace(tmp, path)
+
+    def close(self):
+        pass
+
+
+def open_writer(fmt: str, out: Path):
+    return ParquetWriter(out) if fmt == "parquet" else JsonlWriter(out)
+
+
+class ExportCursors:
+    # thread id -> id of the last message exported from that (closed) thread.
+    def __init__(self, path: Path):
+        self.path = path
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                self._after = {int(k): int(v) for k, v in json.load(f).items()}
+        except (OSError, ValueError):
+            self._after = {}
+
+    def get(self, thread_id: int):
+        return self._after.get(thread_id)
+
+    def set(self, thread_id: int, message_id: int):
+        self._after[thread_id] = message_id
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump({str(k): v for k, v in self._after.items()}, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+
+class ThreadExporter:
+    def __init__(self, writer, cursors: ExportCursors, contest_id: str = "default", vote_emojis: dict = None,
+                 batch_size: int = BATCH_SIZE):
+        self.writer = writer
+        self.cursors = cursors
+        self.contest_id = contest_id
+        # kind -> vote emoji, for the "votes" column.
+        self.vote_emojis = vote_emojis or {}
+        self.batch_size = batch_size
+        self.stats = {"threads": 0, "threads_skipped": 0, "messages": 0, "records": 0, "batches": 0}
+
+    async def vote_threads(self, channel):
+        # Active threads first, then archived ones, public and private (the bot
+        # joined every thread it created).
+        seen = set()
+        try:
+            active = await channel.guild.active_threads()
+        except discord.HTTPException as e:
+            print("ThreadExporter: could not list active threads:", e)
+            active = []
+        for thread in active:
+            if thread.parent_id == channel.id and thread_kind(thread.name):
+                seen.add(thread.id)
+                yield thread
+        for private in (False, True):
+            try:
+                async for thread in channel.archived_threads(private=private, joined=private, limit=None):
+                    if thread.id not in seen and thread_kind(thread.name):
+                        seen.add(thread.id)
+                        yield thread
+            except discord.Forbidden as e:
+                print(f"ThreadExporter: archived {'private' if private else 'public'} threads not readable:", e)
+
+    def _record(self, thread, kind: str, message, final: bool, exported_at: str):
+        if not message.embeds:
+            return None
+        author_id, author_mention = parse_entry_author(message.content, kind)
+        image_url = message.embeds[0].image.url if message.embeds[0].image else None
+        if not author_id or not image_url:
+            return None
+        reactions = {str(r.emoji): r.count for r in message.reactions}
+        vote_emoji = self.vote_emojis.get(kind)
+        return {
+            "contest_id": self.contest_id,
+            "kind": kind,
+            "thread_id": thread.id,
+            "thread_name": thread.name,
+            "message_id": message.id,
+            "author_id": author_id,
+            "author_mention": author_mention,
+            "image_url": image_url,
+            "reactions": reactions,
+            "votes": votes_from_counts(reactions, vote_emoji) if vote_emoji else None,
+            "created_at": message.created_at.isoformat(),
+            "edited_at": message.edited_at.isoformat() if message.edited_at else None,
+            "final": final,
+            "exported_at": exported_at,
+        }
+
+    async def _flush(self, batch, thread_id: int, last_id: int, final: bool):
+        if batch:
+            await asyncio.to_thread(self.writer.write, batch)
+            self.stats["records"] += len(batch)
+            self.stats["batches"] += 1
+        # The cursor moves only once its records are on disk, so an
+        # interrupted export resumes without gaps.
+        if final and last_id is not None:
+            self.cursors.set(thread_id, last_id)
+            await asyncio.to_thread(self.cursors.save)
+
+    async def export_thread(self, thread):
+        kind = thread_kind(thread.name)
+        # Closed contests are locked; their votes no longer change.
+        final = bool(thread.locked)
+        after = self.cursors.get(thread.id) if final else None
+        if after is not None and thread.last_message_id is not None and thread.last_message_id <= after:
+            self.stats["threads_skipped"] += 1
+            return
+        self.stats["threads"] += 1
+        exported_at = datetime.now(timezone.utc).isoformat()
+        batch = []
+        last_id = None
+        history = thread.history(limit=None, after=discord.Object(after) if after else None, oldest_first=True)
+        async for message in history:
+            self.stats["messages"] += 1
+            last_id = message.id
+            record = self._record(thread, kind, message, final, exported_at)
+            if record is not None:
+                batch.append(record)
+            if len(batch) >= self.batch_size:
+                await self._flush(batch, thread.id, last_id, final)
+                batch = []
+        await self._flush(batch, thread.id, last_id, final)
+
+    async def export_channel(self, channel, progress=None):
+        # progress(stats) is awaited after every thread.
+        async for thread in self.vote_threads(channel):
+            await self.export_thread(thread)
+            if progress is not None:
+                await progress(self.stats)
+        await asyncio.to_thread(self.writer.close)
+        return self.stats
+
+
+def cursors_path(out: Path) -> Path:
+    # Beside the output, not in it: a Parquet directory must hold only parts.
+    return out.with_name(out.name + ".cursors.json")
+
+
+async def run_cli(args):
+    client = discord.Client(intents=discord.Intents.none())
+    await client.login(args.token)
+    try:
+        channel = await client.fetch_channel(args.channel)
+        exporter = ThreadExporter(
+            open_writer(args.format, args.out), ExportCursors(cursors_path(args.out)),
+            contest_id=args.contest, vote_emojis={"weekly": args.vote_emoji, "monthly": args.monthly_vote_emoji},
+            batch_size=args.batch_size,
+        )
+        return await exporter.export_channel(channel)
+    finally:
+        await client.close()
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--channel", type=int, default=int(os.getenv("PHOTO_CHANNEL_ID", "0")),
+                        help="photo channel holding the vote threads (default: PHOTO_CHANNEL_ID)")
+    parser.add_argument("--out", type=Path, required=True, help="JSONL file, or directory for Parquet")
+    parser.add_argument("--format", choices=FORMATS, default="jsonl")
+    parser.add_argument("--contest", default="default")
+    parser.add_argument("--vote-emoji", default=os.getenv("VOTE_EMOJI", "🗳️"))
+    parser.add_argument("--monthly-vote-emoji", default=os.getenv("MONTHLY_VOTE_EMOJI") or os.getenv("VOTE_EMOJI", "🗳️"))
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--token", default=os.getenv("DISCORD_TOKEN"))
+    args = parser.parse_args(argv)
+    if not args.token or not args.channel:
+        parser.error("DISCORD_TOKEN and a channel id are required")
+    if args.format == "parquet" and not PARQUET_AVAILABLE:
+        parser.error("Parquet export needs pyarrow (pip install pyarrow)")
+    print(json.dumps(asyncio.run(run_cli(args))))
+
+
+if __name__ == "__main__":
+    main()
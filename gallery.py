@@ -0,0 +1,304 @@
+# Static HTML gallery of past weekly and monthly winners. From the bot's
+# data directory (DATA_DIR), for the default contest and for one of
+# contests.json, whose stores live in data/<id>:
+#
+#   python gallery.py --contest-dir . --out gallery/
+#   python gallery.py --contest-dir data/eps-paris --blobs blobs --out gallery/eps-paris --title "EPS Paris"
+#
+# Writes index.html, one page per month (months/YYYY-MM.html), one per author
+# (authors/<id>.html) and the author list (authors/index.html), with a thumbnail
+# and a web-sized copy of every winning photo in img/. The build is incremental:
+# manifest.json records a hash of the inputs of every page and the renditions
+# already made, so adding one winner rewrites a handful of pages and renders
+# one photo. The bot runs the same build after each close (GALLERY=1).
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+from html import escape
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+from blobcache import BlobCache, url_key
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Bump when the HTML below changes: every page is rewritten once.
+TEMPLATE_VERSION = 1
+THUMB_SIZE = 320
+WEB_SIZE = 1600
+MANIFEST = "manifest.json"
+
+STYLE = """
+body{font-family:system-ui,sans-serif;margin:0 auto;max-width:1100px;padding:1rem;background:#111;color:#eee}
+a{color:#8cf}nav{margin-bottom:1rem}
+.grid{display:grid;grid-template-columns:repeat(auto-fill,minmax(220px,1fr));gap:1rem}
+figure{margin:0;background:#1c1c1c;padding:.5rem;border-radius:6px}
+figure img{width:100%;height:220px;object-fit:cover;display:block}
+figcaption{font-size:.9rem;margin-top:.4rem}
+.monthly{outline:2px solid #d4af37}
+"""
+
+
+# --- collecting winners ---
+
+def collect_winners(results, weekly_entries=(), blobs: BlobCache = None):
+    # Winners from the results database, each with "sha" (image cache key, or
+    # None) and "source" (local file to render from, or None: the page then
+    # links the remote URL). The weekly list of monthly.json knows the cache
+    # key of each weekly winner; monthly re-uploads are found by URL.
+    shas = {url_key(e["image_url"]): e["image_sha256"] for e in weekly_entries if e.get("image_sha256")}
+    winners = []
+    for row in results.winners():
+        url = row.get("image_url") or ""
+        sha = shas.get(url_key(url)) or (blobs.sha_for(url) if blobs is not None and url else None)
+        path = blobs.path_for(sha) if blobs is not None and sha else None
+        winners.append(dict(row, sha=sha, source=str(path) if path else None))
+    return winners
+
+
+# --- renditions (worker processes) ---
+
+def render(source: str, sha: str, img_dir: str):
+    # Writes img/thumb/<sha>.jpg and img/web/<sha>.jpg. Without Pillow the
+    # original file is used for both.
+    img_dir = Path(img_dir)
+    targets = ((img_dir / "web" / f"{sha}.jpg", WEB_SIZE), (img_dir / "thumb" / f"{sha}.jpg", THUMB_SIZE))
+    if Image is None:
+        for target, _ in targets:
+            shutil.copyfile(source, target)
+        return sha
+    with Image.open(source) as img:
+        # Decode a JPEG at a reduced scale straight away when it is large.
+        img.draft("RGB", (WEB_SIZE, WEB_SIZE))
+        img = img.convert("RGB")
+        # Largest first: the thumbnail is resized from the web copy.
+        for target, size in targets:
+            img.thumbnail((size, size), Image.Resampling.LANCZOS)
+            tmp = target.with_suffix(".tmp")
+            img.save(tmp, "JPEG", quality=85, optimize=True, progressive=True)
+            os.replace(tmp, target)
+    return sha
+
+
+# --- pages ---
+
+def author_name(winner: dict, names: dict) -> str:
+    name = names.get(winner["author_id"])
+    if name:
+        return name
+    mention = winner.get("author_mention") or ""
+    # A raw "<@123>" means nothing outside Discord.
+    return mention if mention and not mention.startswith("<@") else f"Membre {winner['author_id']}"
+
+
+def month_of(winner: dict) -> str:
+    return (winner.get("closed_at") or "0000-00")[:7]
+
+
+def _figure(w: dict, names: dict, root: str) -> str:
+    if w["sha"] and w["source"]:
+        thumb = f"{root}img/thumb/{w['sha']}.jpg"
+        full = f"{root}img/web/{w['sha']}.jpg"
+    else:
+        thumb = full = w.get("image_url") or ""
+    if w["contest_type"] == "monthly":
+        label = "Gagnant(e) mensuel(le)"
+    else:
+        label = f"Semaine #{w['week_no']}" if w.get("week_no") else "Gagnant(e) de la semaine"
+    name = author_name(w, names)
+    return (
+        f'<figure class="{escape(w["contest_type"])}"><a href="{escape(full)}">'
+        f'<img src="{escape(thumb)}" alt="{escape(name)}" loading="lazy"></a>'
+        f'<figcaption>{escape(label)} • <a href="{root}authors/{w["author_id"]}.html">{escape(name)}</a>'
+        f' • {int(w["votes"])} votes • {escape((w.get("closed_at") or "")[:10])}</figcaption></figure>'
+    )
+
+
+def _page(title: str, body: str, root: str) -> str:
+    return (
+        f'<!doctype html><html lang="fr"><head><meta charset="utf-8">'
+        f'<meta name="viewport" content="width=device-width,initial-scale=1">'
+        f'<title>{escape(title)}</title><style>{STYLE}</style></head><body>'
+        f'<nav><a href="{root}index.html">Accueil</a> • <a href="{root}authors/index.html">Photographes</a></nav>'
+        f'<h1>{escape(title)}</h1>{body}</body></html>'
+    )
+
+
+def _grid(winners, names, root) -> str:
+    return '<div class="grid">' + "".join(_figure(w, names, root) for w in winners) + "</div>"
+
+
+def plan_pages(winners, names: dict, title: str):
+    # Returns {relative path: (inputs, render)}. inputs is what the page shows,
+    # so its hash says whether the page must be rewritten.
+    def shown(w):
+        return (w["contest_type"], w.get("week_no"), w["author_id"], author_name(w, names), w.get("image_url"),
+                w["votes"], w.get("closed_at"), w["sha"], bool(w["source"]))
+
+    by_month, by_author = {}, {}
+    for w in winners:
+        by_month.setdefault(month_of(w), []).append(w)
+        by_author.setdefault(w["author_id"], []).append(w)
+    months = sorted(by_month, reverse=True)
+    authors = sorted(by_author, key=lambda a: (-len(by_author[a]), author_name(by_author[a][0], names).lower()))
+    pages = {}
+
+    for month, ws in by_month.items():
+        pages[f"months/{month}.html"] = (
+            [shown(w) for w in ws],
+            lambda month=month, ws=ws: _page(f"{title} — {month}", _grid(ws, names, "../"), "../"),
+        )
+    for author_id, ws in by_author.items():
+        name = author_name(ws[0], names)
+        pages[f"authors/{author_id}.html"] = (
+            [shown(w) for w in ws],
+            lambda name=name, ws=ws: _page(f"{title} — {name}", _grid(ws[::-1], names, "../"), "../"),
+        )
+
+    def author_list():
+        items = "".join(
+            f'<li><a href="{a}.html">{escape(author_name(by_author[a][0], names))}</a> — '
+            f'{len(by_author[a])} victoire(s)</li>' for a in authors
+        )
+        return _page(f"{title} — Photographes", f"<ul>{items}</ul>", "../")
+
+    pages["authors/index.html"] = (
+        [(a, author_name(by_author[a][0], names), len(by_author[a])) for a in authors],
+        author_list,
+    )
+
+    # The home page shows the latest winners and links every month.
+    latest = winners[-12:][::-1]
+
+    def home():
+        links = "".join(f'<li><a href="months/{m}.html">{m}</a> — {len(by_month[m])} photo(s)</li>' for m in months)
+        body = "<h2>Derniers gagnants</h2>" + _grid(latest, names, "") + f"<h2>Par mois</h2><ul>{links}</ul>"
+        return _page(title, body, "")
+
+    pages["index.html"] = (
+        [[shown(w) for w in latest], [(m, len(by_month[m])) for m in months]],
+        home,
+    )
+    return pages
+
+
+def _digest(inputs) -> str:
+    raw = json.dumps([TEMPLATE_VERSION, inputs], ensure_ascii=False, default=str, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _write(path: Path, text: str):
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def build_gallery(out_dir: Path, winners, names: dict = None, title: str = "Galerie des gagnants", workers: int = 2,
+                  progress=None):
+    # Blocking; the bot runs it in its worker process (worker.py). Returns
+    # build stats. progress(done, total) is called after each photo and page.
+    started = time.perf_counter()
+    names = names or {}
+    winners = [dict(w) for w in winners]
+    out_dir = Path(out_dir)
+    for sub in ("months", "authors", "img/thumb", "img/web"):
+        (out_dir / sub).mkdir(parents=True, exist_ok=True)
+    try:
+        manifest = json.loads((out_dir / MANIFEST).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        manifest = {}
+    old_pages = manifest.get("pages", {})
+    rendered = set(manifest.get("images", []))
+    stats = {"pages_written": 0, "pages_kept": 0, "pages_removed": 0, "images_rendered": 0, "images_failed": 0}
+
+    # Renditions first, so a page never links a missing file.
+    img_dir = out_dir / "img"
+    todo = {}
+    for w in winners:
+        sha = w["sha"]
+        if sha and w["source"] and sha not in todo:
+            if sha not in rendered or not (img_dir / "web" / f"{sha}.jpg").exists():
+                todo[sha] = w["source"]
+    # One page per month and per author, plus the home page and author list.
+    total = len(todo) + len({month_of(w) for w in winners}) + len({w["author_id"] for w in winners}) + 2
+    done = 0
+    if todo:
+        pool = ProcessPoolExecutor(max_workers=max(1, min(workers, len(todo))))
+        try:
+            futures = {sha: pool.submit(render, source, sha, str(img_dir)) for sha, source in todo.items()}
+            for sha, future in futures.items():
+                try:
+                    future.result()
+                    rendered.add(sha)
+                    stats["images_rendered"] += 1
+                except Exception as e:
+                    stats["images_failed"] += 1
+                    print(f"gallery: could not render {sha}:", e)
+                done += 1
+                if progress is not None:
+                    progress(done, total)
+        finally:
+            # A cancelled build (progress raised) drops the photos not started.
+            pool.shutdown(cancel_futures=True)
+    for w in winners:
+        if w["sha"] not in rendered:
+            # Falls back to the remote URL on the pages.
+            w["source"] = None
+
+    pages = {}
+    for rel, (inputs, make) in plan_pages(winners, names, title).items():
+        digest = _digest(inputs)
+        pages[rel] = digest
+        done += 1
+        if progress is not None:
+            progress(done, total)
+        if old_pages.get(rel) == digest and (out_dir / rel).exists():
+            stats["pages_kept"] += 1
+            continue
+        _write(out_dir / rel, make())
+        stats["pages_written"] += 1
+    for rel in set(old_pages) - set(pages):
+        try:
+            (out_dir / rel).unlink()
+            stats["pages_removed"] += 1
+        except OSError:
+            pass
+
+    _write(out_dir / MANIFEST, json.dumps({"pages": pages, "images": sorted(rendered)}, separators=(",", ":")))
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return stats
+
+
+def main(argv=None):
+    from zoneinfo import ZoneInfo
+    from results_db import ResultsDB
+    from stores import MonthlyStore
+
+    parser = argparse.ArgumentParser(description="Static HTML gallery of past weekly and monthly winners.")
+    parser.add_argument("--contest-dir", type=Path, required=True, help="directory holding results.db and monthly.json")
+    parser.add_argument("--blobs", type=Path, help="image cache directory (default: <contest-dir>/blobs)")
+    parser.add_argument("--out", type=Path, required=True)
+    parser.add_argument("--title", default="Galerie des gagnants")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--timezone", default="Europe/Paris")
+    args = parser.parse_args(argv)
+
+    results = ResultsDB(args.contest_dir / "results.db")
+    monthly = MonthlyStore(args.contest_dir / "monthly.json", ZoneInfo(args.timezone))
+    blobs = BlobCache(args.blobs or args.contest_dir / "blobs", max_bytes=1 << 62)
+    try:
+        winners = collect_winners(results, monthly.data.get("weekly", []), blobs)
+    finally:
+        results.close()
+    stats = build_gallery(args.out, winners, title=args.title, workers=args.workers)
+    print(json.dumps(dict(stats, winners=len(winners))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import struct
+import asyncio
+
+import aiohttp
+
+# Submission validation from attachment metadata and the first bytes of the
+# file only: enough to know the real format and the pixel size without
+# downloading a 20 MB photo.
+
+HEAD_BYTES = 4096
+# JPEG puts its size after the EXIF block, which can hold a thumbnail.
+MAX_HEAD_BYTES = 256 * 1024
+
+
+class NotAnImage(ValueError):
+    pass
+
+
+def _jpeg_size(head: bytes):
+    # Walks the marker segments up to the first SOFn frame header.
+    i = 2
+    n = len(head)
+    while True:
+        while i < n and head[i] != 0xFF:
+            i += 1
+        while i < n and head[i] == 0xFF:
+            i += 1
+        if i >= n:
+            return None
+        marker = head[i]
+        i += 1
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            continue
+        if marker in (0xD9, 0xDA):
+            raise NotAnImage("JPEG without a frame header")
+        if i + 2 > n:
+            return None
+        length = struct.unpack(">H", head[i:i + 2])[0]
+        if length < 2:
+            raise NotAnImage("corrupt JPEG segment")
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            if i + 7 > n:
+                return None
+            height, width = struct.unpack(">HH", head[i + 3:i + 7])
+            return width, height
+        i += length
+
+
+def _webp_size(head: bytes):
+    if len(head) < 30:
+        return None
+    chunk = head[12:16]
+    if chunk == b"VP8 ":
+        if head[23:26] != b"\x9d\x01\x2a":
+            raise NotAnImage("corrupt WebP")
+        width, height = struct.unpack("<HH", head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        if head[20] != 0x2F:
+            raise NotAnImage("corrupt WebP")
+        bits = int.from_bytes(head[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        return int.from_bytes(head[24:27], "little") + 1, int.from_bytes(head[27:30], "little") + 1
+    raise NotAnImage("unknown WebP chunk")
+
+
+def probe_image(head: bytes):
+    # Returns (format, width, height), or None when more bytes are needed.
+    # Raises NotAnImage for anything that is not a well-formed JPEG/PNG/WebP/GIF.
+    if head[:3] == b"\xff\xd8\xff":
+        size = _jpeg_size(head)
+        return None if size is None else ("jpeg",) + size
+    if head[:8] == b"\x89PNG\r\n\x1a\n":
+        if len(head) < 24:
+            return None
+        if head[12:16] != b"IHDR":
+            raise NotAnImage("PNG without IHDR")
+        return ("png",) + struct.unpack(">II", head[16:24])
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        size = _webp_size(head)
+        return None if size is None else ("webp",) + size
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        if len(head) < 10:
+            return None
+        return ("gif",) + struct.unpack("<HH", head[6:10])
+    if len(head) < 12:
+        return None
+    raise NotAnImage("unrecognised file signature")
+
+
+class AttachmentValidator:
+    # Rejection reasons: "type", "size", "dimensions", "corrupt". Metadata
+    # checks are synchronous; the header check streams the start of the file
+    # with a Range request and stops as soon as the dimensions are known.
+
+    def __init__(self, allowed_types=("image/jpeg", "image/png", "image/webp"), max_bytes: int = 25 * 1024 * 1024,
+                 min_side: int = 640, max_side: int = 16384, timeout: float = 15.0, session=None):
+        self.allowed_types = tuple(allowed_types)
+        self.allowed_formats = {t.split("/", 1)[1] for t in self.allowed_types}
+        self.max_bytes = max_bytes
+        self.min_side = min_side
+        self.max_side = max_side
+        self.timeout = timeout
+        self.session = session
+        self.stats = {"accepted": 0, "rejected": 0, "failed": 0, "bytes_read": 0}
+
+    def check_metadata(self, attachment):
+        content_type = (attachment.content_type or "").split(";", 1)[0].strip().lower()
+        if content_type not in self.allowed_types:
+            return "type"
+        if attachment.size > self.max_bytes:
+            return "size"
+        # Discord fills these in for images it could decode.
+        if attachment.width and attachment.height and not self._side_ok(attachment.width, attachment.height):
+            return "dimensions"
+        return None
+
+    def _side_ok(self, width: int, height: int) -> bool:
+        return min(width, height) >= self.min_side and max(width, height) <= self.max_side
+
+    async def read_head(self, url: str) -> bytes:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        head = b""
+        want = HEAD_BYTES
+        async with self.session.get(url, headers={"Range": f"bytes=0-{MAX_HEAD_BYTES - 1}"}) as resp:
+            if resp.status not in (200, 206):
+                raise aiohttp.ClientResponseError(resp.request_info, resp.history, status=resp.status)
+            # Most files are settled by the first 4 KB; read more only while
+            # the header is incomplete.
+            while len(head) < MAX_HEAD_BYTES:
+                chunk = await resp.content.read(want - len(head))
+                if not chunk:
+                    break
+                head += chunk
+                if len(head) < want:
+                    continue
+                try:
+                    if probe_image(head) is not None:
+                        break
+                except NotAnImage:
+                    break
+                want = min(want * 4, MAX_HEAD_BYTES)
+        self.stats["bytes_read"] += len(head)
+        return head
+
+    async def read_range(self, url: str, start: int, length: int) -> bytes:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        async with self.session.get(url, headers={"Range": f"bytes={start}-{start + length - 1}"}) as resp:
+            if resp.status == 416:
+                return b""
+            if resp.status != 206:
+                # A server ignoring Range would send the whole file.
+                raise aiohttp.ClientResponseError(resp.request_info, resp.history, status=resp.status)
+            data = await resp.content.read(length)
+        self.stats["bytes_read"] += len(data)
+        return data
+
+    async def inspect(self, attachment):
+        # (reason, head): why the file is refused (None if it is fine) and the
+        # bytes read, for callers that also want the metadata in them (EXIF).
+        # head is None if the read failed.
+        try:
+            head = await self.read_head(attachment.url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Not the member's fault: keep the photo.
+            self.stats["failed"] += 1
+            print(f"AttachmentValidator: could not read {attachment.filename}:", e)
+            return None, None
+        reason = self.check_head(head)
+        self.stats["rejected" if reason else "accepted"] += 1
+        return reason, head
+
+    def check_head(self, head: bytes):
+        try:
+            info = probe_image(head)
+        except NotAnImage:
+            return "corrupt"
+        if info is None:
+            # Truncated file, or a JPEG whose metadata exceeds MAX_HEAD_BYTES.
+            return "corrupt" if len(head) < MAX_HEAD_BYTES else None
+        fmt, width, height = info
+        if fmt not in self.allowed_formats:
+            return "type"
+        if not self._side_ok(width, height):
+            return "dimensions"
+        return None
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
@@ -0,0 +1,192 @@
+import time
+import heapq
+import asyncio
+import itertools
+from pathlib import Path
+from datetime import datetime, timedelta
+
+from storage import JournaledStore
+
+# Catch-up policies for jobs found overdue (bot down, host suspended, ...):
+#   "run"             fire once, however late
+#   "skip"            drop the missed occurrence
+#   "run_within:<s>"  fire only if no more than <s> seconds late
+CATCH_UP_RUN = "run"
+CATCH_UP_SKIP = "skip"
+
+
+def run_within(seconds: int) -> str:
+    return f"run_within:{int(seconds)}"
+
+
+def next_weekday_dt(now, target_weekday, hour, minute):
+    days_ahead = (target_weekday - now.weekday()) % 7
+    candidate = (now + timedelta(days=days_ahead)).replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if candidate <= now:
+        candidate = candidate + timedelta(days=7)
+    return candidate
+
+
+class JobScheduler(JournaledStore):
+    # Persistent timer heap. Jobs are keyed by id; rescheduling or cancelling
+    # leaves the old heap entry in place and it is skipped when popped, so
+    # every operation is O(log n).
+
+    def __init__(self, path: Path, tz, handlers: dict, resync_sec: float = 60.0, late_grace_sec: float = 120.0,
+                 wall_clock=time.time):
+        super().__init__(path, write_delay=0.5, compact_every=200)
+        self.tz = tz
+        self.handlers = handlers
+        self.resync_sec = resync_sec
+        self.late_grace_sec = late_grace_sec
+        self.wall_clock = wall_clock
+        self._jobs = {}
+        self._heap = []
+        self._counter = itertools.count()
+        self._wake = None
+        self._running = {}
+        self.load()
+
+    # --- persistence ---
+    def snapshot(self):
+        return {"jobs": self._jobs}
+
+    def restore(self, data):
+        self._jobs = {}
+        self._heap = []
+        for job in data.get("jobs", {}).values():
+            self._put(job)
+
+    def apply(self, op):
+        if op["op"] == "put":
+            self._put(dict(op["job"]))
+        elif op["op"] == "remove":
+            self._jobs.pop(op["job_id"], None)
+
+    def _put(self, job):
+        self._jobs[job["id"]] = job
+        heapq.heappush(self._heap, (job["due"], next(self._counter), job["id"]))
+
+    def _poke(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    # --- public API ---
+    def schedule(self, job_id: str, kind: str, due: datetime, recurrence: dict = None,
+                 catch_up: str = CATCH_UP_RUN, payload: dict = None):
+        self.commit({"op": "put", "job": {
+            "id": job_id,
+            "kind": kind,
+            "due": due.timestamp(),
+            "recurrence": recurrence,
+            "catch_up": catch_up,
+            "payload": payload or {}
+        }})
+        self._poke()
+
+    def ensure_weekly(self, job_id: str, kind: str, weekday: int, hour: int, minute: int,
+                      catch_up: str = CATCH_UP_RUN, payload: dict = None):
+        recurrence = {"weekday": weekday, "hour": hour, "minute": minute}
+        job = self._jobs.get(job_id)
+        if job and job.get("recurrence") == recurrence and job.get("catch_up") == catch_up \
+                and job.get("payload", {}) == (payload or {}):
+            return
+        due = next_weekday_dt(datetime.now(self.tz), weekday, hour, minute)
+        self.schedule(job_id, kind, due, recurrence, catch_up, payload)
+
+    def cancel(self, job_id: str):
+        if job_id in self._jobs:
+            self.commit({"op": "remove", "job_id": job_id})
+            self._poke()
+
+    def get(self, job_id: str):
+        return self._jobs.get(job_id)
+
+    def upcoming(self, limit: int = 10):
+        jobs = heapq.nsmallest(limit, self._jobs.values(), key=lambda j: j["due"])
+        return [dict(j, due_dt=datetime.fromtimestamp(j["due"], self.tz)) for j in jobs]
+
+    # --- timing ---
+    def _peek(self):
+        while self._heap:
+            due, _, job_id = self._heap[0]
+            job = self._jobs.get(job_id)
+            if job is not None and job["due"] == due:
+                return job
+            heapq.heappop(self._heap)
+        return None
+
+    def _next_due(self, job, fired_at: float):
+        rec = job.get("recurrence")
+        if not rec:
+            return None
+        base = datetime.fromtimestamp(max(fired_at, job["due"]), self.tz)
+        return next_weekday_dt(base, rec["weekday"], rec["hour"], rec["minute"])
+
+    def _should_fire(self, job, now: float) -> bool:
+        late = now - job["due"]
+        if late <= self.late_grace_sec:
+            return True
+        policy = job.get("catch_up", CATCH_UP_RUN)
+        if policy == CATCH_UP_RUN:
+            return True
+        if policy.startswith("run_within:"):
+            return late <= int(policy.split(":", 1)[1])
+        return False
+
+    async def run(self):
+        self._wake = asyncio.Event()
+        while True:
+            self._wake.clear()
+            job = self._peek()
+            if job is None:
+                await self._wake.wait()
+                continue
+            remaining = job["due"] - self.wall_clock()
+            if remaining > 0:
+                # Sleep on the loop's monotonic clock, but never longer than
+                # resync_sec before re-reading the wall clock (DST, suspend,
+                # NTP steps).
+                try:
+                    await asyncio.wait_for(self._wake.wait(), min(remaining, self.resync_sec))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = self.wall_clock()
+            fire = self._should_fire(job, now)
+            next_due = self._next_due(job, now)
+            if next_due is None:
+                self.commit({"op": "remove", "job_id": job["id"]})
+            else:
+                self.schedule(job["id"], job["kind"], next_due, job.get("recurrence"), job.get("catch_up"),
+                              job.get("payload"))
+            if fire:
+                self._launch(job, now)
+            else:
+                print(f"JobScheduler: skipped missed {job['id']} due "
+                      f"{datetime.fromtimestamp(job['due'], self.tz).isoformat()} (policy {job.get('catch_up')})")
+
+    def _launch(self, job, now: float):
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            print(f"JobScheduler: no handler for job kind {job['kind']!r}")
+            return
+        late = now - job["due"]
+        if late > self.late_grace_sec:
+            print(f"JobScheduler: catching up {job['id']} ({int(late)}s late)")
+        print(f"JobScheduler: firing {job['id']}")
+        # Each job runs in its own task so a long close never delays the next job.
+        task = asyncio.get_running_loop().create_task(self._call(handler, job))
+        self._running[job["id"]] = task
+        task.add_done_callback(lambda t, job_id=job["id"]: self._running.pop(job_id, None)
+                               if self._running.get(job_id) is t else None)
+
+    async def _call(self, handler, job):
+        try:
+            await handler(**job.get("payload", {}))
+        except Exception as e:
+            print(f"Scheduled event error ({job['id']}):", e)
+
+    def running(self):
+        return list(self._running)
@@ -1,15 +1,35 @@
 import os
-import json
-import re
+import io
 import discord
 import asyncio
+import time
 from pathlib import Path
 from discord.ext import commands
 from discord import app_commands
 from dotenv import load_dotenv
-from collections import defaultdict
 from datetime import datetime, timezone, timedelta
 from zoneinfo import ZoneInfo
+from contest_logic import (
+    FALLBACK_VOTE_EMOJI, WEEKLY_THREAD_PREFIX, MONTHLY_THREAD_PREFIX, parse_entry_author, eligible_entries,
+    select_winners, participant_ranks
+)
+from contests import load_contests
+from outbound import OutboundScheduler, PRIORITY_ANNOUNCEMENT, PRIORITY_VOTE_POST, PRIORITY_REACTION, PRIORITY_DM
+from moderation import ModerationQueue
+from jobs import JobScheduler, run_within, CATCH_UP_RUN
+from supervisor import TaskSupervisor, command_tree_hash
+from metrics import MetricsRegistry, monitor_event_loop, serve_metrics
+from voters import VoterCounter
+import phash
+from blobcache import BlobCache, url_expired
+from imageprobe import AttachmentValidator, MAX_HEAD_BYTES
+import diagnostics
+import export
+import exif
+import ranked
+from worker import JobWorker, JobError
+
+PROCESS_STARTED = time.monotonic()
 
 load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
@@ -23,8 +43,51 @@ VOTE_EMOJI = os.getenv("VOTE_EMOJI", "🗳️")
 MONTHLY_ENABLED = os.getenv("MONTHLY_ENABLED", "1") == "1"
 MONTHLY_VOTE_DURATION_MIN = int(os.getenv("MONTHLY_VOTE_DURATION_MIN", "1380"))
 MONTHLY_VOTE_EMOJI = os.getenv("MONTHLY_VOTE_EMOJI", VOTE_EMOJI)
+EXACT_VOTES = os.getenv("EXACT_VOTES", "0") == "1"
+EXACT_VOTES_CONCURRENCY = int(os.getenv("EXACT_VOTES_CONCURRENCY", "8"))
+# Vote by ranking photos (Schulze method, needs numpy) instead of reacting.
+RANKED_VOTES = os.getenv("RANKED_VOTES", "0") == "1"
+# Photos per ballot; the menu holds at most 25 options, one of them "remove".
+RANKED_BALLOT_SIZE = max(1, min(24, int(os.getenv("RANKED_BALLOT_SIZE", "5"))))
+# DM each participant their rank after a close; NOTIFY_CONCURRENCY DMs in flight.
+NOTIFY_PARTICIPANTS = os.getenv("NOTIFY_PARTICIPANTS", "0") == "1"
+NOTIFY_CONCURRENCY = max(1, int(os.getenv("NOTIFY_CONCURRENCY", "4")))
+DUPLICATE_CHECK = os.getenv("DUPLICATE_CHECK", "1") == "1"
+# Hamming distance (out of 64 bits) under which two photos count as the same shot.
+DUPLICATE_MAX_DISTANCE = int(os.getenv("DUPLICATE_MAX_DISTANCE", "6"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))
+BLOB_CACHE_MAX_MB = int(os.getenv("BLOB_CACHE_MAX_MB", "1024"))
+GALLERY = os.getenv("GALLERY", "1") == "1"
+GALLERY_WORKERS = int(os.getenv("GALLERY_WORKERS", "2"))
+# Low-memory profile: minimal intents, no member cache, no message cache
+# unless MESSAGE_CACHE_SIZE asks for one.
+LEAN = os.getenv("LEAN", "0") == "1"
+MESSAGE_CACHE_SIZE = int(os.getenv("MESSAGE_CACHE_SIZE", "0" if LEAN else "1000"))
+# Heavy jobs run in a child process (worker.py); WORKER=0 runs them in a thread.
+WORKER = os.getenv("WORKER", "1") == "1"
+WORKER_JOB_TIMEOUT_SEC = float(os.getenv("WORKER_JOB_TIMEOUT_SEC", "600"))
+SUBMISSION_VALIDATION = os.getenv("SUBMISSION_VALIDATION", "1") == "1"
+SUBMISSION_TYPES = [t.strip() for t in os.getenv("SUBMISSION_TYPES", "image/jpeg,image/png,image/webp").split(",") if t.strip()]
+SUBMISSION_MAX_MB = float(os.getenv("SUBMISSION_MAX_MB", "25"))
+SUBMISSION_MIN_SIDE = int(os.getenv("SUBMISSION_MIN_SIDE", "640"))
+SUBMISSION_MAX_SIDE = int(os.getenv("SUBMISSION_MAX_SIDE", "16384"))
+# Index the EXIF data of accepted submissions for /recherche.
+EXIF_INDEX = os.getenv("EXIF_INDEX", "1") == "1"
 # ================================
 
+TALLY_CHECKPOINT_SEC = int(os.getenv("TALLY_CHECKPOINT_SEC", "10"))
+# Long enough to span the Saturday open -> Sunday close window without auto-archiving.
+WEEKLY_THREAD_ARCHIVE_MIN = int(os.getenv("WEEKLY_THREAD_ARCHIVE_MIN", "4320"))
+OUTBOUND_CONCURRENCY = int(os.getenv("OUTBOUND_CONCURRENCY", "4"))
+MODERATION_BATCH_SEC = float(os.getenv("MODERATION_BATCH_SEC", "1.0"))
+MODERATION_DM_COALESCE_SEC = float(os.getenv("MODERATION_DM_COALESCE_SEC", "600"))
+MODERATION_MAX_PENDING = int(os.getenv("MODERATION_MAX_PENDING", "500"))
+STORE_WRITE_DELAY_SEC = float(os.getenv("STORE_WRITE_DELAY_SEC", "0.5"))
+STORE_COMPACT_EVERY = int(os.getenv("STORE_COMPACT_EVERY", "500"))
+# 0 disables the /metrics endpoint; keep it on localhost unless scraped remotely.
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
 TIMEZONE = os.getenv("TIMEZONE", "Europe/Paris")
 SHARE_WEEKDAY = int(os.getenv("SHARE_WEEKDAY", "0"))
 SHARE_HOUR = int(os.getenv("SHARE_HOUR", "18"))
@@ -39,421 +102,935 @@ RESULT_HOUR = int(os.getenv("RESULT_HOUR", "18"))
 RESULT_MIN = int(os.getenv("RESULT_MIN", "00"))
 
 TEST_MODE = os.getenv("TEST_MODE", "0") == "1"
+# Where the stores, jobs.json and the command tree hash live (default: next to main.py).
+DATA_DIR = Path(os.getenv("DATA_DIR") or Path(__file__).parent)
 TEST_WAIT_SEC = int(os.getenv("TEST_WAIT_SEC", "10"))
+GALLERY_DIR = Path(os.getenv("GALLERY_DIR") or DATA_DIR / "gallery")
+EXPORT_DIR = Path(os.getenv("EXPORT_DIR") or DATA_DIR / "exports")
 
 tz = ZoneInfo(TIMEZONE)
 
-user_submissions = defaultdict(int)
-last_photo_call = None
+# === Contests (one per photo channel; see contests.py for contests.json) ===
+default_contest_config = {
+    "id": "default",
+    "guild_id": int(os.getenv("GUILD_ID", "0")),
+    "photo_channel_id": PHOTO_CHANNEL_ID,
+    "result_channel_id": PHOTO_RESULT_CHANNEL_ID,
+    "role_ids": [REPORTER_ROLE_ID, REPORTER_BORDEAUX_ROLE_ID],
+    "vote_emoji": VOTE_EMOJI,
+    "monthly_enabled": MONTHLY_ENABLED,
+    "monthly_vote_emoji": MONTHLY_VOTE_EMOJI,
+    "monthly_vote_duration_min": MONTHLY_VOTE_DURATION_MIN,
+    "exact_votes": EXACT_VOTES,
+    "ranked_votes": RANKED_VOTES,
+    "notify_participants": NOTIFY_PARTICIPANTS,
+    "schedule": {
+        "share": [SHARE_WEEKDAY, SHARE_HOUR, SHARE_MIN],
+        "open": [OPEN_WEEKDAY, OPEN_HOUR, OPEN_MIN],
+        "result": [RESULT_WEEKDAY, RESULT_HOUR, RESULT_MIN],
+    },
+}
+
+registry = load_contests(
+    Path(os.getenv("CONTESTS_FILE", str(Path(__file__).with_name("contests.json")))),
+    default_contest_config,
+    DATA_DIR,
+    tz,
+    store_options={"write_delay": STORE_WRITE_DELAY_SEC, "compact_every": STORE_COMPACT_EVERY},
+    tally_options={"write_delay": TALLY_CHECKPOINT_SEC, "compact_every": STORE_COMPACT_EVERY},
+)
+
+# === Metrics (served in Prometheus/OpenMetrics text format on METRICS_PORT) ===
+metrics = MetricsRegistry("snaptastic")
+on_message_seconds = metrics.histogram("on_message_seconds", "Time spent handling one gateway message.")
+phase_seconds = metrics.histogram("phase_seconds", "Duration of each step of a contest phase.")
+close_seconds = metrics.histogram("close_seconds", "Duration of a contest close, from tally to archive.")
+history_messages = metrics.counter("history_messages", "Messages walked by channel history scans.")
+fallbacks = metrics.counter("fallbacks", "Fallback paths taken.")
+api_calls = metrics.counter("discord_api_calls", "Discord API calls made through the outbound scheduler.")
+rate_limited = metrics.counter("discord_rate_limited", "HTTP 429 responses seen by the outbound scheduler.")
+moderation_actions = metrics.counter("moderation_actions", "Photo channel moderation actions.")
+duplicate_checks = metrics.counter("duplicate_checks", "Perceptual-hash checks of new submissions, by result.")
+image_cache_lookups = metrics.counter("image_cache_lookups", "Local image cache lookups and evictions.")
+image_cache_bytes_saved = metrics.counter("image_cache_bytes_saved", "Image bytes served locally instead of downloaded.")
+image_cache_bytes = metrics.gauge("image_cache_bytes", "Size of the local image cache.")
+attachment_checks = metrics.counter("attachment_checks", "Header checks of submitted files, by outcome.")
+exif_photos = metrics.counter("exif_photos", "Photos read for the EXIF index, by outcome.")
+result_dms = metrics.counter("result_dms", "Result DMs to participants, by outcome.")
+reaction_user_lookups = metrics.counter("reaction_user_lookups", "Exact vote counting lookups, by outcome.")
+worker_jobs = metrics.counter("worker_jobs", "Jobs handed to the worker process, by outcome.")
+worker_jobs_running = metrics.gauge("worker_jobs_running", "Jobs running in the worker process.")
+loop_lag = metrics.gauge("event_loop_lag_seconds", "How late the last event loop probe woke up.")
+tasks_pending = metrics.gauge("tasks_pending", "Tasks alive on the event loop.")
+outbound_queue = metrics.gauge("outbound_queue_depth", "Outbound calls waiting, by priority.")
+store_bytes = metrics.gauge("store_file_bytes", "Size on disk of each store's snapshot and journal.")
+
+
+def collect_store_sizes():
+    store_bytes.clear()
+    for contest in registry:
+        for store in contest.stores():
+            for file, path in (("snapshot", store.path), ("journal", store.journal_path)):
+                try:
+                    size = path.stat().st_size
+                except OSError:
+                    size = 0
+                store_bytes.set(size, contest=contest.id, store=store.path.stem, file=file)
+        try:
+            store_bytes.set(contest.results.path.stat().st_size, contest=contest.id, store="results", file="sqlite")
+        except OSError:
+            pass
 
-# Simple JSON-backed winners store
-class WinnersStore:
-    def __init__(self, path: Path):
-        self.path = path
-        self._winners = set()
-        self._monthly_winners = set()
-        self._load()
 
-    def _load(self):
-        try:
-            if self.path.exists():
-                with self.path.open("r", encoding="utf-8") as f:
-                    data = json.load(f)
-                self._winners = set(int(x) for x in data.get("winners", []))
-                self._monthly_winners = set(int(x) for x in data.get("monthly_winners", []))
-            else:
-                self.save()
-        except Exception:
-            self._winners = set()
-            self._monthly_winners = set()
+def collect_outbound():
+    stats = outbound.stats()
+    for kind, count in stats["calls"].items():
+        api_calls.sync(count, route=kind)
+    rate_limited.sync(stats["rate_limited"])
+    for name, s in stats["priorities"].items():
+        outbound_queue.set(s["queue_depth"], priority=name)
+    for action, count in moderation.stats.items():
+        moderation_actions.sync(count, action=action)
+    for outcome, count in voter_counter.stats.items():
+        reaction_user_lookups.sync(count, outcome=outcome)
+
+
+def collect_image_cache():
+    for outcome in ("hits", "misses", "evictions"):
+        image_cache_lookups.sync(blob_cache.stats[outcome], outcome=outcome)
+    image_cache_bytes_saved.sync(blob_cache.stats["bytes_saved"])
+    image_cache_bytes.set(blob_cache.total_bytes)
+
+
+def collect_worker():
+    for outcome, count in job_worker.stats.items():
+        worker_jobs.sync(count, outcome=outcome)
+    worker_jobs_running.set(len(job_worker.running()))
+
+
+def collect_attachment_checks():
+    for outcome, count in attachment_validator.stats.items():
+        attachment_checks.sync(count, outcome=outcome)
+
+
+metrics.add_collector(collect_store_sizes)
+metrics.add_collector(collect_attachment_checks)
+metrics.add_collector(collect_worker)
+metrics.add_collector(collect_image_cache)
+metrics.add_collector(collect_outbound)
+
+
+async def record_results(contest, contest_type: str, week_no, thread_id: int, entries, winners):
+    try:
+        await job_worker.run("record_results", {
+            "db": str(contest.results.path),
+            "contest_type": contest_type,
+            "week_no": week_no,
+            "thread_id": thread_id,
+            "entries": entries,
+            "winner_ids": [e["message_id"] for e in winners],
+            "closed_at": datetime.now(tz).isoformat(),
+        })
+    except Exception as ex:
+        print(f"record_results ({contest.id}, {contest_type}) failed:", ex)
+
+
+async def count_votes(contest, thread, vote_emoji: str):
+    entries = contest.tally.entries_for(thread.id, vote_emoji) or []
+    if contest.ballots.has_thread(thread.id):
+        # Ranked thread: no more ballots from here on, and a photo's votes
+        # are the ballots ranking it.
+        contest.ballots.close_thread(thread.id)
+        ranked_by = contest.ballots.ranked_counts(thread.id)
+        for e in entries:
+            e["votes"] = ranked_by.get(e["message_id"], 0)
+        return entries
+    if not contest.exact_votes or not entries:
+        return entries
+    with phase_seconds.time(phase="close_exact_votes"):
+        return await voter_counter.count(thread.id, entries, vote_emoji, bot.user.id)
+
+
+async def decide_winners(contest, thread_id: int, eligible):
+    # (winners, score, tie_score); the scores end the results headline.
+    if not contest.ballots.has_thread(thread_id) or not ranked.AVAILABLE:
+        max_votes, winners = select_winners(eligible)
+        return winners, f"avec {max_votes} votes", f"avec {max_votes} votes chacun"
+    with phase_seconds.time(phase="close_schulze"):
+        result = await asyncio.to_thread(ranked.schulze, contest.ballots.ballots(thread_id),
+                                         [e["message_id"] for e in eligible])
+    by_message = {e["message_id"]: e for e in eligible}
+    score = f"au vote par classement ({result.ballots} bulletin(s))"
+    return [by_message[m] for m in result.winners], score, score
+
+
+async def reconcile_submissions(contest, photo_channel):
+    # Bounded catch-up for messages posted while the gateway was not delivering events.
+    after = contest.submissions.last_seen_at or contest.submissions.call_at
+    if after is None:
+        return
+    fallbacks.inc(path="submission_rescan")
+    added = 0
+    async for msg in photo_channel.history(limit=None, after=after, oldest_first=True):
+        history_messages.inc(scan="submissions")
+        if msg.author.bot or not msg.attachments:
+            continue
+        if contest.submissions.add(msg.author.id, msg.id, msg.attachments[0].url, msg.created_at):
+            added += 1
+    contest.submissions.stale = False
+    await contest.submissions.flush()
+    print(f"reconcile_submissions: {added} submission(s) recovered since {after.isoformat()}")
+
+
+async def reconcile_vote_thread(contest, thread, kind: str):
+    # One-time history scan, only used when the tally has no checkpoint for this thread.
+    fallbacks.inc(path="vote_thread_rescan")
+    found = 0
+    async for message in thread.history(limit=None):
+        history_messages.inc(scan=kind)
+        if not message.embeds:
+            continue
+        author_id, author_mention = parse_entry_author(message.content, kind)
 
-    def save(self):
         try:
-            self.path.parent.mkdir(parents=True, exist_ok=True)
-            with self.path.open("w", encoding="utf-8") as f:
-                json.dump({
-                    "winners": sorted(self._winners),
-                    "monthly_winners": sorted(self._monthly_winners)
-                }, f, indent=2)
+            img_url = message.embeds[0].image.url
         except Exception:
-            pass
+            img_url = None
+
+        if img_url and author_id:
+            counts = {str(reaction.emoji): reaction.count for reaction in message.reactions}
+            contest.tally.register(thread.id, message.id, kind, author_id,
+                                   author_mention or f"<@{author_id}>", img_url, counts)
+            found += 1
+    contest.tally.ensure_thread(thread.id)
+    await contest.tally.flush()
+    print(f"reconcile_vote_thread: {found} {kind} entries rebuilt from thread {thread.id}")
+# =====================================================================
 
-    def add(self, user_id: int):
-        if user_id not in self._winners:
-            self._winners.add(user_id)
-            self.save()
+# === Outbound Discord calls (rate-limited, prioritized) ===
+outbound = OutboundScheduler(max_concurrency=OUTBOUND_CONCURRENCY)
 
-    def remove_weekly(self, user_id: int) -> bool:
-        if user_id in self._winners:
-            self._winners.remove(user_id)
-            self.save()
-            return True
-        return False
+# === Worker process for heavy jobs (worker.py) ===
+job_worker = JobWorker(enabled=WORKER, job_timeout=WORKER_JOB_TIMEOUT_SEC)
+
+
+def announce(channel, *args, **kwargs):
+    return outbound.call(f"send:{channel.id}", PRIORITY_ANNOUNCEMENT, lambda: channel.send(*args, **kwargs))
+
+
+def edit_thread(thread, **kwargs):
+    return outbound.call(f"edit:{thread.id}", PRIORITY_ANNOUNCEMENT, lambda: thread.edit(**kwargs))
+
+
+def create_contest_thread(channel, **kwargs):
+    return outbound.call(f"thread:{channel.id}", PRIORITY_ANNOUNCEMENT, lambda: channel.create_thread(**kwargs))
+
+
+moderation = ModerationQueue(
+    outbound,
+    batch_window=MODERATION_BATCH_SEC,
+    dm_coalesce_sec=MODERATION_DM_COALESCE_SEC,
+    max_pending=MODERATION_MAX_PENDING
+)
 
-    def remove_monthly(self, user_id: int) -> bool:
-        if user_id in self._monthly_winners:
-            self._monthly_winners.remove(user_id)
-            self.save()
-            return True
-        return False
 
-    def contains(self, user_id: int) -> bool:
-        return user_id in self._winners
+# === Local image cache (winning photos outlive their signed CDN URLs) ===
+def pinned_images():
+    # Recent weekly winners may still be posted in a monthly contest.
+    return {w["image_sha256"] for contest in registry for w in contest.monthly.data.get("weekly", [])[-8:]
+            if w.get("image_sha256")}
 
-    def all(self):
-        return sorted(self._winners)
 
-    # Monthly winners methods
-    def add_monthly(self, user_id: int):
-        if user_id not in self._monthly_winners:
-            self._monthly_winners.add(user_id)
-            self.save()
+blob_cache = BlobCache(DATA_DIR / "blobs", BLOB_CACHE_MAX_MB * 1024 * 1024, pinned=pinned_images)
 
-    def monthly_contains(self, user_id: int) -> bool:
-        return user_id in self._monthly_winners
 
-    def monthly_all(self):
-        return sorted(self._monthly_winners)
+async def download_image(url: str) -> bytes:
+    return await bot.http.get_from_cdn(url)
 
-winners_store = WinnersStore(Path(__file__).with_name("winners.json"))
 
-# === Monthly persistence (weekly winners + monthly contest state) ===
-class MonthlyStore:
-    def __init__(self, path: Path):
-        self.path = path
-        self.data = {
-            "weekly": [],
-            "week_no": 0,
-            "last_monthly_week_no": 0,
-            "active": None
-        }
-        self._load()
+async def capture_image(url: str):
+    # Returns the sha256 of the cached copy, or None.
+    try:
+        sha, _ = await blob_cache.fetch(url, download_image)
+        return sha
+    except Exception as e:
+        print(f"Could not cache image {url}:", e)
+        return None
+
+
+async def image_kwargs(url: str, sha: str = None):
+    # Returns a callable building send() kwargs that show the image: its URL
+    # while still signed, else a fresh upload of the cached bytes. A callable
+    # because the outbound scheduler may retry, and a discord.File is spent
+    # once sent.
+    if not url_expired(url, datetime.now(timezone.utc).timestamp()):
+        return lambda: {"embed": discord.Embed().set_image(url=url)}
+    sha = sha or blob_cache.sha_for(url)
+    data = await blob_cache.serve(sha) if sha else None
+    if data is None:
+        fallbacks.inc(path="expired_image_url")
+        return lambda: {"embed": discord.Embed().set_image(url=url)}
+    filename = url_filename(url)
+    return lambda: {
+        "embed": discord.Embed().set_image(url=f"attachment://{filename}"),
+        "file": discord.File(io.BytesIO(data), filename=filename),
+    }
+
+
+def url_filename(url: str) -> str:
+    name = url.split("?", 1)[0].rsplit("/", 1)[-1]
+    return name if "." in name else "photo.jpg"
+
+
+async def announce_image(channel, url: str, sha: str = None):
+    make = await image_kwargs(url, sha)
+    return await outbound.call(f"send:{channel.id}", PRIORITY_ANNOUNCEMENT, lambda: channel.send(**make()))
+
+
+def posted_image_url(message, fallback: str) -> str:
+    try:
+        return message.embeds[0].image.url or fallback
+    except (IndexError, AttributeError):
+        return fallback
+
+
+# === Submission screening (file checks, then duplicates) ===
+attachment_validator = AttachmentValidator(
+    allowed_types=SUBMISSION_TYPES,
+    max_bytes=int(SUBMISSION_MAX_MB * 1024 * 1024),
+    min_side=SUBMISSION_MIN_SIDE,
+    max_side=SUBMISSION_MAX_SIDE,
+)
+
+SUBMISSION_NOTICES = {
+    "type": "❌ Ce fichier n'est pas accepté : seules les photos **JPEG, PNG ou WebP** sont acceptées.",
+    "size": f"❌ Cette photo est trop volumineuse (maximum **{SUBMISSION_MAX_MB:g} Mo**).",
+    "dimensions": f"❌ Cette photo est trop petite ou trop grande (au moins **{SUBMISSION_MIN_SIDE} px** de côté, "
+                  f"au plus {SUBMISSION_MAX_SIDE} px).",
+    "corrupt": "❌ Ce fichier image est illisible ou endommagé.",
+}
+SUBMISSION_RETRY = "\n🙏 Merci de partager une autre version de votre photo."
+
+
+def submission_screening_enabled() -> bool:
+    return SUBMISSION_VALIDATION or duplicate_check_enabled() or EXIF_INDEX
+
+
+async def screen_submission(contest, message):
+    # Runs as its own task per submission, so a burst is checked in parallel.
+    head = None
+    if SUBMISSION_VALIDATION:
+        reason, head = await attachment_validator.inspect(message.attachments[0])
+        if reason:
+            await moderation.reject(message, SUBMISSION_NOTICES[reason] + SUBMISSION_RETRY)
+            return
+    if duplicate_check_enabled() and not await check_submission_duplicate(contest, message):
+        return
+    if EXIF_INDEX:
+        await index_submission_exif(contest, message, head)
+
+
+# === Duplicate and repost detection ===
+_background_tasks = set()
+
+
+def spawn(coro):
+    # Keeps a reference until done so the task is not garbage collected.
+    task = asyncio.get_running_loop().create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
 
-    def _load(self):
+
+def duplicate_check_enabled() -> bool:
+    return DUPLICATE_CHECK and phash.AVAILABLE
+
+
+async def check_submission_duplicate(contest, message) -> bool:
+    # Runs after the submission is accepted: the download and the hash happen
+    # off the gateway handler, the hash in a worker process. False if the
+    # photo was rejected.
+    attachment = message.attachments[0]
+    try:
+        _, data = await blob_cache.fetch(attachment.url, lambda url: attachment.read())
+        image_hash = await phash.hash_image(data, HASH_WORKERS)
+    except Exception as e:
+        duplicate_checks.inc(result="failed")
+        print(f"Duplicate check skipped for message {message.id}:", e)
+        return True
+
+    # Lookup and add with no await in between: of two near-identical photos
+    # screened at the same time, the second one sees the first.
+    with phase_seconds.time(phase="duplicate_lookup"):
+        found = blocking_match(message.author.id, contest.hashes.near(image_hash, DUPLICATE_MAX_DISTANCE))
+    if found is None:
+        duplicate_checks.inc(result="unique")
+        contest.hashes.add(image_hash, attachment.url, message.author.id, message.id, message.created_at)
+        return True
+
+    distance, image = found
+    if image["winner"]:
+        duplicate_checks.inc(result="repost")
+        print(f"Submission {message.id} matches a past winner (distance {distance}): {image['url']}")
+        await moderation.reject(
+            message,
+            "❌ Cette photo a déjà gagné un concours précédent.\n"
+            "🙏 Merci de partager une nouvelle photo."
+        )
+    else:
+        duplicate_checks.inc(result="duplicate")
+        print(f"Submission {message.id} matches a photo by {image['author_id']} (distance {distance})")
+        await moderation.reject(
+            message,
+            "❌ Cette photo a déjà été partagée par un autre membre.\n"
+            "🙏 Merci de ne partager que vos propres photos."
+        )
+    return False
+
+
+def blocking_match(author_id: int, matches):
+    # Reposting one's own earlier photo is allowed unless it already won.
+    for distance, image in matches:
+        if image["winner"] or image["author_id"] != author_id:
+            return distance, image
+    return None
+
+
+async def index_winner_image(contest, author_id: int, url: str) -> bool:
+    # For winners whose submission was never hashed (older than this index).
+    try:
+        _, data = await blob_cache.fetch(url, download_image)
+        image_hash = await phash.hash_image(data, HASH_WORKERS)
+    except Exception as e:
+        print(f"Could not hash winning image {url}:", e)
+        return False
+    contest.hashes.add(image_hash, url, author_id, winner=True)
+    return True
+
+
+async def backfill_winner_hashes(contest):
+    added = 0
+    for w in list(contest.monthly.data.get("weekly", [])):
+        url = w.get("image_url")
+        if url and not contest.hashes.has_url(url):
+            added += await index_winner_image(contest, w["author_id"], url)
+    if added:
+        await contest.hashes.flush()
+        print(f"backfill_winner_hashes ({contest.id}): {added} winning photo(s) indexed")
+
+
+# === EXIF search index (exif.py, /recherche) ===
+async def index_submission_exif(contest, message, head: bytes = None):
+    # head: the bytes the file check already read. Without it (validation
+    # off or failed) the same short Range request is made here; the photo
+    # itself is never downloaded for this.
+    attachment = message.attachments[0]
+    if contest.exif.has_url(attachment.url):
+        return
+    try:
+        if head is None:
+            head = await attachment_validator.read_head(attachment.url)
+        offset = exif.webp_exif_offset(head)
+        if offset is None:
+            info = await asyncio.to_thread(exif.parse_exif, head)
+        else:
+            tail = await attachment_validator.read_range(attachment.url, offset, exif.MAX_TAIL_BYTES)
+            info = await asyncio.to_thread(exif.parse_webp_tail, tail)
+    except Exception as e:
+        exif_photos.inc(outcome="failed")
+        print(f"EXIF indexing skipped for message {message.id}:", e)
+        return
+    exif_photos.inc(outcome="indexed" if info else "no_exif")
+    contest.exif.add(attachment.url, message.author.id, info, message.id, message.created_at)
+
+
+def read_blob_exif(path: Path) -> dict:
+    with path.open("rb") as f:
+        head = f.read(MAX_HEAD_BYTES)
+        offset = exif.webp_exif_offset(head)
+        if offset is None:
+            return exif.parse_exif(head)
+        f.seek(offset)
+        return exif.parse_webp_tail(f.read(exif.MAX_TAIL_BYTES))
+
+
+async def backfill_winner_exif(contest):
+    # Past weekly winners, from their local copies only: their URLs have long
+    # expired, and a winner not in the image cache is simply left out.
+    added = 0
+    for w in list(contest.monthly.data.get("weekly", [])):
+        url = w.get("image_url")
+        if not url or contest.exif.has_url(url):
+            continue
+        path = blob_cache.path_for(w.get("image_sha256") or "")
+        if path is None:
+            continue
         try:
-            if self.path.exists():
-                with self.path.open("r", encoding="utf-8") as f:
-                    self.data = json.load(f)
-            else:
-                self.save()
-        except Exception:
-            self.data = {
-                "weekly": [],
-                "week_no": 0,
-                "last_monthly_week_no": 0,
-                "active": None
-            }
-            self.save()
-
-    def save(self):
+            info = await asyncio.to_thread(read_blob_exif, path)
+        except OSError as e:
+            print(f"Could not read winning image {url}:", e)
+            continue
+        contest.exif.add(url, w["author_id"], info, winner=True)
+        added += 1
+    if added:
+        await contest.exif.flush()
+        print(f"backfill_winner_exif ({contest.id}): {added} winning photo(s) indexed")
+
+
+# === Static winners gallery (gallery.py) ===
+gallery_lock = asyncio.Lock()
+
+
+def member_names(contest) -> dict:
+    guild = bot.get_guild(contest.guild_id) if contest.guild_id else None
+    return {m.id: m.display_name for m in guild.members} if guild is not None else {}
+
+
+async def update_gallery(contest):
+    # Runs after a close, in the worker process; one build at a time so two
+    # contests closing together do not both start GALLERY_WORKERS renderers.
+    if not GALLERY:
+        return
+    async with gallery_lock:
         try:
-            self.path.parent.mkdir(parents=True, exist_ok=True)
-            with self.path.open("w", encoding="utf-8") as f:
-                json.dump(self.data, f, indent=2)
-        except Exception:
-            pass
+            await blob_cache.save_urls()
+            with phase_seconds.time(phase="gallery"):
+                stats = await job_worker.run("gallery", {
+                    "db": str(contest.results.path),
+                    "weekly": contest.monthly.data.get("weekly", []),
+                    "blobs": str(blob_cache.directory),
+                    "out": str(GALLERY_DIR / contest.id),
+                    "names": member_names(contest),
+                    "title": f"Galerie des gagnants — {contest.name}",
+                    "workers": GALLERY_WORKERS,
+                })
+            print(f"update_gallery ({contest.id}):", stats)
+        except JobError as e:
+            print(f"update_gallery ({contest.id}):", e)
+        except Exception as e:
+            print(f"update_gallery ({contest.id}) failed:", e)
 
-    def begin_new_week(self):
-        self.data["week_no"] = int(self.data.get("week_no", 0)) + 1
-        self.save()
-
-    def add_weekly_winner(self, author_id: int, author_mention: str, image_url: str, votes: int):
-        entry = {
-            "author_id": author_id,
-            "author_mention": author_mention,
-            "image_url": image_url,
-            "votes": int(votes),
-            "week_no": int(self.data.get("week_no", 0)),
-            "created_at": datetime.now(tz).isoformat()
-        }
-        self.data["weekly"].append(entry)
-        self.save()
-
-    def months_due(self) -> bool:
-        return (int(self.data.get("week_no", 0)) - int(self.data.get("last_monthly_week_no", 0))) >= 4
-
-    def get_last_4_weeks_entries(self):
-        last_done = int(self.data.get("last_monthly_week_no", 0))
-        target_weeks = {last_done + 1, last_done + 2, last_done + 3, last_done + 4}
-        return [e for e in self.data.get("weekly", []) if int(e.get("week_no", 0)) in target_weeks]
-
-    def mark_monthly_consumed(self):
-        self.data["last_monthly_week_no"] = int(self.data.get("last_monthly_week_no", 0)) + 4
-        self.save()
-
-    def set_active(self, thread_id: int, thread_jump_url: str, opened_at_iso: str, ends_at_iso: str):
-        self.data["active"] = {
-            "thread_id": thread_id,
-            "thread_jump_url": thread_jump_url,
-            "opened_at": opened_at_iso,
-            "ends_at": ends_at_iso,
-            "closed": False
-        }
-        self.save()
-
-    def clear_active(self):
-        self.data["active"] = None
-        self.save()
-
-    def get_active(self):
-        return self.data.get("active")
-
-    def set_active_closed(self):
-        if self.data.get("active"):
-            self.data["active"]["closed"] = True
-            self.save()
-
-    def parse_active_ends_at(self):
-        active = self.get_active()
-        if not active:
-            return None
+
+async def add_vote_reaction(message, emoji: str):
+    try:
+        await message.add_reaction(emoji)
+    except Exception:
+        fallbacks.inc(path="fallback_vote_emoji")
+        await message.add_reaction(FALLBACK_VOTE_EMOJI)
+
+
+async def post_vote_entry(thread, content: str, image_url: str, emoji: str, on_posted, image_sha: str = None,
+                          view=None):
+    # Sends share one route and keep their order; each reaction is queued on
+    # the reaction route as soon as its message exists, so both pipelines run
+    # side by side at their own rate limits. Ranked threads (view = the
+    # ranking menu) get no reaction.
+    # Only photos with a local copy (monthly entries) are ever re-uploaded.
+    if image_sha:
+        make = await image_kwargs(image_url, image_sha)
+    else:
+        make = lambda: {"embed": discord.Embed().set_image(url=image_url)}
+    message = await outbound.call(
+        f"send:{thread.id}", PRIORITY_VOTE_POST,
+        lambda: thread.send(content=content, view=view, **make())
+    )
+    on_posted(message)
+    if view is None:
+        await outbound.call(f"reaction:{thread.id}", PRIORITY_REACTION, lambda: add_vote_reaction(message, emoji))
+    return message
+
+
+# === Ranked voting (ranked.py) ===
+def ranked_voting(contest) -> bool:
+    return contest.ranked_votes and ranked.AVAILABLE
+
+
+def rank_label(rank: int) -> str:
+    return "1er choix" if rank == 0 else f"{rank + 1}e choix"
+
+
+def how_to_vote(ranked_thread: bool, emoji: str) -> str:
+    if ranked_thread:
+        return (f"Pour voter, classez vos photos préférées avec le menu sous chaque photo (1er choix = votre préférée).\n\n"
+                f"• Vous pouvez classer jusqu'à {RANKED_BALLOT_SIZE} photos, et changer d'avis jusqu'à la fin")
+    return f"Pour voter, réagissez avec {emoji} sur vos photos préférées.\n\n• Vous pouvez voter pour plusieurs photos"
+
+
+class RankingMenu(discord.ui.View):
+    # The menu under every photo of a ranked thread. Persistent (no timeout,
+    # fixed custom_id): one instance, registered at startup, answers for
+    # every message, including those posted before a restart.
+    def __init__(self):
+        super().__init__(timeout=None)
+        options = [discord.SelectOption(label=rank_label(k), value=str(k)) for k in range(RANKED_BALLOT_SIZE)]
+        options.append(discord.SelectOption(label="Retirer de mon classement", value="remove"))
+        select = discord.ui.Select(custom_id="snaptastic:rank", placeholder="Classer cette photo…", options=options)
+        select.callback = rank_photo
+        self.add_item(select)
+
+
+_ranking_menu = None
+
+
+def ranking_menu() -> RankingMenu:
+    # Built on first use: a View needs the running event loop.
+    global _ranking_menu
+    if _ranking_menu is None:
+        _ranking_menu = RankingMenu()
+    return _ranking_menu
+
+
+async def rank_photo(interaction: discord.Interaction):
+    thread_id = interaction.channel_id
+    contest = registry.for_channel(thread_id)
+    if contest is None or not contest.ballots.is_open(thread_id):
+        await interaction.response.send_message("❌ Les votes de ce fil sont clos.", ephemeral=True)
+        return
+    author_id = contest.tally.author_of(interaction.message.id)
+    if author_id is None:
+        await interaction.response.send_message("❌ Cette photo ne fait pas partie du concours.", ephemeral=True)
+        return
+    if author_id == interaction.user.id:
+        await interaction.response.send_message("❌ Vous ne pouvez pas classer votre propre photo.", ephemeral=True)
+        return
+    # The menu instance is shared by every message: read the choice from
+    # this interaction, not from the Select.
+    value = interaction.data["values"][0]
+    try:
+        ballot = contest.ballots.rank(thread_id, interaction.user.id, interaction.message.id,
+                                      None if value == "remove" else int(value))
+    except ValueError:
+        # RANKED_BALLOT_SIZE shrank across a restart: the shared menu offers
+        # ranks this thread's ballots (sized when it opened) do not have.
+        await interaction.response.send_message(
+            f"❌ Dans ce fil, vous pouvez classer au plus {contest.ballots.size(thread_id)} photos.", ephemeral=True
+        )
+        return
+    lines = ["🗳️ **Votre classement**", ""]
+    for k, message_id in enumerate(ballot):
+        if message_id is None:
+            lines.append(f"{rank_label(k)} : —")
+        else:
+            photo = f"https://discord.com/channels/{interaction.guild_id}/{thread_id}/{message_id}"
+            lines.append(f"{rank_label(k)} : photo de <@{contest.tally.author_of(message_id)}> — {photo}")
+    if not ballot:
+        lines.append("Vous n'avez classé aucune photo.")
+    await interaction.response.send_message("\n".join(lines), ephemeral=True,
+                                            allowed_mentions=discord.AllowedMentions.none())
+
+
+# === Result DMs to participants (contest option notify_participants) ===
+_notifying = set()
+
+
+def queue_result_notices(contest, kind: str, thread, entries, winners):
+    # Called once the results are public, and stored: a restart resumes the
+    # fan-out (see on_ready). Sending starts with start_result_notices, when
+    # the close is over, so DMs never hold up its outbound calls.
+    if contest.notify_participants:
+        contest.notices.queue(thread.id, kind, thread.jump_url, contest.ballots.has_thread(thread.id),
+                              participant_ranks(entries, winners))
+
+
+def start_result_notices(contest):
+    if contest.notices.pending():
+        spawn(send_result_notices(contest))
+
+
+def result_notice_text(contest, fanout, rank: int, votes: int, tied: bool) -> str:
+    what = "du concours de la semaine" if fanout["kind"] == "weekly" else "du concours mensuel"
+    place = "1re place" if rank == 1 else f"{rank}e place"
+    if tied:
+        place += " (ex aequo)"
+    score = f"classée dans {votes} bulletin(s)" if fanout["ranked"] else f"avec {votes} vote(s)"
+    return (f"{'🏆' if rank == 1 else '📸'} Résultats {what} ({contest.name}) : votre photo termine à la "
+            f"**{place}** sur {len(fanout['recipients'])}, {score}.\n📁 {fanout['jump_url']}")
+
+
+async def send_result_notice(contest, thread_id: int, fanout, index: int, recipient):
+    author_id, rank, votes, tied = recipient
+    try:
+        # Opening the DM channel and sending to it are separate routes, each
+        # with its own rate limit; DMs wait behind every other outbound call.
+        channel = await outbound.call(f"dm:{author_id}", PRIORITY_DM,
+                                      lambda: bot.create_dm(discord.Object(author_id)))
+        text = result_notice_text(contest, fanout, rank, votes, tied)
+        await outbound.call(f"send:{channel.id}", PRIORITY_DM, lambda: channel.send(text))
+        result_dms.inc(outcome="sent")
+    except discord.Forbidden:
+        result_dms.inc(outcome="refused")
+    except Exception as e:
+        result_dms.inc(outcome="failed")
+        print(f"send_result_notice ({contest.id}): DM to {author_id} failed:", e)
+    # Settled either way: a refused or failed DM is not retried.
+    contest.notices.settle(thread_id, index)
+
+
+async def send_result_notices(contest):
+    # One fan-out loop per contest, NOTIFY_CONCURRENCY DMs at a time; fan-outs
+    # queued meanwhile (another close) are picked up before it returns.
+    if contest.id in _notifying:
+        return
+    _notifying.add(contest.id)
+    try:
+        while pending := contest.notices.pending():
+            for thread_id, fanout in pending:
+                todo = iter(contest.notices.unsettled(thread_id))
+
+                async def drain():
+                    for index, recipient in todo:
+                        await send_result_notice(contest, thread_id, fanout, index, recipient)
+
+                with phase_seconds.time(phase="result_dms"):
+                    await asyncio.gather(*(drain() for _ in range(NOTIFY_CONCURRENCY)))
+            await contest.notices.flush()
+    finally:
+        _notifying.discard(contest.id)
+# =====================================================================
+
+async def resolve_contest_thread(thread_id: int):
+    # Cache first, then a single fetch; never enumerate guild threads.
+    thread = bot.get_channel(thread_id)
+    if thread is None:
+        fallbacks.inc(path="thread_fetch")
         try:
-            return datetime.fromisoformat(active["ends_at"])
+            thread = await bot.fetch_channel(thread_id)
         except Exception:
             return None
-
-monthly_store = MonthlyStore(Path(__file__).with_name("monthly.json"))
-# =====================================================================
+    if getattr(thread, "archived", False):
+        try:
+            await edit_thread(thread, archived=False)
+        except Exception as ex:
+            print(f"resolve_contest_thread: could not unarchive {thread_id}:", ex)
+    return thread
 
 # === Monthly helpers ===
-async def maybe_open_monthly_contest():
-    if not MONTHLY_ENABLED:
+async def maybe_open_monthly_contest(contest):
+    if not contest.monthly_enabled:
         return
 
-    active = monthly_store.get_active()
+    active = contest.monthly.get_active()
     if active and not active.get("closed"):
         return
 
-    if not monthly_store.months_due():
+    if not contest.monthly.months_due():
         return
 
-    entries = monthly_store.get_last_4_weeks_entries()
+    entries = contest.monthly.get_last_4_weeks_entries()
     if not entries:
         return
 
-    photo_channel = bot.get_channel(PHOTO_CHANNEL_ID)
+    photo_channel = bot.get_channel(contest.photo_channel_id)
     if photo_channel is None:
         print("maybe_open_monthly_contest: photo channel not found")
         return
 
-    thread_name = f"🏅 Concours Mensuel - {datetime.now(tz).strftime('%d/%m/%Y')}"
-    thread = await photo_channel.create_thread(
+    thread_name = f"{MONTHLY_THREAD_PREFIX}{datetime.now(tz).strftime('%d/%m/%Y')}"
+    thread = await create_contest_thread(
+        photo_channel,
         name=thread_name,
         auto_archive_duration=1440,
         reason="Automated monthly open votes"
     )
+    registry.bind_thread(thread.id, contest)
+    ranked_thread = ranked_voting(contest)
+    if ranked_thread:
+        contest.ballots.open_thread(thread.id, RANKED_BALLOT_SIZE)
 
-    intro = f"""Bonjour <@&{REPORTER_ROLE_ID}> <@&{REPORTER_BORDEAUX_ROLE_ID}> !
+    intro = f"""Bonjour {contest.role_mentions} !
 
 🎉 Le **Concours Mensuel** est ouvert ! Voici les photos gagnantes des 4 dernières semaines.
 
-Pour voter, réagissez avec {MONTHLY_VOTE_EMOJI} sur vos photos préférées.
-
-• Vous pouvez voter pour plusieurs photos
-• Les votes se terminent automatiquement dans {MONTHLY_VOTE_DURATION_MIN // 60}h
+{how_to_vote(ranked_thread, contest.monthly_vote_emoji)}
+• Les votes se terminent automatiquement dans {contest.monthly_vote_duration_min // 60}h
 • Le ou la gagnant(e) mensuel(le) sera annoncé(e) ici et dans le canal des résultats
 """
-    await thread.send(intro)
-
-    for e in entries:
-        content = f"Gagnant semaine #{e['week_no']} • {e['author_mention']}"
-        try:
-            msg = await thread.send(
-                content=content,
-                embed=discord.Embed().set_image(url=e["image_url"])
-            )
-            try:
-                await msg.add_reaction(MONTHLY_VOTE_EMOJI)
-            except Exception:
-                await msg.add_reaction("✅")
-        except Exception as ex:
+    await announce(thread, intro)
+
+    def posted(e):
+        def _register(msg):
+            # A re-uploaded photo has a new URL; the cache learns it too.
+            image_url = posted_image_url(msg, e["image_url"])
+            if e.get("image_sha256"):
+                blob_cache.remember(image_url, e["image_sha256"])
+            contest.tally.register(thread.id, msg.id, "monthly", e["author_id"], e["author_mention"], image_url)
+        return _register
+
+    results = await asyncio.gather(*(
+        post_vote_entry(thread, f"Gagnant semaine #{e['week_no']} • {e['author_mention']}", e["image_url"],
+                        contest.monthly_vote_emoji, posted(e), image_sha=e.get("image_sha256"),
+                        view=ranking_menu() if ranked_thread else None)
+        for e in entries
+    ), return_exceptions=True)
+    for ex in results:
+        if isinstance(ex, Exception):
             print("maybe_open_monthly_contest: failed to post one monthly photo:", ex)
-            continue
 
     opened_at = datetime.now(tz)
-    ends_at = opened_at + timedelta(minutes=MONTHLY_VOTE_DURATION_MIN)
+    ends_at = opened_at + timedelta(minutes=contest.monthly_vote_duration_min)
 
-    monthly_store.set_active(
+    contest.monthly.set_active(
         thread_id=thread.id,
         thread_jump_url=thread.jump_url,
         opened_at_iso=opened_at.isoformat(),
         ends_at_iso=ends_at.isoformat(),
     )
-    monthly_store.mark_monthly_consumed()
-
-    bot.loop.create_task(schedule_monthly_close())
-
-
-async def schedule_monthly_close():
-    active = monthly_store.get_active()
-    if not active or active.get("closed"):
-        return
-
-    ends_at = monthly_store.parse_active_ends_at()
-    if not ends_at:
-        return
+    contest.monthly.mark_monthly_consumed()
+    job_scheduler.schedule(f"{contest.id}:monthly:close", "monthly_close", ends_at, catch_up=CATCH_UP_RUN,
+                           payload={"contest_id": contest.id})
 
-    now = datetime.now(tz)
-    wait_seconds = max(0, int((ends_at - now).total_seconds()))
-    if wait_seconds > 0:
-        await asyncio.sleep(wait_seconds)
 
+@close_seconds.timed(contest_type="monthly")
+async def close_monthly_contest_auto(contest):
+    # Every exit flushes, early returns included: they clear the active
+    # contest and drop its tally, which a crash must not replay or lose.
     try:
-        await close_monthly_contest_auto()
-    except Exception as e:
-        print("schedule_monthly_close error:", e)
+        await _close_monthly_contest(contest)
+    finally:
+        await contest.flush()
+        start_result_notices(contest)
 
 
-async def close_monthly_contest_auto():
-    results_channel = bot.get_channel(PHOTO_RESULT_CHANNEL_ID)
+async def _close_monthly_contest(contest):
+    results_channel = bot.get_channel(contest.result_channel_id)
     if results_channel is None:
         print("close_monthly_contest_auto: results channel not found")
         return
 
-    active = monthly_store.get_active()
+    active = contest.monthly.get_active()
     if not active or active.get("closed"):
         print("close_monthly_contest_auto: no active monthly contest")
         return
 
-    thread = bot.get_channel(active["thread_id"])
-    if thread is None:
-        try:
-            thread = await bot.fetch_channel(active["thread_id"])
-        except Exception:
-            thread = None
-
+    thread = await resolve_contest_thread(active["thread_id"])
     if thread is None:
         print("close_monthly_contest_auto: monthly thread not found")
-        monthly_store.set_active_closed()
-        monthly_store.clear_active()
+        contest.monthly.set_active_closed()
+        contest.monthly.clear_active()
         return
 
-    entries = []
-    async for message in thread.history(limit=None):
-        if message.embeds and len(message.embeds) > 0:
-            content = (message.content or "").strip()
-
-            author_id = None
-            author_mention = None
-            m = re.search(r"<@!?(\d+)>", content)
-            if m:
-                author_id = int(m.group(1))
-                author_mention = f"<@{author_id}>"
-
-            try:
-                img_url = message.embeds[0].image.url
-            except Exception:
-                img_url = None
-
-            votes = 0
-            found_vote_reaction = False
-            for reaction in message.reactions:
-                if str(reaction.emoji) == MONTHLY_VOTE_EMOJI:
-                    votes = max(0, reaction.count - 1)
-                    found_vote_reaction = True
-                    break
-            if not found_vote_reaction:
-                for reaction in message.reactions:
-                    if str(reaction.emoji) == "✅":
-                        votes = max(0, reaction.count - 1)
-                        break
-
-            if img_url and author_id:
-                entries.append({
-                    "author_id": author_id,
-                    "author_mention": author_mention or f"<@{author_id}>",
-                    "image_url": img_url,
-                    "votes": votes
-                })
+    if not contest.tally.has_thread(thread.id):
+        with phase_seconds.time(phase="close_reconcile"):
+            await reconcile_vote_thread(contest, thread, "monthly")
+    entries = await count_votes(contest, thread, contest.monthly_vote_emoji)
 
     if not entries:
-        await results_channel.send("❌ Aucun vote mensuel n'a été trouvé.")
+        await announce(results_channel, "❌ Aucun vote mensuel n'a été trouvé.")
         try:
-            await results_channel.send(f"📁 Fil du concours mensuel : {thread.jump_url}")
+            await announce(results_channel, f"📁 Fil du concours mensuel : {thread.jump_url}")
         except Exception:
             pass
         try:
-            await thread.edit(archived=False, locked=True)
+            await edit_thread(thread, archived=False, locked=True)
         except Exception:
             pass
-        monthly_store.set_active_closed()
-        monthly_store.clear_active()
+        contest.monthly.set_active_closed()
+        contest.monthly.clear_active()
+        contest.tally.discard_thread(thread.id)
+        contest.ballots.discard_thread(thread.id)
+        registry.unbind_thread(thread.id)
         print("close_monthly_contest_auto: no votes found")
         return
 
     # Exclude past monthly winners from eligibility
-    eligible = [e for e in entries if not winners_store.monthly_contains(e["author_id"])]
+    eligible = eligible_entries(entries, contest.winners.monthly_contains)
 
     if not eligible:
-        await results_channel.send("⚠️ Aucun gagnant mensuel éligible (tous ont déjà gagné auparavant).")
+        await announce(results_channel, "⚠️ Aucun gagnant mensuel éligible (tous ont déjà gagné auparavant).")
         try:
-            await results_channel.send(f"📁 Fil du concours mensuel : {thread.jump_url}")
+            await announce(results_channel, f"📁 Fil du concours mensuel : {thread.jump_url}")
         except Exception:
             pass
         try:
-            await thread.edit(archived=False, locked=True)
+            await edit_thread(thread, archived=False, locked=True)
         except Exception:
             pass
-        monthly_store.set_active_closed()
-        monthly_store.clear_active()
+        contest.monthly.set_active_closed()
+        contest.monthly.clear_active()
+        await record_results(contest, "monthly", int(contest.monthly.data.get("week_no", 0)), thread.id, entries, [])
+        queue_result_notices(contest, "monthly", thread, entries, [])
+        contest.tally.discard_thread(thread.id)
+        contest.ballots.discard_thread(thread.id)
+        registry.unbind_thread(thread.id)
         print("close_monthly_contest_auto: no eligible monthly winners")
         return
 
-    max_votes = max(e["votes"] for e in eligible)
-    winners = [e for e in eligible if e["votes"] == max_votes]
+    winners, score, tie_score = await decide_winners(contest, thread.id, eligible)
 
     if len(winners) == 1:
         w = winners[0]
-        result = f"""Bonjour <@&{REPORTER_ROLE_ID}> <@&{REPORTER_BORDEAUX_ROLE_ID}> !
+        result = f"""Bonjour {contest.role_mentions} !
         
-🏅 **Gagnant(e) du Concours Mensuel : {w['author_mention']} avec {max_votes} votes !**\n\nFélicitations ! Voici la photo gagnante :"""
-        await results_channel.send(result)
-        await results_channel.send(embed=discord.Embed().set_image(url=w["image_url"]))
+🏅 **Gagnant(e) du Concours Mensuel : {w['author_mention']} {score} !**\n\nFélicitations ! Voici la photo gagnante :"""
+        await announce(results_channel, result)
+        await announce_image(results_channel, w["image_url"])
     else:
         authors = ", ".join(e["author_mention"] for e in winners)
-        result = f"""Bonjour <@&{REPORTER_ROLE_ID}> <@&{REPORTER_BORDEAUX_ROLE_ID}> !
+        result = f"""Bonjour {contest.role_mentions} !
         
-🏅 **Égalité au Concours Mensuel avec {max_votes} votes chacun !**\n\nFélicitations à {authors} !\n\nVoici les photos gagnantes :"""
-        await results_channel.send(result)
+🏅 **Égalité au Concours Mensuel {tie_score} !**\n\nFélicitations à {authors} !\n\nVoici les photos gagnantes :"""
+        await announce(results_channel, result)
         for e in winners:
-            await results_channel.send(embed=discord.Embed().set_image(url=e["image_url"]))
+            await announce_image(results_channel, e["image_url"])
 
     # Persist monthly winners so they can't win again
     for e in winners:
-        winners_store.add_monthly(e["author_id"])
+        contest.winners.add_monthly(e["author_id"])
+
+    await record_results(contest, "monthly", int(contest.monthly.data.get("week_no", 0)), thread.id, entries, winners)
+    spawn(update_gallery(contest))
 
     try:
-        await results_channel.send(f"📁 Fil du concours mensuel : {thread.jump_url}")
+        await announce(results_channel, f"📁 Fil du concours mensuel : {thread.jump_url}")
     except Exception:
         pass
+    queue_result_notices(contest, "monthly", thread, entries, winners)
 
     await asyncio.sleep(2)
     try:
-        await thread.edit(archived=False, locked=True)
+        await edit_thread(thread, archived=False, locked=True)
     except Exception:
         pass
 
-    monthly_store.set_active_closed()
-    monthly_store.clear_active()
+    contest.monthly.set_active_closed()
+    contest.monthly.clear_active()
+    contest.tally.discard_thread(thread.id)
+    contest.ballots.discard_thread(thread.id)
+    registry.unbind_thread(thread.id)
     print("close_monthly_contest_auto: done")
 # === End monthly helpers ===
 
-intents = discord.Intents.default()
-intents.message_content = True
-intents.guilds = True
-intents.messages = True
-intents.reactions = True
-bot = commands.Bot(command_prefix="/", intents=intents)
+if LEAN:
+    # Every handler works from raw gateway events and the contest channels:
+    # no message cache to read back from, no members to chunk or keep.
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.guild_reactions = True
+    intents.message_content = True
+    bot = commands.AutoShardedBot(
+        command_prefix="/", intents=intents,
+        max_messages=MESSAGE_CACHE_SIZE or None,
+        member_cache_flags=discord.MemberCacheFlags.none(),
+        chunk_guilds_at_startup=False,
+    )
+else:
+    intents = discord.Intents.default()
+    intents.message_content = True
+    intents.guilds = True
+    intents.messages = True
+    intents.reactions = True
+    bot = commands.AutoShardedBot(command_prefix="/", intents=intents, max_messages=MESSAGE_CACHE_SIZE or None)
+voter_counter = VoterCounter(bot.http, concurrency=EXACT_VOTES_CONCURRENCY)
 
 # Helpers (non-interactive versions)
-async def send_partage_message_auto():
-    global last_photo_call
-    photo_channel = bot.get_channel(PHOTO_CHANNEL_ID)
+async def send_partage_message_auto(contest):
+    photo_channel = bot.get_channel(contest.photo_channel_id)
     if photo_channel is None:
         print("send_partage_message_auto: photo channel not found")
         return
-    last_photo_call = datetime.now(timezone.utc)
-    message = f"""Bonjour <@&{REPORTER_ROLE_ID}> <@&{REPORTER_BORDEAUX_ROLE_ID}> !
+    contest.submissions.start_week(datetime.now(timezone.utc))
+    message = f"""Bonjour {contest.role_mentions} !
 
 Une **nouvelle semaine** commence ✨ 
 C'est le moment idéal pour partager vos plus belles photos dans ce canal 📸
@@ -467,240 +1044,288 @@ C'est le moment idéal pour partager vos plus belles photos dans ce canal 📸
 
 Bonne chance à toutes et à tous, et amusez-vous bien 🎉"""
     try:
-        await photo_channel.send(content=message, allowed_mentions=discord.AllowedMentions(roles=True))
+        await announce(photo_channel, content=message, allowed_mentions=discord.AllowedMentions(roles=True))
         print("Automated: partage message sent")
     except Exception as e:
         print("send_partage_message_auto error:", e)
 
-async def create_vote_thread_from_photos_auto():
-    global last_photo_call, user_submissions
-    photo_channel = bot.get_channel(PHOTO_CHANNEL_ID)
+async def create_vote_thread_from_photos_auto(contest):
+    photo_channel = bot.get_channel(contest.photo_channel_id)
     if photo_channel is None:
         print("create_vote_thread_from_photos_auto: photo channel not found")
         return None
 
-    messages = []
-    async for msg in photo_channel.history(limit=500):
-        if last_photo_call and msg.created_at < last_photo_call:
-            continue
-        if msg.attachments:
-            messages.append(msg)
+    if contest.submissions.stale:
+        with phase_seconds.time(phase="open_reconcile"):
+            await reconcile_submissions(contest, photo_channel)
 
-    if not messages:
+    submissions = contest.submissions.submissions()
+    if not submissions:
         return None
 
-    thread = await photo_channel.create_thread(
-        name=f"📊 Votes - {datetime.now(tz).strftime('%d/%m/%Y')}",
-        auto_archive_duration=1440,
-        reason="Automated open votes"
-    )
+    with phase_seconds.time(phase="open_create_thread"):
+        thread = await create_contest_thread(
+            photo_channel,
+            name=f"{WEEKLY_THREAD_PREFIX}{datetime.now(tz).strftime('%d/%m/%Y')}",
+            auto_archive_duration=WEEKLY_THREAD_ARCHIVE_MIN,
+            reason="Automated open votes"
+        )
+    registry.bind_thread(thread.id, contest)
+    ranked_thread = ranked_voting(contest)
+    if ranked_thread:
+        contest.ballots.open_thread(thread.id, RANKED_BALLOT_SIZE)
 
-    intro = f"""Bonjour <@&{REPORTER_ROLE_ID}> <@&{REPORTER_BORDEAUX_ROLE_ID}> !
+    intro = f"""Bonjour {contest.role_mentions} !
 
 **🗳️ La phase de votes est ouverte !**
 
-Pour voter, réagissez avec {VOTE_EMOJI} sur vos photos préférées.
-
-• Vous pouvez voter pour plusieurs photos
+{how_to_vote(ranked_thread, contest.vote_emoji)}
 • Les votes sont ouverts jusqu'à dimanche 18:00
 • Le/la gagnant(e) sera annoncé(e) dimanche soir
 
 **📸 __Voici les photos soumises :__**
 ⠀"""
-    await thread.send(intro)
+    with phase_seconds.time(phase="open_intro"):
+        intro_message = await announce(thread, intro)
+    contest.weekly.set_active(thread.id, thread.jump_url, intro_message.id, datetime.now(tz).isoformat())
+
+    def posted(sub):
+        def _register(photo_message):
+            contest.tally.register(thread.id, photo_message.id, "weekly", sub["author_id"], f"<@{sub['author_id']}>",
+                                   sub["attachment_url"])
+            contest.weekly.add_vote_message(photo_message.id)
+        return _register
+
+    with phase_seconds.time(phase="open_post_entries"):
+        results = await asyncio.gather(*(
+            post_vote_entry(thread, f"Photo de <@{sub['author_id']}>:", sub["attachment_url"], contest.vote_emoji,
+                            posted(sub), view=ranking_menu() if ranked_thread else None)
+            for sub in submissions
+        ), return_exceptions=True)
+    for ex in results:
+        if isinstance(ex, Exception):
+            print("create_vote_thread_from_photos_auto: failed to post one photo:", ex)
+
+    contest.submissions.end_week()
+    with phase_seconds.time(phase="open_flush"):
+        await contest.flush()
+    return thread
 
-    for msg in reversed(messages):
-        try:
-            photo_message = await thread.send(
-                content=f"Photo de {msg.author.mention}:",
-                embed=discord.Embed().set_image(url=msg.attachments[0].url)
-            )
-            try:
-                await photo_message.add_reaction(VOTE_EMOJI)
-            except Exception:
-                await photo_message.add_reaction("✅")
-        except Exception:
-            print("create_vote_thread_from_photos_auto: failed to post one photo")
-            continue
+@close_seconds.timed(contest_type="weekly")
+async def close_votes_and_announce_auto(contest):
+    # Same as close_monthly_contest_auto: flushed on every exit.
+    try:
+        await _close_weekly_votes(contest)
+    finally:
+        await contest.flush()
+        start_result_notices(contest)
 
-    user_submissions.clear()
-    last_photo_call = None
-    return thread
 
-async def close_votes_and_announce_auto():
-    results_channel = bot.get_channel(PHOTO_RESULT_CHANNEL_ID)
+async def _close_weekly_votes(contest):
+    results_channel = bot.get_channel(contest.result_channel_id)
     if results_channel is None:
         print("close_votes_and_announce_auto: results channel not found")
         return
 
-    voting_thread = None
-    for g in bot.guilds:
-        active_threads = await g.active_threads()
-        for thread in active_threads:
-            if thread.parent_id == PHOTO_CHANNEL_ID and thread.name.startswith("📊 Votes"):
-                voting_thread = thread
-                break
-        if voting_thread:
-            break
+    active = contest.weekly.get_active()
+    if not active:
+        print("close_votes_and_announce_auto: no active voting thread found")
+        return
 
+    voting_thread = await resolve_contest_thread(active["thread_id"])
     if not voting_thread:
-        print("close_votes_and_announce_auto: no active voting thread found")
+        print("close_votes_and_announce_auto: voting thread not found")
+        contest.weekly.clear_active()
         return
 
-    entries = []
-    async for message in voting_thread.history(limit=None):
-        if message.embeds and len(message.embeds) > 0:
-            content = (message.content or "").strip()
-            author_mention = None
-            author_id = None
-            if content.startswith("Photo de "):
-                part = content.split("Photo de ", 1)[1].rstrip(":").strip()
-                author_mention = part
-                m = re.match(r"<@!?(\d+)>", part)
-                if m:
-                    author_id = int(m.group(1))
-
-            try:
-                img_url = message.embeds[0].image.url
-            except Exception:
-                img_url = None
-
-            votes = 0
-            found_vote_reaction = False
-            for reaction in message.reactions:
-                if str(reaction.emoji) == VOTE_EMOJI:
-                    votes = max(0, reaction.count - 1)
-                    found_vote_reaction = True
-                    break
-            if not found_vote_reaction:
-                for reaction in message.reactions:
-                    if str(reaction.emoji) == "✅":
-                        votes = max(0, reaction.count - 1)
-                        break
-
-            if img_url and author_id:
-                entries.append({
-                    "message": message,
-                    "author_id": author_id,
-                    "author_mention": author_mention or f"<@{author_id}>",
-                    "image_url": img_url,
-                    "votes": votes
-                })
+    if not contest.tally.has_thread(voting_thread.id):
+        with phase_seconds.time(phase="close_reconcile"):
+            await reconcile_vote_thread(contest, voting_thread, "weekly")
+    entries = await count_votes(contest, voting_thread, contest.vote_emoji)
 
     if not entries:
-        await results_channel.send("❌ Aucun vote n'a été trouvé.")
+        await announce(results_channel, "❌ Aucun vote n'a été trouvé.")
+        contest.tally.discard_thread(voting_thread.id)
+        contest.ballots.discard_thread(voting_thread.id)
+        registry.unbind_thread(voting_thread.id)
+        contest.weekly.clear_active()
         print("close_votes_and_announce_auto: no votes found")
         return
 
-    eligible = [e for e in entries if not winners_store.contains(e["author_id"])]
+    eligible = eligible_entries(entries, contest.winners.contains)
 
     if not eligible:
-        await results_channel.send("⚠️ Aucun gagnant éligible cette semaine (tous les participants ont déjà gagné auparavant).")
+        await announce(results_channel, "⚠️ Aucun gagnant éligible cette semaine (tous les participants ont déjà gagné auparavant).")
         try:
-            await results_channel.send(f"📁 Fil des votes : {voting_thread.jump_url}")
+            await announce(results_channel, f"📁 Fil des votes : {voting_thread.jump_url}")
         except Exception:
             pass
         try:
-            await voting_thread.edit(archived=False, locked=True)
+            await edit_thread(voting_thread, archived=False, locked=True)
         except Exception:
             pass
+        # week_no numbers the weeks that had a winner (the monthly cycle); this
+        # one has none, so its entries are found by thread_id and closed_at.
+        await record_results(contest, "weekly", None, voting_thread.id, entries, [])
+        queue_result_notices(contest, "weekly", voting_thread, entries, [])
+        contest.tally.discard_thread(voting_thread.id)
+        contest.ballots.discard_thread(voting_thread.id)
+        registry.unbind_thread(voting_thread.id)
+        contest.weekly.clear_active()
         print("close_votes_and_announce_auto: no eligible winners")
         return
 
-    max_votes = max(e["votes"] for e in eligible)
-    winners = [e for e in eligible if e["votes"] == max_votes]
+    winners, score, tie_score = await decide_winners(contest, voting_thread.id, eligible)
 
     if len(winners) == 1:
         w = winners[0]
-        result = f"""Bonjour <@&{REPORTER_ROLE_ID}> <@&{REPORTER_BORDEAUX_ROLE_ID}> !
+        result = f"""Bonjour {contest.role_mentions} !
         
-🏆 **Le gagnant de la semaine est {w['author_mention']} avec {max_votes} votes !**\n\nFélicitations ! Voici la photo gagnante :"""
-        await results_channel.send(result)
-        await results_channel.send(embed=discord.Embed().set_image(url=w["image_url"]))
+🏆 **Le gagnant de la semaine est {w['author_mention']} {score} !**\n\nFélicitations ! Voici la photo gagnante :"""
+        await announce(results_channel, result)
+        await announce_image(results_channel, w["image_url"])
     else:
         authors = ", ".join(e["author_mention"] for e in winners)
-        result = f"""Bonjour <@&{REPORTER_ROLE_ID}> <@&{REPORTER_BORDEAUX_ROLE_ID}> !
+        result = f"""Bonjour {contest.role_mentions} !
         
-🏆 **Égalité avec {max_votes} votes chacun !**\n\nFélicitations à {authors} !\n\nVoici les photos gagnantes :"""
-        await results_channel.send(result)
+🏆 **Égalité {tie_score} !**\n\nFélicitations à {authors} !\n\nVoici les photos gagnantes :"""
+        await announce(results_channel, result)
         for e in winners:
-            await results_channel.send(embed=discord.Embed().set_image(url=e["image_url"]))
+            await announce_image(results_channel, e["image_url"])
 
     for e in winners:
-        winners_store.add(e["author_id"])
+        contest.winners.add(e["author_id"])
+        if duplicate_check_enabled() and not contest.hashes.mark_winner(e["image_url"]):
+            spawn(index_winner_image(contest, e["author_id"], e["image_url"]))
+    exif_missing = EXIF_INDEX and not all([contest.exif.mark_winner(e["image_url"]) for e in winners])
+
+    # Keep the winning photos locally: their URLs will have expired by the
+    # time the monthly contest posts them again.
+    with phase_seconds.time(phase="close_capture_images"):
+        shas = await asyncio.gather(*(capture_image(e["image_url"]) for e in winners))
 
     try:
-        monthly_store.begin_new_week()
-        for e in winners:
-            monthly_store.add_weekly_winner(
+        contest.monthly.begin_new_week()
+        for e, sha in zip(winners, shas):
+            contest.monthly.add_weekly_winner(
                 author_id=e["author_id"],
                 author_mention=e["author_mention"],
                 image_url=e["image_url"],
-                votes=e["votes"]
+                votes=e["votes"],
+                image_sha256=sha
             )
     except Exception as ex:
         print("Recording weekly winners failed:", ex)
+    if exif_missing:
+        spawn(backfill_winner_exif(contest))
+
+    await record_results(contest, "weekly", int(contest.monthly.data.get("week_no", 0)), voting_thread.id, entries, winners)
+    spawn(update_gallery(contest))
 
     try:
-        await results_channel.send(f"📁 Fil des votes : {voting_thread.jump_url}")
+        await announce(results_channel, f"📁 Fil des votes : {voting_thread.jump_url}")
     except Exception:
         pass
+    queue_result_notices(contest, "weekly", voting_thread, entries, winners)
 
     await asyncio.sleep(2)
     try:
-        await voting_thread.edit(archived=False, locked=True)
+        await edit_thread(voting_thread, archived=False, locked=True)
     except Exception:
         pass
 
+    contest.tally.discard_thread(voting_thread.id)
+
+    contest.ballots.discard_thread(voting_thread.id)
+    registry.unbind_thread(voting_thread.id)
+    contest.weekly.clear_active()
     print("close_votes_and_announce_auto: done")
 
     try:
-        await maybe_open_monthly_contest()
+        await maybe_open_monthly_contest(contest)
     except Exception as ex:
         print("maybe_open_monthly_contest error:", ex)
 
+
+async def contest_for_interaction(interaction: discord.Interaction):
+    # The channel (or the parent of a vote thread) picks the contest; from
+    # anywhere else the guild's contest is used when there is only one.
+    channel = interaction.channel
+    contest = registry.for_channel(interaction.channel_id)
+    if contest is None and getattr(channel, "parent_id", None):
+        contest = registry.for_channel(channel.parent_id)
+    if contest is None and interaction.guild_id is not None:
+        candidates = registry.for_guild(interaction.guild_id)
+        if len(candidates) == 1:
+            contest = candidates[0]
+    if contest is None:
+        message = "❌ Aucun concours configuré pour ce canal."
+        if interaction.response.is_done():
+            await interaction.followup.send(message, ephemeral=True)
+        else:
+            await interaction.response.send_message(message, ephemeral=True)
+    return contest
+
 @bot.tree.command(name="partage-photo", description="Ping les reporters pour partager leur photos")
 async def share_photo(interaction: discord.Interaction):
     await interaction.response.defer(ephemeral=True)
-    await send_partage_message_auto()
+    contest = await contest_for_interaction(interaction)
+    if contest is None:
+        return
+    async with contest.lock:
+        await send_partage_message_auto(contest)
     await interaction.followup.send("Message envoyé dans le canal photo!", ephemeral=True)
 
 @bot.tree.command(name="ouverture-des-votes", description="Ouvre la phase des votes")
 async def open_votes(interaction: discord.Interaction):
-    global last_photo_call
     await interaction.response.defer(ephemeral=True)
+    contest = await contest_for_interaction(interaction)
+    if contest is None:
+        return
 
-    if not last_photo_call:
+    if contest.submissions.call_at is None:
         await interaction.followup.send("❌ Aucun appel à photos n'a été fait. Utilisez d'abord /partage-photo", ephemeral=True)
         return
 
-    thread = await create_vote_thread_from_photos_auto()
-    if thread is None:
-        photo_channel = bot.get_channel(PHOTO_CHANNEL_ID)
-        thread = await photo_channel.create_thread(
-            name=f"📊 Votes - {datetime.now(tz).strftime('%d/%m/%Y')}",
-            auto_archive_duration=1440
-        )
-        await thread.send("Aucune photo n'a été partagée depuis l'appel !")
-        await interaction.followup.send("Fil créé, mais aucune photo trouvée", ephemeral=True)
-        return
+    async with contest.lock:
+        thread = await create_vote_thread_from_photos_auto(contest)
+        if thread is None:
+            photo_channel = bot.get_channel(contest.photo_channel_id)
+            thread = await create_contest_thread(
+                photo_channel,
+                name=f"{WEEKLY_THREAD_PREFIX}{datetime.now(tz).strftime('%d/%m/%Y')}",
+                auto_archive_duration=WEEKLY_THREAD_ARCHIVE_MIN
+            )
+            registry.bind_thread(thread.id, contest)
+            intro_message = await announce(thread, "Aucune photo n'a été partagée depuis l'appel !")
+            contest.weekly.set_active(thread.id, thread.jump_url, intro_message.id, datetime.now(tz).isoformat())
+            await interaction.followup.send("Fil créé, mais aucune photo trouvée", ephemeral=True)
+            return
 
     await interaction.followup.send("Phase de votes ouverte !", ephemeral=True)
 
 @bot.tree.command(name="fermeture-des-votes", description="Ferme les votes et annonce les résultats")
 async def close_votes(interaction: discord.Interaction):
     await interaction.response.defer(ephemeral=True)
-    await close_votes_and_announce_auto()
+    contest = await contest_for_interaction(interaction)
+    if contest is None:
+        return
+    async with contest.lock:
+        await close_votes_and_announce_auto(contest)
     await interaction.followup.send("✅ Votes terminés et résultats annoncés !", ephemeral=True)
 
 @bot.tree.command(name="fermeture-du-mensuel", description="Ferme le concours mensuel et annonce les résultats")
 async def close_monthly(interaction: discord.Interaction):
     await interaction.response.defer(ephemeral=True)
-    active = monthly_store.get_active()
+    contest = await contest_for_interaction(interaction)
+    if contest is None:
+        return
+    active = contest.monthly.get_active()
     if not active or active.get("closed"):
         await interaction.followup.send("ℹ️ Aucun concours mensuel actif pour le moment.", ephemeral=True)
         return
-    await close_monthly_contest_auto()
+    async with contest.lock:
+        await close_monthly_contest_auto(contest)
     await interaction.followup.send("✅ Concours mensuel clôturé et résultats annoncés !", ephemeral=True)
 
 @bot.tree.command(name="winners-remove-weekly", description="Retire un utilisateur de la liste des gagnants hebdomadaires (réautorise à gagner la semaine)")
@@ -709,8 +1334,11 @@ async def winners_remove_weekly(interaction: discord.Interaction, user: discord.
     if not interaction.user.guild_permissions.administrator:
         await interaction.response.send_message("❌ Autorisation refusée. Administrateur requis.", ephemeral=True)
         return
+    contest = await contest_for_interaction(interaction)
+    if contest is None:
+        return
 
-    removed = winners_store.remove_weekly(user.id)
+    removed = contest.winners.remove_weekly(user.id)
     if removed:
         await interaction.response.send_message(f"✅ {user.mention} a été retiré de la liste des gagnants hebdomadaires.", ephemeral=True)
     else:
@@ -722,147 +1350,527 @@ async def winners_remove_monthly(interaction: discord.Interaction, user: discord
     if not interaction.user.guild_permissions.administrator:
         await interaction.response.send_message("❌ Autorisation refusée. Administrateur requis.", ephemeral=True)
         return
+    contest = await contest_for_interaction(interaction)
+    if contest is None:
+        return
 
-    removed = winners_store.remove_monthly(user.id)
+    removed = contest.winners.remove_monthly(user.id)
     if removed:
         await interaction.response.send_message(f"✅ {user.mention} a été retiré de la liste des gagnants mensuels.", ephemeral=True)
     else:
         await interaction.response.send_message(f"ℹ️ {user.mention} n'était pas dans la liste des gagnants mensuels.", ephemeral=True)
 
-def next_weekday_dt(now, target_weekday, hour, minute):
-    days_ahead = (target_weekday - now.weekday()) % 7
-    candidate = (now + timedelta(days=days_ahead)).replace(hour=hour, minute=minute, second=0, microsecond=0)
-    if candidate <= now:
-        candidate = candidate + timedelta(days=7)
-    return candidate
+@bot.tree.command(name="classement", description="Affiche le classement des participant(e)s")
+@app_commands.describe(concours="Concours à classer")
+@app_commands.choices(concours=[
+    app_commands.Choice(name="Hebdomadaire", value="weekly"),
+    app_commands.Choice(name="Mensuel", value="monthly"),
+])
+async def leaderboard(interaction: discord.Interaction, concours: app_commands.Choice[str] = None):
+    contest = await contest_for_interaction(interaction)
+    if contest is None:
+        return
+    contest_type = concours.value if concours else "weekly"
+    rows = await asyncio.to_thread(contest.results.leaderboard, contest_type, 10)
+    title = "Hebdomadaire" if contest_type == "weekly" else "Mensuel"
+    if not rows:
+        await interaction.response.send_message(f"ℹ️ Aucun résultat enregistré pour le concours {title.lower()}.", ephemeral=True)
+        return
+    lines = [f"🏆 **Classement — Concours {title}**", ""]
+    for rank, r in enumerate(rows, start=1):
+        lines.append(
+            f"{rank}. <@{r['author_id']}> — {r['wins']} victoire(s), {r['total_votes']} votes "
+            f"sur {r['participations']} participation(s) (moy. {r['avg_votes']:.1f})"
+        )
+    await interaction.response.send_message("\n".join(lines), allowed_mentions=discord.AllowedMentions.none())
 
-async def scheduler_loop():
-    await bot.wait_until_ready()
-    print("Scheduler started. TIMEZONE =", TIMEZONE)
-    while not bot.is_closed():
-        now = datetime.now(tz)
-        share_dt = next_weekday_dt(now, SHARE_WEEKDAY, SHARE_HOUR, SHARE_MIN)
-        open_dt = next_weekday_dt(now, OPEN_WEEKDAY, OPEN_HOUR, OPEN_MIN)
-        result_dt = next_weekday_dt(now, RESULT_WEEKDAY, RESULT_HOUR, RESULT_MIN)
-
-        next_event_name, next_event_dt = min(
-            [("share", share_dt), ("open", open_dt), ("result", result_dt)],
-            key=lambda x: x[1]
+@bot.tree.command(name="stats", description="Affiche les statistiques d'un(e) participant(e)")
+@app_commands.describe(user="Participant(e) dont afficher les statistiques")
+async def author_stats(interaction: discord.Interaction, user: discord.User):
+    contest = await contest_for_interaction(interaction)
+    if contest is None:
+        return
+    stats = await asyncio.to_thread(contest.results.author_stats, user.id)
+    if not stats:
+        await interaction.response.send_message(f"ℹ️ {user.mention} n'a encore participé à aucun concours.", ephemeral=True)
+        return
+    lines = [f"📊 **Statistiques de {user.mention}**", ""]
+    for contest_type, title in (("weekly", "Hebdomadaire"), ("monthly", "Mensuel")):
+        r = stats.get(contest_type)
+        if not r:
+            continue
+        lines.append(
+            f"• {title} : {r['participations']} participation(s), {r['wins']} victoire(s), "
+            f"{r['total_votes']} votes (moy. {r['avg_votes']:.1f})"
         )
+    await interaction.response.send_message("\n".join(lines), allowed_mentions=discord.AllowedMentions.none())
+
+@bot.tree.command(name="recherche", description="Cherche des photos par leurs données EXIF (ex. : 50mm, f/1.8, 2025)")
+@app_commands.describe(requete="Focale, ouverture, ISO, année ou mois, appareil, objectif, « nuit », « gagnant »")
+async def search_photos(interaction: discord.Interaction, requete: str):
+    contest = await contest_for_interaction(interaction)
+    if contest is None:
+        return
+    terms, winners_only = exif.parse_query(requete)
+    if not terms and not winners_only:
+        await interaction.response.send_message(
+            "ℹ️ Précisez une focale (50mm), une ouverture (f/1.8), un ISO (iso400), une année (2025), "
+            "un appareil ou un objectif.", ephemeral=True)
+        return
+    with phase_seconds.time(phase="exif_search"):
+        total, photos = contest.exif.search(terms, winners_only, limit=10)
+    if not total:
+        await interaction.response.send_message(f"ℹ️ Aucune photo ne correspond à « {requete} ».", ephemeral=True)
+        return
+    lines = [f"🔎 **{total} photo(s) pour « {requete} »**", ""]
+    for p in photos:
+        details = exif.describe(p["exif"]) or "données EXIF absentes"
+        line = f"• <@{p['author_id']}> — {details}"
+        if p["winner"]:
+            line += " 🏆"
+        if p["message_id"] is not None:
+            line += f" — https://discord.com/channels/{interaction.guild_id}/{contest.photo_channel_id}/{p['message_id']}"
+        lines.append(line)
+    if total > len(photos):
+        lines += ["", f"… et {total - len(photos)} autre(s) : précisez la recherche."]
+    await interaction.response.send_message("\n".join(lines), ephemeral=True,
+                                            allowed_mentions=discord.AllowedMentions.none())
+
+@bot.tree.command(name="planning", description="Affiche les prochains événements planifiés")
+async def planning(interaction: discord.Interaction):
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("❌ Autorisation refusée. Administrateur requis.", ephemeral=True)
+        return
+
+    jobs = job_scheduler.upcoming(15)
+    if not jobs:
+        await interaction.response.send_message("ℹ️ Aucun événement planifié.", ephemeral=True)
+        return
+    lines = ["🗓️ **Prochains événements planifiés**", ""]
+    for job in jobs:
+        ts = int(job["due"])
+        repeat = " (hebdomadaire)" if job.get("recurrence") else ""
+        lines.append(f"• `{job['id']}` — <t:{ts}:F> (<t:{ts}:R>){repeat} — rattrapage : `{job.get('catch_up')}`")
+    running = job_scheduler.running()
+    if running:
+        lines.append("")
+        lines.append("⏳ En cours : " + ", ".join(f"`{job_id}`" for job_id in running))
+    await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
+@bot.tree.command(name="diagnostics", description="Diagnostic du bot (état, profil CPU ou mémoire)")
+@app_commands.describe(mode="Ce qu'il faut mesurer", duree="Durée de la capture en secondes (profils uniquement)")
+@app_commands.choices(mode=[
+    app_commands.Choice(name="État", value="state"),
+    app_commands.Choice(name="Profil CPU", value="cpu"),
+    app_commands.Choice(name="Profil mémoire", value="memory"),
+])
+async def diagnostics_command(interaction: discord.Interaction, mode: app_commands.Choice[str] = None,
+                              duree: app_commands.Range[int, 1, diagnostics.MAX_CAPTURE_SEC] = 10):
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("❌ Autorisation refusée. Administrateur requis.", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True)
+    mode = mode.value if mode else "state"
 
-        wait_seconds = (next_event_dt - now).total_seconds()
-        print(f"Next scheduled event: {next_event_name} at {next_event_dt.isoformat()} (in {int(wait_seconds)}s)")
-        await asyncio.sleep(max(0, wait_seconds))
+    if mode in ("cpu", "memory"):
+        if diagnostics.capture_running():
+            await interaction.followup.send("⏳ Une capture est déjà en cours.", ephemeral=True)
+            return
+        if mode == "cpu":
+            summary, data = await diagnostics.profile_cpu(duree)
+            filename = f"cpu-{datetime.now(tz).strftime('%Y%m%d-%H%M%S')}.collapsed.txt"
+        else:
+            summary, data = await diagnostics.profile_memory(duree)
+            filename = f"memory-{datetime.now(tz).strftime('%Y%m%d-%H%M%S')}.txt"
+        await interaction.followup.send(
+            f"```\n{summary[:1900]}\n```", file=discord.File(io.BytesIO(data), filename=filename), ephemeral=True
+        )
+        return
 
+    lines = [
+        f"Latence de la boucle : {loop_lag.value() * 1000:.1f} ms (gateway {bot.latency * 1000:.0f} ms)",
+        f"Démarré depuis : {timedelta(seconds=int(time.monotonic() - PROCESS_STARTED))}",
+        "",
+        "Caches discord.py : " + ", ".join(f"{k}={v}" for k, v in diagnostics.cache_sizes(bot).items()),
+        "",
+        "Stores :",
+    ]
+    for contest in registry:
+        for store in contest.stores():
+            parts = store.memory_parts()
+            size = diagnostics.deep_size(parts)
+            lines.append(f"  {contest.id}/{store.path.stem}: {diagnostics.format_bytes(size)}, "
+                         f"{store.pending_count()} écriture(s) en attente")
+            if len(parts) > 1:
+                # Sizes overlap: the records are shared between the indexes.
+                lines.append("    " + ", ".join(f"{name} {diagnostics.format_bytes(diagnostics.deep_size(part))}"
+                                               for name, part in parts.items()))
+    lines += ["", "Tâches :"]
+    for name, count in diagnostics.task_summary().most_common(20):
+        lines.append(f"  {count} × {name}")
+    for name, status in supervisor.status().items():
+        state = "ok" if status["running"] else "arrêtée"
+        lines.append(f"  [{name}] {state}, {status['restarts']} redémarrage(s)"
+                     + (f", dernière erreur : {status['last_error']}" if status["last_error"] else ""))
+    lines += ["", "Processus de travail : " + ", ".join(f"{k}={v}" for k, v in job_worker.stats.items())]
+    lines += [f"  {format_worker_job(job)}" for job in job_worker.running()]
+    report = "\n".join(lines)
+    await interaction.followup.send(f"```\n{report[:1900]}\n```", ephemeral=True)
+
+
+export_lock = asyncio.Lock()
+
+
+async def run_export(contest, fmt: str, interaction: discord.Interaction):
+    async with export_lock:
+        out = EXPORT_DIR / contest.id / ("parquet" if fmt == "parquet" else "votes.jsonl")
         try:
-            if next_event_name == "share":
-                await send_partage_message_auto()
-            elif next_event_name == "open":
-                await create_vote_thread_from_photos_auto()
-            elif next_event_name == "result":
-                await close_votes_and_announce_auto()
+            channel = bot.get_channel(contest.photo_channel_id) or await bot.fetch_channel(contest.photo_channel_id)
+            exporter = export.ThreadExporter(
+                export.open_writer(fmt, out), export.ExportCursors(export.cursors_path(out)),
+                contest_id=contest.id,
+                vote_emojis={"weekly": contest.vote_emoji, "monthly": contest.monthly_vote_emoji},
+            )
+            with phase_seconds.time(phase="export"):
+                stats = await exporter.export_channel(channel)
+            history_messages.inc(stats["messages"], scan="export")
+            message = (f"✅ Export terminé : {stats['records']} entrée(s) de {stats['threads']} fil(s) "
+                       f"({stats['threads_skipped']} déjà à jour) → `{out}`")
         except Exception as e:
-            print("Scheduled event error:", e)
+            print(f"run_export ({contest.id}) failed:", e)
+            message = f"❌ L'export a échoué : {e}"
+        try:
+            await interaction.followup.send(message, ephemeral=True)
+        except discord.HTTPException as e:
+            # The interaction token expires after 15 minutes.
+            print(f"run_export ({contest.id}):", message, e)
+
+
+@bot.tree.command(name="export", description="Exporte les fils de votes (JSONL ou Parquet)")
+@app_commands.describe(format="Format du fichier")
+@app_commands.choices(format=[
+    app_commands.Choice(name="JSONL", value="jsonl"),
+    app_commands.Choice(name="Parquet", value="parquet"),
+])
+async def export_command(interaction: discord.Interaction, format: app_commands.Choice[str] = None):
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("❌ Autorisation refusée. Administrateur requis.", ephemeral=True)
+        return
+    contest = await contest_for_interaction(interaction)
+    if contest is None:
+        return
+    fmt = format.value if format else "jsonl"
+    if fmt == "parquet" and not export.PARQUET_AVAILABLE:
+        await interaction.response.send_message("❌ L'export Parquet nécessite pyarrow sur le serveur.", ephemeral=True)
+        return
+    if export_lock.locked():
+        await interaction.response.send_message("⏳ Un export est déjà en cours.", ephemeral=True)
+        return
+    await interaction.response.send_message("⏳ Export lancé.", ephemeral=True)
+    spawn(run_export(contest, fmt, interaction))
+
+
+def format_worker_job(job: dict) -> str:
+    progress = ""
+    if job["progress"]:
+        done, total = job["progress"]
+        progress = f", {done}/{total}" if total else f", {done}"
+    return f"#{job['id']} {job['kind']} depuis {job['elapsed']:.0f}s{progress}"
+
+
+@bot.tree.command(name="travaux", description="Travaux lourds en cours (clôtures, galerie, exports)")
+@app_commands.describe(annuler="Numéro du travail à annuler")
+async def worker_jobs_command(interaction: discord.Interaction, annuler: int = None):
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message("❌ Autorisation refusée. Administrateur requis.", ephemeral=True)
+        return
+    if annuler is not None:
+        if job_worker.cancel(annuler):
+            message = f"🛑 Annulation du travail #{annuler} demandée."
+        else:
+            message = f"ℹ️ Aucun travail #{annuler} en cours."
+        await interaction.response.send_message(message, ephemeral=True)
+        return
+    jobs = job_worker.running()
+    if not jobs:
+        await interaction.response.send_message("✅ Aucun travail en cours.", ephemeral=True)
+        return
+    lines = ["⏳ **Travaux en cours**"] + [f"• {format_worker_job(job)}" for job in jobs]
+    await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
 
-        await asyncio.sleep(1)
+def contest_job(func):
+    # Jobs carry the contest id in their payload; phases of one contest run
+    # one at a time, different contests run side by side.
+    async def handler(contest_id: str = "default"):
+        contest = registry.get(contest_id)
+        if contest is None:
+            print(f"Scheduled event for unknown contest {contest_id!r} ignored")
+            return
+        async with contest.lock:
+            await func(contest)
+    return handler
+
+
+job_scheduler = JobScheduler(
+    DATA_DIR / "jobs.json",
+    tz,
+    handlers={
+        "share": contest_job(send_partage_message_auto),
+        "open": contest_job(create_vote_thread_from_photos_auto),
+        "result": contest_job(close_votes_and_announce_auto),
+        "monthly_close": contest_job(close_monthly_contest_auto),
+    }
+)
+
+# A missed call for photos is still useful the same evening, a missed vote
+# opening the same day; a missed result is always announced.
+WEEKLY_JOBS = (
+    ("share", run_within(6 * 3600)),
+    ("open", run_within(24 * 3600)),
+    ("result", CATCH_UP_RUN),
+)
+LEGACY_JOB_IDS = ("weekly:share", "weekly:open", "weekly:result", "monthly:close")
+
+
+def register_contest_jobs():
+    # Jobs from before multi-contest support had no contest in their id.
+    for job_id in LEGACY_JOB_IDS:
+        job_scheduler.cancel(job_id)
+
+    for contest in registry:
+        payload = {"contest_id": contest.id}
+        for kind, catch_up in WEEKLY_JOBS:
+            job_id = f"{contest.id}:weekly:{kind}"
+            if TEST_MODE:
+                job_scheduler.cancel(job_id)
+                continue
+            weekday, hour, minute = contest.schedule[kind]
+            job_scheduler.ensure_weekly(job_id, kind, weekday, hour, minute, catch_up=catch_up, payload=payload)
+
+        active = contest.monthly.get_active()
+        job_id = f"{contest.id}:monthly:close"
+        if active and not active.get("closed") and job_scheduler.get(job_id) is None:
+            ends_at = contest.monthly.parse_active_ends_at()
+            if ends_at:
+                job_scheduler.schedule(job_id, "monthly_close", ends_at, catch_up=CATCH_UP_RUN, payload=payload)
+
+
+async def scheduler_loop():
+    await bot.wait_until_ready()
+    print("Scheduler started. TIMEZONE =", TIMEZONE)
+    register_contest_jobs()
+    for job in job_scheduler.upcoming(5):
+        print(f"Next scheduled event: {job['id']} at {job['due_dt'].isoformat()}")
+    await job_scheduler.run()
 
 async def run_quick_test():
     await bot.wait_until_ready()
     await asyncio.sleep(1)
     print("TEST_MODE quick sequence starting")
-    await send_partage_message_auto()
+    for contest in registry:
+        async with contest.lock:
+            await send_partage_message_auto(contest)
     await asyncio.sleep(TEST_WAIT_SEC)
-    await create_vote_thread_from_photos_auto()
+    for contest in registry:
+        async with contest.lock:
+            await create_vote_thread_from_photos_auto(contest)
     await asyncio.sleep(TEST_WAIT_SEC)
-    await close_votes_and_announce_auto()
+    for contest in registry:
+        async with contest.lock:
+            await close_votes_and_announce_auto(contest)
     print("TEST_MODE quick sequence finished")
 
 _original_on_ready = getattr(bot, "on_ready", None)
+_original_close = bot.close
+
+
+async def close_bot():
+    # bot.run() ends here on Ctrl+C or SIGTERM; the worker process (and its
+    # process group) would otherwise outlive the bot, and the file checks'
+    # HTTP session would be left unclosed.
+    try:
+        await job_worker.stop()
+    except Exception as e:
+        print("close_bot: worker did not stop cleanly:", e)
+    await attachment_validator.close()
+    await _original_close()
+
+
+bot.close = close_bot
+
+supervisor = TaskSupervisor()
+command_hash_path = DATA_DIR / "command_tree.sha256"
+_startup_done = False
+
+
+async def sync_command_tree_if_changed():
+    # tree.sync() is slow and globally rate-limited: only call it when the
+    # command definitions actually changed since the last successful sync.
+    current = command_tree_hash(bot.tree, bot.application_id)
+    try:
+        previous = command_hash_path.read_text(encoding="utf-8").strip()
+    except Exception:
+        previous = None
+    if previous == current:
+        print("Command tree unchanged, skipping sync")
+        return
+    synced = await bot.tree.sync()
+    print(f"Synced {len(synced)} command(s)")
+    try:
+        command_hash_path.write_text(current, encoding="utf-8")
+    except Exception as e:
+        print("Could not record command tree hash:", e)
+
 
 @bot.event
 async def on_ready():
+    global _startup_done
+    # A fresh READY (not a RESUME) means gateway events may have been dropped.
+    for contest in registry:
+        contest.submissions.mark_stale()
+
+    if _startup_done:
+        print("Gateway session re-established; startup already done")
+        return
+    _startup_done = True
+    print(f"Gateway ready in {time.monotonic() - PROCESS_STARTED:.2f}s")
+    for contest in registry:
+        channel = bot.get_channel(contest.photo_channel_id)
+        shard_id = channel.guild.shard_id if channel is not None else None
+        print(f"Contest {contest.id}: photo channel {contest.photo_channel_id}, shard {shard_id}")
+
     if _original_on_ready:
         try:
             await _original_on_ready()
         except Exception:
             pass
 
+    if TEST_MODE:
+        supervisor.ensure("quick_test", run_quick_test, restart=False)
+    supervisor.ensure("scheduler", scheduler_loop)
+    supervisor.ensure("loop_monitor", lambda: monitor_event_loop(loop_lag, tasks_pending))
+    if ranked.AVAILABLE:
+        bot.add_view(ranking_menu())
+    elif any(contest.ranked_votes for contest in registry):
+        print("Ranked voting disabled: install numpy to enable it")
+    if duplicate_check_enabled():
+        for contest in registry:
+            supervisor.ensure(f"hash_backfill:{contest.id}", lambda c=contest: backfill_winner_hashes(c), restart=False)
+    elif DUPLICATE_CHECK:
+        print("Duplicate detection disabled: install numpy and Pillow to enable it")
+    if EXIF_INDEX:
+        for contest in registry:
+            supervisor.ensure(f"exif_backfill:{contest.id}", lambda c=contest: backfill_winner_exif(c), restart=False)
+    for contest in registry:
+        # Fan-outs a restart interrupted.
+        if contest.notices.pending():
+            supervisor.ensure(f"result_dms:{contest.id}", lambda c=contest: send_result_notices(c), restart=False)
+    if METRICS_PORT:
+        supervisor.ensure("metrics", lambda: serve_metrics(metrics, METRICS_HOST, METRICS_PORT))
+
     try:
-        synced = await bot.tree.sync()
-        print(f"Synced {len(synced)} command(s)")
+        await sync_command_tree_if_changed()
     except Exception as e:
         print(e)
 
-    if TEST_MODE:
-        bot.loop.create_task(run_quick_test())
-    else:
-        bot.loop.create_task(scheduler_loop())
-
-    try:
-        active = monthly_store.get_active()
-        if active and not active.get("closed"):
-            bot.loop.create_task(schedule_monthly_close())
-    except Exception as ex:
-        print("on_ready schedule_monthly_close error:", ex)
+    print(f"Startup complete in {time.monotonic() - PROCESS_STARTED:.2f}s")
 
 @bot.event
+@on_message_seconds.timed()
 async def on_message(message):
     if message.author == bot.user:
         return
-    if message.channel.id == PHOTO_CHANNEL_ID:
+    contest = registry.for_channel(message.channel.id)
+    if contest is not None and message.channel.id == contest.photo_channel_id:
         user_id = message.author.id
         if len(message.attachments) == 0:
-            try:
-                await message.delete()
-            except Exception:
-                pass
-            try:
-                await message.author.send(
-                    "❌ Les messages texte ne sont **pas autorisés** dans le canal photo.\n"
-                    "🙏 Merci de ne poster que **des photos**."
-                )
-            except Exception:
-                pass
+            await moderation.reject(
+                message,
+                "❌ Les messages texte ne sont **pas autorisés** dans le canal photo.\n"
+                "🙏 Merci de ne poster que **des photos**."
+            )
             return
 
         if len(message.attachments) > 1:
-            try:
-                await message.delete()
-            except Exception:
-                pass
-            try:
-                await message.author.send(
-                    "❌ Vous ne pouvez poster qu'**une seule photo** par semaine.\n"
-                    "🙏 Merci de ne partager qu'une seule image à la fois."
-                )
-            except Exception:
-                pass
+            await moderation.reject(
+                message,
+                "❌ Vous ne pouvez poster qu'**une seule photo** par semaine.\n"
+                "🙏 Merci de ne partager qu'une seule image à la fois."
+            )
             return
 
-        if user_submissions[user_id] >= 1:
-            try:
-                await message.delete()
-            except Exception:
-                pass
-            try:
-                await message.author.send(
-                    "❌ Vous avez déjà partagé une photo cette semaine.\n"
-                    "🙏 Merci d'attendre la semaine prochaine pour en partager une nouvelle."
-                )
-            except Exception:
-                pass
+        if SUBMISSION_VALIDATION:
+            reason = attachment_validator.check_metadata(message.attachments[0])
+            if reason:
+                await moderation.reject(message, SUBMISSION_NOTICES[reason] + SUBMISSION_RETRY)
+                return
+
+        if contest.submissions.has_submitted(user_id):
+            await moderation.reject(
+                message,
+                "❌ Vous avez déjà partagé une photo cette semaine.\n"
+                "🙏 Merci d'attendre la semaine prochaine pour en partager une nouvelle."
+            )
             return
 
-        user_submissions[user_id] += 1
+        contest.submissions.add(user_id, message.id, message.attachments[0].url, message.created_at)
+        if submission_screening_enabled():
+            spawn(screen_submission(contest, message))
 
 @bot.event
-async def on_message_delete(message):
-    try:
-        if message.channel.id == PHOTO_CHANNEL_ID and len(message.attachments) > 0:
-            user_id = message.author.id
-            if user_id in user_submissions:
-                user_submissions[user_id] = 0
-    except Exception:
-        pass
+async def on_raw_reaction_add(payload):
+    contest = registry.for_channel(payload.channel_id)
+    if contest is not None:
+        contest.tally.apply_reaction(payload.message_id, str(payload.emoji), 1)
+        voter_counter.invalidate(payload.message_id)
+
+@bot.event
+async def on_raw_reaction_remove(payload):
+    contest = registry.for_channel(payload.channel_id)
+    if contest is not None:
+        contest.tally.apply_reaction(payload.message_id, str(payload.emoji), -1)
+        voter_counter.invalidate(payload.message_id)
 
-bot.run(TOKEN)
\ No newline at end of file
+@bot.event
+async def on_raw_reaction_clear(payload):
+    contest = registry.for_channel(payload.channel_id)
+    if contest is not None:
+        contest.tally.clear_reactions(payload.message_id)
+        voter_counter.invalidate(payload.message_id)
+
+@bot.event
+async def on_raw_reaction_clear_emoji(payload):
+    contest = registry.for_channel(payload.channel_id)
+    if contest is not None:
+        contest.tally.clear_reactions(payload.message_id, str(payload.emoji))
+        voter_counter.invalidate(payload.message_id)
+
+@bot.event
+async def on_raw_message_delete(payload):
+    contest = registry.for_channel(payload.channel_id)
+    if contest is None:
+        return
+    if payload.channel_id == contest.photo_channel_id:
+        contest.submissions.remove_message(payload.message_id)
+        contest.exif.remove_message(payload.message_id)
+        contest.hashes.remove_message(payload.message_id)
+    elif contest.tally.remove_message(payload.message_id):
+        # An entry deleted from a vote thread.
+        voter_counter.invalidate(payload.message_id)
+
+@bot.event
+async def on_raw_bulk_message_delete(payload):
+    contest = registry.for_channel(payload.channel_id)
+    if contest is None:
+        return
+    for message_id in payload.message_ids:
+        if payload.channel_id == contest.photo_channel_id:
+            contest.submissions.remove_message(message_id)
+            contest.exif.remove_message(message_id)
+            contest.hashes.remove_message(message_id)
+        elif contest.tally.remove_message(message_id):
+            voter_counter.invalidate(message_id)
+
+if __name__ == "__main__":
+    bot.run(TOKEN)
@@ -0,0 +1,219 @@
+import math
+import time
+import asyncio
+import functools
+from contextlib import contextmanager
+
+from aiohttp import web
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _key(labels: dict):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def sync(self, total: float, **labels):
+        # Mirrors a running total kept elsewhere (outbound/moderation stats).
+        self._values[_key(labels)] = float(total)
+
+    def value(self, **labels) -> float:
+        return self._values.get(_key(labels), 0.0)
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name + "_total", labels, value
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+
+    def set(self, value: float, **labels):
+        self._values[_key(labels)] = float(value)
+
+    def value(self, **labels) -> float:
+        return self._values.get(_key(labels), 0.0)
+
+    def clear(self):
+        self._values = {}
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name, labels, value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values = {}
+
+    def observe(self, value: float, **labels):
+        key = _key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        counts = state[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        state[1] += value
+        state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def timed(self, **labels):
+        # Decorator for coroutine functions; every return path is measured.
+        def decorate(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def count(self, **labels) -> int:
+        state = self._values.get(_key(labels))
+        return state[2] if state else 0
+
+    def samples(self):
+        for labels, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                yield self.name + "_bucket", labels + (("le", _format_value(bound)),), cumulative
+            yield self.name + "_sum", labels, total
+            yield self.name + "_count", labels, count
+
+
+class MetricsRegistry:
+    # Metrics live in process memory and cost a dict update when recorded.
+    # Collectors are callables run at scrape time for values that are cheaper
+    # to read on demand (file sizes, queue depths) than to keep up to date.
+
+    def __init__(self, namespace: str = ""):
+        self.namespace = namespace
+        self._metrics = {}
+        self._collectors = []
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"duplicate metric {metric.name!r}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def _full_name(self, name: str) -> str:
+        return f"{self.namespace}_{name}" if self.namespace else name
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._register(Counter(self._full_name(name), help_text))
+
+    def gauge(self, name: str, help_text: str) -> Gauge:
+        return self._register(Gauge(self._full_name(name), help_text))
+
+    def histogram(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(self._full_name(name), help_text, buckets))
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def collect(self):
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                print("Metrics collector failed:", e)
+        return list(self._metrics.values())
+
+    def render(self, openmetrics: bool = False) -> str:
+        lines = []
+        for metric in self.collect():
+            # OpenMetrics names a counter family without its _total suffix,
+            # the Prometheus text format names it after its sample.
+            family = metric.name if openmetrics or metric.kind != "counter" else metric.name + "_total"
+            lines.append(f"# HELP {family} {metric.help}")
+            lines.append(f"# TYPE {family} {metric.kind}")
+            for sample_name, labels, value in metric.samples():
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+async def monitor_event_loop(lag_gauge: Gauge, tasks_gauge: Gauge, interval: float = 1.0):
+    # A sleep that wakes up late means something blocked the loop for the
+    # difference.
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag_gauge.set(max(0.0, loop.time() - expected))
+        tasks_gauge.set(len(asyncio.all_tasks(loop)))
+
+
+async def serve_metrics(registry: MetricsRegistry, host: str, port: int):
+    async def handle(request):
+        openmetrics = "application/openmetrics-text" in request.headers.get("Accept", "")
+        body = registry.render(openmetrics=openmetrics)
+        content_type = OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE
+        return web.Response(body=body.encode("utf-8"), headers={"Content-Type": content_type})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    print(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,126 @@
+import time
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+from outbound import PRIORITY_REACTION, PRIORITY_DM
+
+# Discord refuses bulk deletes of messages older than 14 days.
+BULK_DELETE_MAX_AGE = timedelta(days=14) - timedelta(minutes=5)
+BULK_DELETE_MAX = 100
+
+
+class ModerationQueue:
+    # Rule enforcement for the photo channel. The gateway handler only records
+    # what to do; a background worker drains the queue every batch_window
+    # seconds, bulk-deleting per channel and sending at most one DM per user.
+
+    def __init__(self, outbound, batch_window: float = 1.0, dm_coalesce_sec: float = 600.0, max_pending: int = 500,
+                 clock=time.monotonic):
+        self.outbound = outbound
+        self.clock = clock
+        self.batch_window = batch_window
+        self.dm_coalesce_sec = dm_coalesce_sec
+        self.max_pending = max_pending
+        self._deletes = {}
+        self._dms = {}
+        self._recent_dms = {}
+        self._pending = 0
+        self._wakeup = None
+        self._space = None
+        self._worker = None
+        self.stats = {
+            "rejected": 0,
+            "bulk_deletes": 0,
+            "single_deletes": 0,
+            "dms_sent": 0,
+            "dms_coalesced": 0,
+            "backpressure_waits": 0,
+        }
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._space = asyncio.Event()
+            self._space.set()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def reject(self, message, notice: str):
+        self._ensure_worker()
+        if self._pending >= self.max_pending:
+            # Only waits when the worker has fallen a full queue behind.
+            self.stats["backpressure_waits"] += 1
+            self._space.clear()
+            await self._space.wait()
+        self._pending += 1
+        self.stats["rejected"] += 1
+        self._deletes.setdefault(message.channel.id, (message.channel, []))[1].append(message)
+        user = message.author
+        notices = self._dms.setdefault(user.id, (user, []))[1]
+        if notice not in notices:
+            notices.append(notice)
+        else:
+            self.stats["dms_coalesced"] += 1
+        self._wakeup.set()
+
+    def queue_depth(self) -> int:
+        return self._pending
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            # Let a burst accumulate so it can be handled in a few bulk calls.
+            await asyncio.sleep(self.batch_window)
+            self._wakeup.clear()
+            deletes, self._deletes = self._deletes, {}
+            dms, self._dms = self._dms, {}
+            self._pending = 0
+            self._space.set()
+
+            jobs = [self._delete_batch(channel, messages) for channel, messages in deletes.values()]
+            jobs += [self._notify(user, notices) for user, notices in dms.values()]
+            for result in await asyncio.gather(*jobs, return_exceptions=True):
+                if isinstance(result, Exception):
+                    print("ModerationQueue: batch step failed:", result)
+
+    async def _delete_batch(self, channel, messages):
+        cutoff = datetime.now(timezone.utc) - BULK_DELETE_MAX_AGE
+        bulk = [m for m in messages if m.created_at > cutoff]
+        single = [m for m in messages if m.created_at <= cutoff]
+        for i in range(0, len(bulk), BULK_DELETE_MAX):
+            chunk = bulk[i:i + BULK_DELETE_MAX]
+            if len(chunk) == 1:
+                single.extend(chunk)
+                continue
+            try:
+                await self.outbound.call(f"delete:{channel.id}", PRIORITY_REACTION,
+                                         lambda chunk=chunk: channel.delete_messages(chunk, reason="Photo channel rules"))
+                self.stats["bulk_deletes"] += 1
+            except Exception as e:
+                print("ModerationQueue: bulk delete failed, deleting one by one:", e)
+                single.extend(chunk)
+        for m in single:
+            try:
+                await self.outbound.call(f"delete:{channel.id}", PRIORITY_REACTION, m.delete)
+                self.stats["single_deletes"] += 1
+            except Exception:
+                pass
+
+    async def _notify(self, user, notices):
+        now = self.clock()
+        sent_at, already = self._recent_dms.get(user.id, (0.0, set()))
+        if now - sent_at > self.dm_coalesce_sec:
+            already = set()
+        fresh = [n for n in notices if n not in already]
+        self.stats["dms_coalesced"] += len(notices) - len(fresh)
+        if not fresh:
+            return
+        self._recent_dms[user.id] = (now, already | set(fresh))
+        if len(self._recent_dms) > 10000:
+            self._recent_dms = {
+                uid: v for uid, v in self._recent_dms.items() if now - v[0] <= self.dm_coalesce_sec
+            }
+        try:
+            await self.outbound.call(f"dm:{user.id}", PRIORITY_DM, lambda: user.send("\n\n".join(fresh)))
+            self.stats["dms_sent"] += 1
+        except Exception:
+            pass
@@ -0,0 +1,235 @@
+import time
+import heapq
+import asyncio
+import itertools
+import discord
+
+PRIORITY_ANNOUNCEMENT = 0
+PRIORITY_VOTE_POST = 1
+PRIORITY_REACTION = 2
+PRIORITY_DM = 3
+
+PRIORITY_NAMES = {
+    PRIORITY_ANNOUNCEMENT: "announcement",
+    PRIORITY_VOTE_POST: "vote_post",
+    PRIORITY_REACTION: "reaction",
+    PRIORITY_DM: "dm",
+}
+
+# (refill rate per second, burst) per route kind, i.e. the part of the route
+# key before ":". Numbers follow Discord's published per-route limits.
+DEFAULT_ROUTE_LIMITS = {
+    "send": (1.0, 5),
+    "reaction": (4.0, 1),
+    "edit": (1.0, 3),
+    "delete": (1.0, 5),
+    "thread": (0.2, 2),
+    "dm": (0.5, 2),
+}
+FALLBACK_ROUTE_LIMIT = (1.0, 1)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def block(self, now: float, seconds: float):
+        self.tokens = 0.0
+        self.updated = now
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+class _Job:
+    __slots__ = ("priority", "seq", "factory", "future", "enqueued_at")
+
+    def __init__(self, priority, seq, factory, future, enqueued_at):
+        self.priority = priority
+        self.seq = seq
+        self.factory = factory
+        self.future = future
+        self.enqueued_at = enqueued_at
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class _Route:
+    __slots__ = ("kind", "bucket", "jobs", "busy")
+
+    def __init__(self, kind: str, bucket: TokenBucket):
+        self.kind = kind
+        self.bucket = bucket
+        self.jobs = []
+        self.busy = False
+
+
+class OutboundScheduler:
+    # Every outbound Discord call goes through submit()/call(). Calls on the
+    # same route run one at a time in (priority, submission) order, so message
+    # order within a channel is preserved; different routes run concurrently
+    # up to max_concurrency and a global token bucket.
+
+    def __init__(self, max_concurrency: int = 4, global_rate: float = 45.0, route_limits: dict = None,
+                 clock=time.monotonic):
+        self.max_concurrency = max_concurrency
+        self.route_limits = dict(DEFAULT_ROUTE_LIMITS, **(route_limits or {}))
+        self.clock = clock
+        self._global = TokenBucket(global_rate, int(global_rate), clock())
+        self._routes = {}
+        self._seq = itertools.count()
+        self._active = 0
+        self._wake = None
+        self._runner = None
+        self._stats = {
+            p: {"submitted": 0, "completed": 0, "failed": 0, "pending": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for p in PRIORITY_NAMES
+        }
+        self.rate_limited = 0
+        self.calls = {}
+
+    def _route(self, key: str) -> _Route:
+        route = self._routes.get(key)
+        if route is None:
+            kind = key.split(":", 1)[0]
+            rate, burst = self.route_limits.get(kind, FALLBACK_ROUTE_LIMIT)
+            route = self._routes[key] = _Route(kind, TokenBucket(rate, burst, self.clock()))
+        return route
+
+    def submit(self, route: str, priority: int, factory) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        if self._runner is None or self._runner.done():
+            self._wake = asyncio.Event()
+            self._runner = loop.create_task(self._run())
+        future = loop.create_future()
+        heapq.heappush(self._route(route).jobs, _Job(priority, next(self._seq), factory, future, self.clock()))
+        stats = self._stats[priority]
+        stats["submitted"] += 1
+        stats["pending"] += 1
+        self._wake.set()
+        return future
+
+    async def call(self, route: str, priority: int, factory):
+        return await self.submit(route, priority, factory)
+
+    def fire(self, route: str, priority: int, factory, label: str = "outbound"):
+        # Fire-and-forget variant: failures are logged, never raised.
+        def _done(fut):
+            if not fut.cancelled() and fut.exception() is not None:
+                print(f"{label} failed:", fut.exception())
+        self.submit(route, priority, factory).add_done_callback(_done)
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            timeout = self._dispatch()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _dispatch(self):
+        while self._active < self.max_concurrency:
+            now = self.clock()
+            global_delay = self._global.delay(now)
+            best_key, best_job, min_delay = None, None, None
+            for key, route in list(self._routes.items()):
+                if route.busy:
+                    continue
+                if not route.jobs:
+                    # A fully refilled idle bucket carries no state worth keeping.
+                    if route.bucket.delay(now) == 0 and route.bucket.tokens >= route.bucket.burst:
+                        del self._routes[key]
+                    continue
+                delay = route.bucket.delay(now)
+                if delay > 0:
+                    min_delay = delay if min_delay is None else min(min_delay, delay)
+                    continue
+                if best_job is None or route.jobs[0] < best_job:
+                    best_key, best_job = key, route.jobs[0]
+            if best_job is None:
+                return min_delay
+            if global_delay > 0:
+                return global_delay
+
+            route = self._routes[best_key]
+            heapq.heappop(route.jobs)
+            route.busy = True
+            route.bucket.take()
+            self._global.take()
+            self._active += 1
+            asyncio.get_running_loop().create_task(self._execute(route, best_job))
+        return None
+
+    async def _execute(self, route: _Route, job: _Job):
+        stats = self._stats[job.priority]
+        waited = self.clock() - job.enqueued_at
+        try:
+            if job.future.cancelled():
+                stats["pending"] -= 1
+                return
+            self.calls[route.kind] = self.calls.get(route.kind, 0) + 1
+            try:
+                result = await job.factory()
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    # Back off the whole route and retry this job first.
+                    self.rate_limited += 1
+                    retry_after = float(getattr(e, "retry_after", None) or 1.0)
+                    route.bucket.block(self.clock(), retry_after)
+                    heapq.heappush(route.jobs, job)
+                    return
+                stats["pending"] -= 1
+                stats["failed"] += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+                return
+            except Exception as e:
+                stats["pending"] -= 1
+                stats["failed"] += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+                return
+            stats["pending"] -= 1
+            stats["completed"] += 1
+            stats["wait_total"] += waited
+            stats["wait_max"] = max(stats["wait_max"], waited)
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            route.busy = False
+            self._active -= 1
+            self._wake.set()
+
+    def stats(self):
+        out = {"active": self._active, "routes": len(self._routes), "rate_limited": self.rate_limited,
+               "calls": dict(self.calls), "priorities": {}}
+        for priority, s in self._stats.items():
+            done = s["completed"]
+            out["priorities"][PRIORITY_NAMES[priority]] = {
+                "queue_depth": s["pending"],
+                "submitted": s["submitted"],
+                "completed": done,
+                "failed": s["failed"],
+                "wait_avg_sec": (s["wait_total"] / done) if done else 0.0,
+                "wait_max_sec": s["wait_max"],
+            }
+        return out
@@ -0,0 +1,119 @@
+import io
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+# Perceptual hashing for duplicate and repost detection. NumPy and Pillow are
+# optional: without them AVAILABLE is False and the bot skips the check.
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:
+    np = None
+    Image = None
+
+AVAILABLE = np is not None and Image is not None
+
+HASH_SIZE = 8
+_SAMPLE_SIZE = 32
+_dct_matrix = None
+_pool = None
+
+
+def _dct():
+    global _dct_matrix
+    if _dct_matrix is None:
+        n = _SAMPLE_SIZE
+        k = np.arange(n)[:, None]
+        x = np.arange(n)[None, :]
+        m = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+        m[0] /= np.sqrt(2.0)
+        _dct_matrix = m
+    return _dct_matrix
+
+
+def perceptual_hash(data: bytes) -> int:
+    # 64-bit pHash: low frequencies of the 2D DCT of a 32x32 greyscale copy,
+    # one bit per coefficient above the median. Recompression, resizing and
+    # light edits move only a few bits. Runs in a worker process.
+    with Image.open(io.BytesIO(data)) as img:
+        # JPEG decoders can downscale while decoding; a 24 MP photo never
+        # gets decoded at full size.
+        img.draft("L", (_SAMPLE_SIZE * 4, _SAMPLE_SIZE * 4))
+        small = img.convert("L").resize((_SAMPLE_SIZE, _SAMPLE_SIZE), Image.Resampling.LANCZOS)
+    pixels = np.asarray(small, dtype=np.float64)
+    d = _dct()
+    low = (d @ pixels @ d.T)[:HASH_SIZE, :HASH_SIZE].flatten()
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+async def hash_image(data: bytes, workers: int = 2) -> int:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=workers)
+    return await asyncio.get_running_loop().run_in_executor(_pool, perceptual_hash, data)
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class HammingIndex:
+    # Multi-index hashing: the 64-bit hash is cut into CHUNKS slices, each with
+    # its own exact-match table. Two hashes within distance CHUNKS - 1 agree
+    # on at least one slice (pigeonhole), so a search only verifies the hashes
+    # sharing a slice with the query: about n / 256 per table instead of n.
+    # Larger radii fall back to a full scan.
+
+    CHUNKS = 8
+    _BITS = 64 // CHUNKS
+    _MASK = (1 << _BITS) - 1
+
+    __slots__ = ("_items", "_tables")
+
+    def __init__(self):
+        self._items = {}
+        self._tables = [{} for _ in range(self.CHUNKS)]
+
+    def __len__(self):
+        return len(self._items)
+
+    def _slices(self, value: int):
+        return [(value >> (i * self._BITS)) & self._MASK for i in range(self.CHUNKS)]
+
+    def add(self, value: int, item):
+        items = self._items.get(value)
+        if items is not None:
+            items.append(item)
+            return
+        self._items[value] = [item]
+        for table, key in zip(self._tables, self._slices(value)):
+            table.setdefault(key, []).append(value)
+
+    def remove(self, value: int, item):
+        items = self._items.get(value)
+        if items is None or item not in items:
+            return
+        items.remove(item)
+        if items:
+            return
+        del self._items[value]
+        for table, key in zip(self._tables, self._slices(value)):
+            bucket = table[key]
+            bucket.remove(value)
+            if not bucket:
+                del table[key]
+
+    def search(self, value: int, radius: int):
+        # Yields (distance, item) for every item within radius of value.
+        if radius >= self.CHUNKS:
+            candidates = self._items
+        else:
+            candidates = set()
+            for table, key in zip(self._tables, self._slices(value)):
+                candidates.update(table.get(key, ()))
+        for candidate in candidates:
+            d = hamming(value, candidate)
+            if d <= radius:
+                for item in self._items[candidate]:
+                    yield d, item
@@ -0,0 +1,80 @@
+# Ranked-ballot tally (Schulze method) for contests voting with the ranking
+# menu instead of reactions. NumPy is optional: without it AVAILABLE is False
+# and those contests keep voting with reactions.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+AVAILABLE = np is not None
+
+
+class SchulzeResult:
+    __slots__ = ("winners", "order", "ballots")
+
+    def __init__(self, winners, order, ballots):
+        # Every candidate no other one beats (several on a tie), all the
+        # candidates best first, and the number of ballots counted.
+        self.winners = winners
+        self.order = order
+        self.ballots = ballots
+
+
+def rank_matrix(ballots, candidates):
+    # (voters, slots) candidate indexes, best first; -1 for an empty slot or
+    # someone not running (past winners). Dropping a candidate keeps the
+    # order of the others, as if the voter had never ranked it.
+    index = {c: i for i, c in enumerate(candidates)}
+    ballots = [b for b in ballots if any(c in index for c in b)]
+    slots = max((len(b) for b in ballots), default=0)
+    ranks = np.full((len(ballots), slots), -1, dtype=np.int32)
+    for v, ballot in enumerate(ballots):
+        for k, c in enumerate(ballot):
+            ranks[v, k] = index.get(c, -1)
+    return ranks
+
+
+def pairwise_preferences(ranks, n: int):
+    # d[i, j]: voters ranking i above j. Ranked beats unranked; two unranked
+    # candidates are a tie. One matrix product per ballot slot: the
+    # candidates in slot k against every candidate not ranked by then.
+    voters, slots = ranks.shape
+    d = np.zeros((n, n))
+    ranked_so_far = np.zeros((voters, n))
+    rows = np.arange(voters)
+    for k in range(slots):
+        filled = ranks[:, k] >= 0
+        at_k = np.zeros((voters, n))
+        at_k[rows[filled], ranks[filled, k]] = 1.0
+        ranked_so_far += at_k
+        d += at_k.T @ (1.0 - ranked_so_far)
+    return d.astype(np.int64)
+
+
+def strongest_paths(d):
+    # p[i, j]: strength of the strongest path from i to j (Floyd–Warshall,
+    # one vectorized relaxation per intermediate candidate).
+    p = np.where(d > d.T, d, 0)
+    for k in range(len(p)):
+        np.maximum(p, np.minimum(p[:, k:k + 1], p[k:k + 1, :]), out=p)
+    return p
+
+
+def schulze(ballots, candidates) -> SchulzeResult:
+    # ballots: one sequence per voter of candidate ids, best first (None for
+    # an empty slot); candidates: the ids running.
+    candidates = list(candidates)
+    ranks = rank_matrix(ballots, candidates)
+    n = len(candidates)
+    p = strongest_paths(pairwise_preferences(ranks, n))
+    beats = p > p.T
+    unbeaten = ~beats.T.any(axis=1)
+    # The Schulze relation is transitive: sorting by the number of
+    # candidates beaten gives the full ranking.
+    wins = beats.sum(axis=1)
+    order = sorted(range(n), key=lambda i: -wins[i])
+    return SchulzeResult(
+        winners=[candidates[i] for i in range(n) if unbeaten[i]],
+        order=[candidates[i] for i in order],
+        ballots=len(ranks),
+    )
@@ -0,0 +1,140 @@
+import sqlite3
+import threading
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    contest_type TEXT NOT NULL,
+    week_no INTEGER,
+    thread_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    author_mention TEXT,
+    image_url TEXT,
+    votes INTEGER NOT NULL,
+    is_winner INTEGER NOT NULL DEFAULT 0,
+    closed_at TEXT NOT NULL,
+    UNIQUE (contest_type, thread_id, message_id)
+);
+CREATE INDEX IF NOT EXISTS idx_entries_week ON entries (week_no);
+CREATE INDEX IF NOT EXISTS idx_entries_author ON entries (author_id);
+CREATE INDEX IF NOT EXISTS idx_entries_type ON entries (contest_type);
+
+CREATE TABLE IF NOT EXISTS author_stats (
+    author_id INTEGER NOT NULL,
+    contest_type TEXT NOT NULL,
+    participations INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    total_votes INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (author_id, contest_type)
+);
+CREATE INDEX IF NOT EXISTS idx_author_stats_rank
+    ON author_stats (contest_type, wins DESC, total_votes DESC);
+"""
+
+UPSERT_STATS = """
+INSERT INTO author_stats (author_id, contest_type, participations, wins, total_votes)
+VALUES (?, ?, 1, ?, ?)
+ON CONFLICT (author_id, contest_type) DO UPDATE SET
+    participations = participations + 1,
+    wins = wins + excluded.wins,
+    total_votes = total_votes + excluded.total_votes
+"""
+
+
+class ResultsDB:
+    # Every closed entry plus per-author aggregates maintained on insert, so
+    # leaderboard and stats reads never scan the history. Calls are blocking:
+    # run them with asyncio.to_thread from the bot.
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.created = not self.path.exists()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+    def record_contest(self, contest_type: str, week_no, thread_id: int, entries, winner_message_ids,
+                       closed_at_iso: str) -> int:
+        winner_message_ids = set(winner_message_ids)
+        inserted = 0
+        with self._lock, self._conn:
+            for e in entries:
+                is_winner = 1 if e["message_id"] in winner_message_ids else 0
+                cur = self._conn.execute(
+                    "INSERT OR IGNORE INTO entries (contest_type, week_no, thread_id, message_id, author_id,"
+                    " author_mention, image_url, votes, is_winner, closed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (contest_type, week_no, thread_id, e["message_id"], e["author_id"], e["author_mention"],
+                     e["image_url"], int(e["votes"]), is_winner, closed_at_iso)
+                )
+                # Re-recording the same close must not inflate the aggregates.
+                if cur.rowcount:
+                    self._conn.execute(UPSERT_STATS, (e["author_id"], contest_type, is_winner, int(e["votes"])))
+                    inserted += 1
+        return inserted
+
+    def backfill_weekly_winners(self, weekly):
+        # monthly.json only kept winners, so imported history is winners-only.
+        with self._lock, self._conn:
+            for i, e in enumerate(weekly):
+                cur = self._conn.execute(
+                    "INSERT OR IGNORE INTO entries (contest_type, week_no, thread_id, message_id, author_id,"
+                    " author_mention, image_url, votes, is_winner, closed_at) VALUES ('weekly', ?, 0, ?, ?, ?, ?, ?, 1, ?)",
+                    (int(e.get("week_no", 0)), -(i + 1), int(e["author_id"]), e.get("author_mention"),
+                     e.get("image_url"), int(e.get("votes", 0)), e.get("created_at", ""))
+                )
+                if cur.rowcount:
+                    self._conn.execute(UPSERT_STATS, (int(e["author_id"]), "weekly", 1, int(e.get("votes", 0))))
+
+    def leaderboard(self, contest_type: str, limit: int = 10):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT author_id, participations, wins, total_votes FROM author_stats"
+                " WHERE contest_type = ? ORDER BY wins DESC, total_votes DESC LIMIT ?",
+                (contest_type, limit)
+            ).fetchall()
+        return [self._stats_row(r) for r in rows]
+
+    def author_stats(self, author_id: int):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT author_id, contest_type, participations, wins, total_votes FROM author_stats WHERE author_id = ?",
+                (author_id,)
+            ).fetchall()
+        return {r["contest_type"]: self._stats_row(r) for r in rows}
+
+    def entries_for_weeks(self, contest_type: str, first_week: int, last_week: int):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM entries WHERE contest_type = ? AND week_no BETWEEN ? AND ? ORDER BY week_no",
+                (contest_type, first_week, last_week)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def winners(self):
+        # Every winning entry, weekly and monthly, oldest first.
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM entries WHERE is_winner = 1 ORDER BY closed_at, contest_type, week_no"
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    @staticmethod
+    def _stats_row(r):
+        participations = r["participations"]
+        return {
+            "author_id": r["author_id"],
+            "participations": participations,
+            "wins": r["wins"],
+            "total_votes": r["total_votes"],
+            "avg_votes": (r["total_votes"] / participations) if participations else 0.0
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,1315 @@
+"""Offline end-to-end contest simulation.
+
+Runs the real bot from main.py against an in-process fake Discord (HTTP API
+and gateway) on an event loop whose clock can be warped, so whole weeks and
+monthly cycles play out in seconds. Scripted load profiles post photos, break
+the channel rules and vote, then report per-phase latency and API usage.
+
+    python simulate.py                       # "club" profile, 5 weeks
+    python simulate.py --profile stress --weeks 2 --json sim.json
+    python simulate.py --posters 50 --voters 200 --unknown-emoji
+    python simulate.py --lean --rss-budget-mb 150 --heap-budget-mb 40
+
+Nothing here talks to the network; the bot's data goes to a temporary
+directory unless --data-dir is given.
+"""
+import io
+import os
+import re
+import gc
+import sys
+import json
+import time
+import tracemalloc
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+import selectors
+from collections import Counter, defaultdict
+from datetime import datetime, timezone, timedelta
+from urllib.parse import urlsplit, parse_qsl, unquote
+
+from imageprobe import probe_image, NotAnImage, MAX_HEAD_BYTES
+
+PROFILES = {
+    "smoke": {"weeks": 1, "posters": 20, "voters": 40, "votes_per_voter": 3, "rule_breakers": 0.1},
+    "club": {"weeks": 5, "posters": 150, "voters": 500, "votes_per_voter": 5, "rule_breakers": 0.05},
+    "stress": {"weeks": 5, "posters": 3000, "voters": 10000, "votes_per_voter": 8, "rule_breakers": 0.05},
+}
+
+GUILD_ID = 900000000000000001
+PHOTO_CHANNEL_ID = 900000000000000010
+RESULT_CHANNEL_ID = 900000000000000011
+BOT_USER_ID = 900000000000000100
+ROLE_IDS = (900000000000000200, 900000000000000201)
+DISCORD_EPOCH_MS = 1420070400000
+
+
+# === Virtual time ===
+class _WarpSelector:
+    # Wraps the loop's selector. When the loop would block waiting for its
+    # next timer and no real I/O is ready, the virtual clock jumps straight
+    # to that timer. While executor jobs (store writes) are in flight, time
+    # is frozen and the selector waits for them in real time instead.
+
+    def __init__(self, selector, loop):
+        self._selector = selector
+        self._loop = loop
+
+    def select(self, timeout=None):
+        if self._loop._executor_jobs:
+            return self._selector.select(0.05 if timeout is None else min(timeout, 0.05))
+        events = self._selector.select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            return self._selector.select(None)
+        self._loop._virtual_now += timeout
+        return []
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    def __init__(self):
+        super().__init__(selectors.DefaultSelector())
+        self._virtual_now = 0.0
+        self._executor_jobs = 0
+        self._selector = _WarpSelector(self._selector, self)
+
+    def time(self):
+        return self._virtual_now
+
+    def run_in_executor(self, executor, func, *args):
+        future = super().run_in_executor(executor, func, *args)
+        self._executor_jobs += 1
+
+        def _done(_):
+            self._executor_jobs -= 1
+        future.add_done_callback(_done)
+        return future
+
+
+class VirtualClock:
+    # Maps the loop's virtual monotonic time onto a wall clock starting at
+    # start_epoch.
+    def __init__(self, loop: VirtualClockLoop, start_epoch: float):
+        self.loop = loop
+        self.start_epoch = start_epoch
+        self.loop_start = loop.time()
+
+    def time(self) -> float:
+        return self.start_epoch + self.loop.time() - self.loop_start
+
+    def now(self, tz=timezone.utc) -> datetime:
+        return datetime.fromtimestamp(self.time(), tz)
+
+    def loop_time_at(self, epoch: float) -> float:
+        return self.loop_start + epoch - self.start_epoch
+
+
+def virtual_datetime(clock: VirtualClock):
+    class VirtualDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.fromtimestamp(clock.time(), tz)
+
+        @classmethod
+        def utcnow(cls):
+            return datetime.fromtimestamp(clock.time(), timezone.utc).replace(tzinfo=None)
+    return VirtualDatetime
+
+
+# === Fake HTTP transport ===
+class FakeResponse:
+    def __init__(self, method: str, url: str, status: int, body=None, headers: dict = None):
+        from multidict import CIMultiDict
+        self.method = method
+        self.url = url
+        self.status = status
+        self.reason = {200: "OK", 204: "No Content", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+                       429: "Too Many Requests"}.get(status, "")
+        self.headers = CIMultiDict(headers or {})
+        self._raw = None
+        if isinstance(body, bytes):
+            self._raw = body
+            self._text = ""
+            self.headers["content-type"] = "application/octet-stream"
+            self.content = _Stream(body)
+        elif body is None:
+            self._text = ""
+        else:
+            self._text = json.dumps(body)
+            self.headers["content-type"] = "application/json"
+
+    async def text(self, encoding="utf-8"):
+        return self._text
+
+    async def read(self):
+        return self._raw if self._raw is not None else self._text.encode("utf-8")
+
+
+class _Stream:
+    # The slice of aiohttp.StreamReader that header probing uses.
+    def __init__(self, data: bytes):
+        self._data = data
+        self._pos = 0
+
+    async def read(self, n: int = -1) -> bytes:
+        end = len(self._data) if n < 0 else self._pos + n
+        chunk = self._data[self._pos:end]
+        self._pos += len(chunk)
+        return chunk
+
+
+class _RequestContext:
+    def __init__(self, coro):
+        self._coro = coro
+
+    async def __aenter__(self):
+        return await self._coro
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    # Stands in for discord.py's aiohttp session, so the library's own
+    # request(), rate-limit header handling and 429 retries all run unchanged.
+    closed = False
+
+    def __init__(self, server):
+        self.server = server
+
+    def request(self, method, url, **kwargs):
+        return _RequestContext(self.server.handle(method, url, kwargs))
+
+    def get(self, url, headers=None, **kwargs):
+        return _RequestContext(self.server.cdn(url, headers))
+
+    async def close(self):
+        self.closed = True
+
+
+class _Window:
+    __slots__ = ("limit", "per", "remaining", "reset_at")
+
+    def __init__(self, limit: int, per: float):
+        self.limit = limit
+        self.per = per
+        self.remaining = limit
+        self.reset_at = 0.0
+
+
+class APIError(Exception):
+    def __init__(self, status: int, code: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+# Fixed-window limits per (route, major parameter), close to what Discord
+# advertises in its X-RateLimit-* headers.
+ROUTE_LIMITS = {
+    "POST /channels/{channel_id}/messages": (5, 5.0),
+    "PUT /channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me": (1, 0.25),
+    "DELETE /channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me": (1, 0.25),
+    "DELETE /channels/{channel_id}/messages/{message_id}": (5, 1.0),
+    "POST /channels/{channel_id}/messages/bulk-delete": (1, 1.0),
+    "POST /channels/{channel_id}/threads": (5, 10.0),
+    "PATCH /channels/{channel_id}": (5, 5.0),
+    "POST /users/@me/channels": (5, 5.0),
+}
+DEFAULT_LIMIT = (10, 5.0)
+GLOBAL_LIMIT = (50, 1.0)
+
+
+class FakeDiscord:
+    # One guild, its text channels and threads, messages, reactions and the
+    # users who post them. Every state change the real API would announce on
+    # the gateway is dispatched to the bot's ConnectionState.
+
+    def __init__(self, loop: VirtualClockLoop, clock: VirtualClock, latency: float = 0.05,
+                 unknown_emojis=()):
+        self.loop = loop
+        self.clock = clock
+        self.latency = latency
+        self.unknown_emojis = set(unknown_emojis)
+        self.state = None
+        self.channels = {}
+        self.messages = defaultdict(dict)
+        self.message_channel = {}
+        self.reactions = {}
+        self.users = {}
+        self.dm_channels = {}
+        self.thread_activity = {}
+        self.deleted_at = {}
+        self.created_at = {}
+        self.blobs = {}
+        self.interaction_replies = []
+        self.calls = Counter()
+        self.rate_limited = Counter()
+        self.errors = Counter()
+        self._windows = {}
+        self._global = _Window(*GLOBAL_LIMIT)
+        self._last_id = 0
+        self._routes = [
+            ("GET", r"/users/@me", self.get_me),
+            ("POST", r"/users/@me/channels", self.open_dm),
+            ("PUT", r"/applications/(\d+)/commands", self.put_commands),
+            ("GET", r"/channels/(\d+)", self.get_channel),
+            ("PATCH", r"/channels/(\d+)", self.edit_channel),
+            ("POST", r"/channels/(\d+)/threads", self.create_thread),
+            ("GET", r"/channels/(\d+)/threads/archived/public", self.archived_threads),
+            ("GET", r"/channels/(\d+)/users/@me/threads/archived/private", self.joined_private_threads),
+            ("GET", r"/guilds/(\d+)/threads/active", self.active_threads),
+            ("GET", r"/channels/(\d+)/messages", self.logs_from),
+            ("POST", r"/channels/(\d+)/messages", self.create_message),
+            ("POST", r"/channels/(\d+)/messages/bulk-delete", self.bulk_delete),
+            ("GET", r"/channels/(\d+)/messages/(\d+)", self.get_message),
+            ("DELETE", r"/channels/(\d+)/messages/(\d+)", self.delete_message),
+            ("PUT", r"/channels/(\d+)/messages/(\d+)/reactions/([^/]+)/@me", self.add_own_reaction),
+            ("DELETE", r"/channels/(\d+)/messages/(\d+)/reactions/([^/]+)/@me", self.remove_own_reaction),
+            ("GET", r"/channels/(\d+)/messages/(\d+)/reactions/([^/]+)", self.reaction_users),
+            ("POST", r"/interactions/(\d+)/([^/]+)/callback", self.interaction_callback),
+        ]
+        self._routes = [(m, re.compile(p + "$"), h) for m, p, h in self._routes]
+
+        self.bot_user = self.add_user(BOT_USER_ID, "SnapTastic", bot=True)
+        self.guild = {"id": str(GUILD_ID), "name": "Simulation"}
+        self.add_text_channel(PHOTO_CHANNEL_ID, "photos")
+        self.add_text_channel(RESULT_CHANNEL_ID, "resultats")
+
+    # --- ids and payloads ---
+    def snowflake(self) -> int:
+        ms = int(self.clock.time() * 1000) - DISCORD_EPOCH_MS
+        self._last_id = max(self._last_id + 1, ms << 22)
+        return self._last_id
+
+    def iso_now(self) -> str:
+        return self.clock.now().isoformat()
+
+    def add_user(self, user_id: int, name: str, bot: bool = False) -> dict:
+        user = {"id": str(user_id), "username": name, "discriminator": "0", "global_name": name,
+                "avatar": None, "bot": bot}
+        self.users[user_id] = user
+        return user
+
+    def add_text_channel(self, channel_id: int, name: str):
+        self.channels[channel_id] = {
+            "id": str(channel_id), "type": 0, "guild_id": str(GUILD_ID), "name": name,
+            "position": len(self.channels), "permission_overwrites": [], "nsfw": False, "parent_id": None,
+            "topic": None, "rate_limit_per_user": 0, "last_message_id": None,
+        }
+
+    def guild_payload(self) -> dict:
+        return dict(self.guild, **{
+            "icon": None, "owner_id": str(BOT_USER_ID), "afk_timeout": 300, "verification_level": 0,
+            "default_message_notifications": 0, "explicit_content_filter": 0, "mfa_level": 0,
+            "features": [], "emojis": [], "stickers": [], "large": False, "unavailable": False,
+            "member_count": len(self.users), "premium_tier": 0, "preferred_locale": "fr",
+            "roles": [{"id": str(GUILD_ID), "name": "@everyone", "permissions": "2248473465835073",
+                       "position": 0, "color": 0, "hoist": False, "managed": False, "mentionable": False}]
+            + [{"id": str(r), "name": f"reporters-{i}", "permissions": "0", "position": i + 1, "color": 0,
+                "hoist": False, "managed": False, "mentionable": True} for i, r in enumerate(ROLE_IDS)],
+            "channels": [c for c in self.channels.values() if c["type"] == 0],
+            "threads": [],
+            "members": [{"user": self.bot_user, "roles": [], "joined_at": self.iso_now(), "deaf": False,
+                         "mute": False, "flags": 0}],
+        })
+
+    def message_payload(self, channel_id: int, author: dict, content: str = "", embeds=None,
+                        attachments=None) -> dict:
+        message_id = self.snowflake()
+        return {
+            "id": str(message_id), "channel_id": str(channel_id), "guild_id": str(GUILD_ID),
+            "author": author, "content": content, "timestamp": self.iso_now(), "edited_timestamp": None,
+            "tts": False, "mention_everyone": False, "mentions": [], "mention_roles": [],
+            "attachments": attachments or [], "embeds": embeds or [], "pinned": False, "type": 0,
+        }
+
+    def attachment(self, channel_id: int, filename: str, content: bytes = None, content_type: str = "image/jpeg",
+                   size: int = None) -> dict:
+        attachment_id = self.snowflake()
+        path = f"https://cdn.discordapp.com/attachments/{channel_id}/{attachment_id}/{filename}"
+        if content is None:
+            content = self.image_bytes(attachment_id)
+        self.blobs[path] = content
+        # Like Discord, only report dimensions for images it can decode.
+        try:
+            _, width, height = probe_image(content[:MAX_HEAD_BYTES])
+        except (NotAnImage, TypeError):
+            width = height = None
+        # Signed like real attachment links: valid for a day.
+        issued = int(self.clock.time())
+        url = f"{path}?ex={issued + 86400:x}&is={issued:x}&hm={attachment_id:x}&"
+        return {"id": str(attachment_id), "filename": filename, "size": size or len(content), "url": url,
+                "proxy_url": url, "content_type": content_type, "width": width, "height": height}
+
+    @staticmethod
+    def image_bytes(seed: int, width: int = 1280, height: int = 960) -> bytes:
+        # A distinct photo per attachment when Pillow is installed (so
+        # perceptual hashing has something to look at), else a bare JPEG
+        # header with the right size.
+        try:
+            from PIL import Image
+        except ImportError:
+            sof = b"\xff\xc0\x00\x11\x08" + height.to_bytes(2, "big") + width.to_bytes(2, "big") + b"\x03" + bytes(9)
+            return b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00" + sof + b"\xff\xd9"
+        rng = random.Random(seed)
+        tiles = Image.frombytes("RGB", (8, 6), bytes(rng.randrange(256) for _ in range(8 * 6 * 3)))
+        img = tiles.resize((width, height), Image.Resampling.BICUBIC)
+        out = io.BytesIO()
+        img.save(out, "JPEG", quality=85, exif=FakeDiscord.camera_exif(rng))
+        return out.getvalue()
+
+    CAMERAS = (("Canon", "Canon EOS R5", "RF50mm F1.8 STM"), ("SONY", "ILCE-7M3", "FE 85mm F1.8"),
+               ("FUJIFILM", "X-T4", "XF23mmF1.4 R"), ("Apple", "iPhone 15 Pro", "iPhone 15 Pro back camera"))
+
+    @staticmethod
+    def camera_exif(rng):
+        # What a camera would write, so the EXIF index has data to index.
+        from PIL import Image
+        from PIL.TiffImagePlugin import IFDRational
+        make, model, lens = rng.choice(FakeDiscord.CAMERAS)
+        exif = Image.Exif()
+        exif[0x010F], exif[0x0110] = make, model
+        ifd = exif.get_ifd(0x8769)
+        ifd[0xA434] = lens
+        ifd[0x920A] = IFDRational(rng.choice((24, 35, 50, 85)), 1)
+        ifd[0x829D] = IFDRational(rng.choice((14, 18, 28, 40, 80)), 10)
+        ifd[0x829A] = IFDRational(1, rng.choice((60, 125, 250, 1000)))
+        ifd[0x8827] = rng.choice((100, 400, 1600))
+        ifd[0x9003] = f"{rng.choice((2024, 2025))}:{rng.randint(1, 12):02d}:{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:00:00"
+        return exif
+
+    async def cdn(self, url: str, headers: dict = None) -> FakeResponse:
+        await asyncio.sleep(self.latency)
+        content = self.blobs.get(url.split("?", 1)[0])
+        expires = dict(parse_qsl(urlsplit(url).query)).get("ex")
+        if content is None or expires is None or int(expires, 16) <= self.clock.time():
+            self.calls["GET cdn"] += 1
+            return FakeResponse("GET", url, 404, {"message": "404: Not Found", "code": 0})
+        m = re.match(r"bytes=(\d+)-(\d*)$", (headers or {}).get("Range", ""))
+        if m:
+            self.calls["GET cdn (range)"] += 1
+            end = int(m.group(2)) + 1 if m.group(2) else len(content)
+            return FakeResponse("GET", url, 206, content[int(m.group(1)):end])
+        self.calls["GET cdn"] += 1
+        return FakeResponse("GET", url, 200, content)
+
+    def with_reactions(self, message: dict) -> dict:
+        reactions = self.reactions.get(int(message["id"]), {})
+        if not reactions:
+            return message
+        return dict(message, reactions=[
+            {"emoji": {"id": None, "name": emoji}, "count": len(users), "me": BOT_USER_ID in users,
+             "me_burst": False, "burst_me": False, "burst_colors": [],
+             "count_details": {"burst": 0, "normal": len(users)}}
+            for emoji, users in reactions.items() if users
+        ])
+
+    # --- gateway ---
+    def dispatch(self, event: str, payload: dict):
+        # Delivered after the current HTTP response, like a real gateway.
+        self.loop.call_soon(self.state.parsers[event], payload)
+
+    def _store_message(self, message: dict, dispatch: bool = True):
+        channel_id = int(message["channel_id"])
+        message_id = int(message["id"])
+        self.messages[channel_id][message_id] = message
+        self.message_channel[message_id] = channel_id
+        self.created_at[message_id] = self.clock.time()
+        channel = self.channels.get(channel_id)
+        if channel is not None:
+            channel["last_message_id"] = message["id"]
+            if channel["type"] == 11:
+                self.thread_activity[channel_id] = self.clock.time()
+                channel["message_count"] = channel.get("message_count", 0) + 1
+        if dispatch and channel is not None:
+            self.dispatch("MESSAGE_CREATE", message)
+
+    # --- what users do ---
+    def user_post(self, user_id: int, channel_id: int, content: str = "", photos: int = 1, image: bytes = None,
+                  content_type: str = "image/jpeg", filename: str = "IMG_{i}.jpg", size: int = None) -> int:
+        author = self.users.get(user_id) or self.add_user(user_id, f"membre{user_id % 100000}")
+        attachments = [self.attachment(channel_id, filename.format(i=i), content=image, content_type=content_type,
+                                       size=size) for i in range(photos)]
+        message = self.message_payload(channel_id, author, content, attachments=attachments)
+        self._store_message(message)
+        return int(message["id"])
+
+    def user_react(self, user_id: int, message_id: int, emoji: str, add: bool = True):
+        channel_id = self.message_channel.get(message_id)
+        if channel_id is None or message_id not in self.messages[channel_id]:
+            return
+        if user_id not in self.users:
+            self.add_user(user_id, f"membre{user_id % 100000}")
+        users = self.reactions.setdefault(message_id, {}).setdefault(emoji, [])
+        if add == (user_id in users):
+            return
+        if add:
+            users.append(user_id)
+        else:
+            users.remove(user_id)
+        self.dispatch("MESSAGE_REACTION_ADD" if add else "MESSAGE_REACTION_REMOVE", {
+            "user_id": str(user_id), "channel_id": str(channel_id), "message_id": str(message_id),
+            "guild_id": str(GUILD_ID), "emoji": {"id": None, "name": emoji}, "burst": False, "type": 0,
+        })
+
+    def user_select(self, user_id: int, message_id: int, value: str):
+        # Picks `value` in the select menu under a bot message.
+        channel_id = self.message_channel.get(message_id)
+        message = self.messages[channel_id].get(message_id) if channel_id is not None else None
+        if message is None or not message.get("components"):
+            return
+        select = message["components"][0]["components"][0]
+        user = self.users.get(user_id) or self.add_user(user_id, f"membre{user_id % 100000}")
+        self.dispatch("INTERACTION_CREATE", {
+            "id": str(self.snowflake()), "application_id": str(BOT_USER_ID), "type": 3, "token": "simulation",
+            "version": 1, "channel_id": str(channel_id), "channel": self._channel(channel_id),
+            "guild_id": str(GUILD_ID), "locale": "fr",
+            "guild_locale": "fr", "app_permissions": "0", "entitlements": [], "attachment_size_limit": 10 * 1024 * 1024,
+            "member": {"user": user, "roles": [], "joined_at": self.iso_now(), "deaf": False, "mute": False,
+                       "flags": 0, "permissions": "0"},
+            "message": message,
+            "data": {"custom_id": select["custom_id"], "component_type": 3, "values": [value]},
+        })
+
+    def sweep_archived_threads(self):
+        # Discord archives a thread after auto_archive_duration minutes
+        # without activity.
+        now = self.clock.time()
+        for channel_id, channel in self.channels.items():
+            meta = channel.get("thread_metadata")
+            if not meta or meta["archived"]:
+                continue
+            idle = now - self.thread_activity.get(channel_id, now)
+            if idle >= meta["auto_archive_duration"] * 60:
+                self._set_archived(channel, True)
+
+    def _set_archived(self, channel: dict, archived: bool):
+        meta = channel["thread_metadata"]
+        meta["archived"] = archived
+        meta["archive_timestamp"] = self.iso_now()
+        if not archived:
+            self.thread_activity[int(channel["id"])] = self.clock.time()
+        self.dispatch("THREAD_UPDATE", channel)
+
+    # --- HTTP ---
+    def _limit(self, template: str, major: str):
+        # Returns (headers, retry_after); retry_after is None when allowed.
+        now = self.clock.time()
+        if now >= self._global.reset_at:
+            self._global.remaining = self._global.limit
+            self._global.reset_at = now + self._global.per
+        key = (template, major)
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = _Window(*ROUTE_LIMITS.get(template, DEFAULT_LIMIT))
+        if now >= window.reset_at:
+            window.remaining = window.limit
+            window.reset_at = now + window.per
+        if self._global.remaining <= 0:
+            return {}, self._global.reset_at - now, True
+        if window.remaining <= 0:
+            return self._headers(template, window, now), window.reset_at - now, False
+        window.remaining -= 1
+        self._global.remaining -= 1
+        return self._headers(template, window, now), None, False
+
+    def _headers(self, template: str, window: _Window, now: float) -> dict:
+        return {
+            "X-RateLimit-Limit": str(window.limit),
+            "X-RateLimit-Remaining": str(window.remaining),
+            "X-RateLimit-Reset": f"{self.clock.start_epoch + window.reset_at - self.clock.loop_start:.3f}",
+            "X-RateLimit-Reset-After": f"{max(0.0, window.reset_at - now):.3f}",
+            "X-RateLimit-Bucket": format(abs(hash(template)), "x"),
+        }
+
+    async def handle(self, method: str, url: str, kwargs: dict) -> FakeResponse:
+        await asyncio.sleep(self.latency)
+        path = urlsplit(url).path.split("/api/v10", 1)[-1]
+        params = {k: str(v) for k, v in (kwargs.get("params") or {}).items()}
+        for route_method, pattern, handler in self._routes:
+            if route_method != method:
+                continue
+            m = pattern.match(path)
+            if m is None:
+                continue
+            template = self._TEMPLATES[handler.__name__]
+            major = m.group(1) if m.groups() else ""
+            headers, retry_after, is_global = self._limit(template, major)
+            if retry_after is not None:
+                self.rate_limited[template] += 1
+                body = {"message": "You are being rate limited.", "retry_after": round(retry_after, 3),
+                        "global": is_global}
+                return FakeResponse(method, url, 429, body, dict(headers, **{
+                    "Retry-After": str(max(1, int(retry_after + 0.999))), "Via": "1.1 google",
+                    "X-RateLimit-Scope": "global" if is_global else "user"}))
+            self.calls[template] += 1
+            try:
+                result = handler(*m.groups(), body=self._body(kwargs), params=params)
+            except APIError as e:
+                self.errors[f"{template} {e.status}"] += 1
+                return FakeResponse(method, url, e.status, {"message": e.message, "code": e.code}, headers)
+            if result is None:
+                return FakeResponse(method, url, 204, None, headers)
+            return FakeResponse(method, url, 200, result, headers)
+        self.errors[f"{method} {path} 404"] += 1
+        return FakeResponse(method, url, 404, {"message": "404: Not Found", "code": 0})
+
+    _TEMPLATES = {
+        "get_me": "GET /users/@me",
+        "open_dm": "POST /users/@me/channels",
+        "put_commands": "PUT /applications/{application_id}/commands",
+        "get_channel": "GET /channels/{channel_id}",
+        "edit_channel": "PATCH /channels/{channel_id}",
+        "create_thread": "POST /channels/{channel_id}/threads",
+        "archived_threads": "GET /channels/{channel_id}/threads/archived/public",
+        "joined_private_threads": "GET /channels/{channel_id}/users/@me/threads/archived/private",
+        "active_threads": "GET /guilds/{guild_id}/threads/active",
+        "logs_from": "GET /channels/{channel_id}/messages",
+        "create_message": "POST /channels/{channel_id}/messages",
+        "bulk_delete": "POST /channels/{channel_id}/messages/bulk-delete",
+        "get_message": "GET /channels/{channel_id}/messages/{message_id}",
+        "delete_message": "DELETE /channels/{channel_id}/messages/{message_id}",
+        "add_own_reaction": "PUT /channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me",
+        "interaction_callback": "POST /interactions/{interaction_id}/{token}/callback",
+        "remove_own_reaction": "DELETE /channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me",
+        "reaction_users": "GET /channels/{channel_id}/messages/{message_id}/reactions/{emoji}",
+    }
+
+    @staticmethod
+    def _body(kwargs: dict):
+        data = kwargs.get("data")
+        if data is None:
+            return {}
+        if isinstance(data, (str, bytes)):
+            return json.loads(data)
+        # aiohttp.FormData (uploads): pull out payload_json and the file sizes.
+        body, files = {}, []
+        for type_options, _headers, value in getattr(data, "_fields", []):
+            name = type_options.get("name", "")
+            if name == "payload_json":
+                body = json.loads(value)
+            elif name.startswith("files["):
+                content = value.read() if hasattr(value, "read") else value
+                files.append((type_options.get("filename") or "file", content))
+        body["_files"] = files
+        return body
+
+    def _channel(self, channel_id) -> dict:
+        channel = self.channels.get(int(channel_id)) or self.dm_channels.get(int(channel_id))
+        if channel is None:
+            raise APIError(404, 10003, "Unknown Channel")
+        return channel
+
+    def _message(self, channel_id, message_id) -> dict:
+        message = self.messages[int(channel_id)].get(int(message_id))
+        if message is None:
+            raise APIError(404, 10008, "Unknown Message")
+        return message
+
+    # --- route handlers ---
+    def get_me(self, body, params):
+        return self.bot_user
+
+    def open_dm(self, body, params):
+        user_id = int(body["recipient_id"])
+        for channel in self.dm_channels.values():
+            if int(channel["recipients"][0]["id"]) == user_id:
+                return channel
+        channel_id = self.snowflake()
+        channel = {"id": str(channel_id), "type": 1, "last_message_id": None,
+                   "recipients": [self.users.get(user_id) or self.add_user(user_id, f"membre{user_id % 100000}")]}
+        self.dm_channels[channel_id] = channel
+        return channel
+
+    def put_commands(self, application_id, body, params):
+        return [dict(cmd, id=str(self.snowflake()), application_id=application_id, version="1")
+                for cmd in (body if isinstance(body, list) else [])]
+
+    def get_channel(self, channel_id, body, params):
+        return self._channel(channel_id)
+
+    def edit_channel(self, channel_id, body, params):
+        channel = self._channel(channel_id)
+        meta = channel.get("thread_metadata")
+        if "name" in body:
+            channel["name"] = body["name"]
+        if meta is not None:
+            if "locked" in body:
+                meta["locked"] = bool(body["locked"])
+            if "auto_archive_duration" in body:
+                meta["auto_archive_duration"] = int(body["auto_archive_duration"])
+            if "archived" in body:
+                meta["archived"] = bool(body["archived"])
+                meta["archive_timestamp"] = self.iso_now()
+                if not meta["archived"]:
+                    self.thread_activity[int(channel_id)] = self.clock.time()
+            self.dispatch("THREAD_UPDATE", channel)
+        return channel
+
+    def create_thread(self, channel_id, body, params):
+        parent = self._channel(channel_id)
+        thread_id = self.snowflake()
+        thread = {
+            "id": str(thread_id), "type": 11, "guild_id": str(GUILD_ID), "parent_id": parent["id"],
+            "owner_id": str(BOT_USER_ID), "name": body["name"], "last_message_id": None,
+            "rate_limit_per_user": 0, "message_count": 0, "member_count": 1, "flags": 0,
+            "thread_metadata": {"archived": False, "auto_archive_duration": int(body.get("auto_archive_duration", 1440)),
+                                "archive_timestamp": self.iso_now(), "locked": False,
+                                "create_timestamp": self.iso_now()},
+        }
+        self.channels[thread_id] = thread
+        self.thread_activity[thread_id] = self.clock.time()
+        self.dispatch("THREAD_CREATE", dict(thread, newly_created=True))
+        return thread
+
+    def archived_threads(self, channel_id, body, params):
+        before = params.get("before")
+        limit = int(params.get("limit", 50))
+        archived = sorted(
+            (c for c in self.channels.values()
+             if c.get("parent_id") == str(channel_id) and c["thread_metadata"]["archived"]
+             and (before is None or c["thread_metadata"]["archive_timestamp"] < before)),
+            key=lambda c: c["thread_metadata"]["archive_timestamp"], reverse=True)
+        return {"threads": archived[:limit], "members": [], "has_more": len(archived) > limit}
+
+    def joined_private_threads(self, channel_id, body, params):
+        # Every thread here is public.
+        return {"threads": [], "members": [], "has_more": False}
+
+    def active_threads(self, guild_id, body, params):
+        active = [c for c in self.channels.values()
+                  if c.get("thread_metadata") is not None and not c["thread_metadata"]["archived"]]
+        return {"threads": active, "members": []}
+
+    def logs_from(self, channel_id, body, params):
+        messages = self.messages[int(self._channel(channel_id)["id"])]
+        limit = int(params.get("limit", 50))
+        ids = sorted(messages)
+        if "after" in params:
+            after = int(params["after"])
+            page = [i for i in ids if i > after][:limit]
+        elif "before" in params:
+            before = int(params["before"])
+            page = [i for i in ids if i < before][-limit:]
+        else:
+            page = ids[-limit:]
+        return [self.with_reactions(messages[i]) for i in reversed(page)]
+
+    def create_message(self, channel_id, body, params):
+        channel = self._channel(channel_id)
+        meta = channel.get("thread_metadata")
+        if meta and meta["archived"]:
+            if meta["locked"]:
+                raise APIError(400, 50083, "Thread is archived")
+            self._set_archived(channel, False)
+        attachments = [self.attachment(int(channel_id), name, content=content)
+                       for name, content in body.get("_files", [])]
+        by_name = {a["filename"]: a["url"] for a in attachments}
+        embeds = body.get("embeds") or []
+        for embed in embeds:
+            image = embed.get("image") or {}
+            if image.get("url", "").startswith("attachment://"):
+                image["url"] = by_name.get(image["url"][len("attachment://"):], image["url"])
+        message = self.message_payload(int(channel_id), self.bot_user, body.get("content") or "",
+                                       embeds=embeds, attachments=attachments)
+        if body.get("components"):
+            message["components"] = body["components"]
+        self._store_message(message, dispatch=channel.get("type") != 1)
+        return message
+
+    def get_message(self, channel_id, message_id, body, params):
+        return self.with_reactions(self._message(channel_id, message_id))
+
+    def delete_message(self, channel_id, message_id, body, params):
+        self._message(channel_id, message_id)
+        self._remove(int(channel_id), int(message_id))
+        self.dispatch("MESSAGE_DELETE", {"id": str(message_id), "channel_id": str(channel_id),
+                                         "guild_id": str(GUILD_ID)})
+
+    def bulk_delete(self, channel_id, body, params):
+        ids = [int(i) for i in body.get("messages", [])]
+        if not 2 <= len(ids) <= 100:
+            raise APIError(400, 50016, "You must provide between 2 and 100 messages")
+        cutoff = self.clock.time() - 14 * 24 * 3600
+        if any(self.created_at.get(i, 0) < cutoff for i in ids):
+            raise APIError(400, 50034, "You can only bulk delete messages that are under 14 days old.")
+        for message_id in ids:
+            self._remove(int(channel_id), message_id)
+        self.dispatch("MESSAGE_DELETE_BULK", {"ids": [str(i) for i in ids], "channel_id": str(channel_id),
+                                              "guild_id": str(GUILD_ID)})
+
+    def _remove(self, channel_id: int, message_id: int):
+        if self.messages[channel_id].pop(message_id, None) is not None:
+            self.deleted_at[message_id] = self.clock.time()
+        self.reactions.pop(message_id, None)
+
+    def add_own_reaction(self, channel_id, message_id, emoji, body, params):
+        self._message(channel_id, message_id)
+        emoji = unquote(emoji)
+        if emoji in self.unknown_emojis:
+            raise APIError(400, 10014, "Unknown Emoji")
+        self.user_react(BOT_USER_ID, int(message_id), emoji, True)
+
+    def remove_own_reaction(self, channel_id, message_id, emoji, body, params):
+        self._message(channel_id, message_id)
+        self.user_react(BOT_USER_ID, int(message_id), unquote(emoji), False)
+
+    def interaction_callback(self, interaction_id, token, body, params):
+        self.interaction_replies.append((body.get("data") or {}).get("content") or "")
+        return {"interaction": {"id": interaction_id, "type": 3,
+                                "response_message_ephemeral": bool((body.get("data") or {}).get("flags", 0) & 64)}}
+
+    def reaction_users(self, channel_id, message_id, emoji, body, params):
+        self._message(channel_id, message_id)
+        users = sorted(self.reactions.get(int(message_id), {}).get(unquote(emoji), []))
+        after = int(params.get("after", 0))
+        limit = int(params.get("limit", 25))
+        return [self.users[u] for u in users if u > after][:limit]
+
+
+# === Load scripts ===
+class PhaseProbe:
+    # Wraps the scheduler's handlers to time each phase in virtual and real
+    # time and attribute API calls and 429s to it.
+
+    def __init__(self, clock: VirtualClock, fake: FakeDiscord):
+        self.clock = clock
+        self.fake = fake
+        self.records = []
+        self.after = {}
+
+    def wrap(self, kind: str, handler):
+        async def probed(**payload):
+            calls_before = Counter(self.fake.calls)
+            limited_before = sum(self.fake.rate_limited.values())
+            started_virtual = self.clock.time()
+            started_real = time.perf_counter()
+            error = None
+            try:
+                await handler(**payload)
+            except Exception as e:
+                error = repr(e)
+                raise
+            finally:
+                calls = Counter(self.fake.calls)
+                calls.subtract(calls_before)
+                self.records.append({
+                    "phase": kind,
+                    "at": datetime.fromtimestamp(started_virtual, timezone.utc).isoformat(),
+                    "virtual_sec": self.clock.time() - started_virtual,
+                    "real_sec": time.perf_counter() - started_real,
+                    "api_calls": sum(calls.values()),
+                    "api_calls_by_route": {k: v for k, v in calls.items() if v},
+                    "rate_limited": sum(self.fake.rate_limited.values()) - limited_before,
+                    "error": error,
+                })
+                hook = self.after.get(kind)
+                if hook is not None and error is None:
+                    hook()
+        return probed
+
+
+# Files the submission checks should turn away, as user_post() arguments.
+BAD_FILES = {
+    "pdf": lambda seed: {"image": b"%PDF-1.7\n" + bytes(2048), "content_type": "application/pdf",
+                         "filename": "reglement.pdf"},
+    "raw_too_big": lambda seed: {"content_type": "image/jpeg", "size": 40 * 1024 * 1024},
+    "thumbnail": lambda seed: {"image": FakeDiscord.image_bytes(seed, 160, 120)},
+    "corrupt": lambda seed: {"image": b"\xff\xd8\xff\xe0\x00\x10JFIF" + bytes(64)},
+}
+
+
+class LoadScript:
+    def __init__(self, main, fake: FakeDiscord, clock: VirtualClock, rng: random.Random, posters: int,
+                 voters: int, votes_per_voter: int, rule_breakers: float):
+        self.main = main
+        self.fake = fake
+        self.clock = clock
+        self.rng = rng
+        self.posters = posters
+        self.voters = voters
+        self.votes_per_voter = votes_per_voter
+        self.rule_breakers = rule_breakers
+        self.contest = next(iter(main.registry))
+        self.rule_breaking_posts = []
+        self.posts = 0
+        self.reactions = 0
+        self.rankings = 0
+        self._week = 0
+
+    def _at(self, epoch: float, callback, *args):
+        self.fake.loop.call_at(self.clock.loop_time_at(epoch), callback, *args)
+
+    def _next_due(self, kind: str) -> float:
+        job = self.main.job_scheduler.get(f"{self.contest.id}:weekly:{kind}")
+        return job["due"] if job else self.clock.time() + 3600
+
+    def after_share(self):
+        # Photos arrive between the call and the vote opening.
+        self._week += 1
+        start = self.clock.time() + 60
+        end = max(start + 60, self._next_due("open") - 60)
+        base = 10**15 + self._week * 10**7
+        for i in range(self.posters):
+            user_id = base + i
+            when = self.rng.uniform(start, end)
+            if self.rng.random() < self.rule_breakers:
+                winners = [w["image_url"].split("?", 1)[0] for w in self.contest.monthly.data.get("weekly", [])
+                           if w.get("image_url", "").split("?", 1)[0] in self.fake.blobs]
+                violation = self.rng.choice(("text", "two_photos", "second_photo") + tuple(BAD_FILES)
+                                            + (("repost",) if winners else ()))
+                if violation == "repost":
+                    image = self.fake.blobs[self.rng.choice(winners)]
+                    self._at(when, self._post, user_id, "", 1, True, {"image": image})
+                    continue
+                if violation in BAD_FILES:
+                    self._at(when, self._post, user_id, "", 1, True, BAD_FILES[violation](user_id))
+                    continue
+                if violation == "text":
+                    self._at(when, self._post, user_id, "Super concours !", 0, True)
+                    continue
+                if violation == "two_photos":
+                    self._at(when, self._post, user_id, "", 2, True)
+                    continue
+                self._at(min(end, when + 3600), self._post, user_id, "", 1, True)
+            self._at(when, self._post, user_id, "", 1, False)
+
+    def _post(self, user_id: int, content: str, photos: int, breaks_rules: bool, file: dict = None):
+        message_id = self.fake.user_post(user_id, self.contest.photo_channel_id, content, photos, **(file or {}))
+        self.posts += 1
+        if breaks_rules:
+            self.rule_breaking_posts.append(message_id)
+
+    def _vote_on(self, thread_id: int, emoji: str, end: float):
+        entries = [m for m, msg in self.fake.messages[thread_id].items() if msg.get("embeds")]
+        if not entries:
+            return
+        # A few entries draw most of the votes.
+        weights = [1.0 / (rank + 1) for rank in range(len(entries))]
+        self.rng.shuffle(entries)
+        start = self.clock.time() + 30
+        base = 2 * 10**15 + self._week * 10**7
+        ranked = self.contest.ballots.has_thread(thread_id)
+        for v in range(self.voters):
+            user_id = base + v
+            picks = list(dict.fromkeys(self.rng.choices(entries, weights, k=min(self.votes_per_voter, len(entries)))))
+            if ranked:
+                # A ballot instead: one menu choice per photo, in order of preference.
+                for rank, message_id in enumerate(picks[:self.main.RANKED_BALLOT_SIZE]):
+                    self._at(self.rng.uniform(start, end), self._rank, user_id, message_id, str(rank))
+                continue
+            for message_id in picks:
+                when = self.rng.uniform(start, end)
+                self._at(when, self._react, user_id, message_id, emoji, True)
+                if self.rng.random() < 0.05:
+                    self._at(min(end, when + 600), self._react, user_id, message_id, emoji, False)
+
+    def _rank(self, user_id: int, message_id: int, value: str):
+        self.fake.user_select(user_id, message_id, value)
+        self.rankings += 1
+
+    def _react(self, user_id: int, message_id: int, emoji: str, add: bool):
+        self.fake.user_react(user_id, message_id, emoji, add)
+        self.reactions += 1
+
+    def after_open(self):
+        active = self.contest.weekly.get_active()
+        if active:
+            self._vote_on(int(active["thread_id"]), self.contest.vote_emoji, self._next_due("result") - 60)
+
+    def after_result(self):
+        active = self.contest.monthly.get_active()
+        if active and not active.get("closed"):
+            job = self.main.job_scheduler.get(f"{self.contest.id}:monthly:close")
+            end = job["due"] - 60 if job else self.clock.time() + 3600
+            self._vote_on(int(active["thread_id"]), self.contest.monthly_vote_emoji, end)
+
+
+CLOSE_PHASES = ("result", "monthly_close")
+
+
+def rss_bytes() -> int:
+    # Current resident set size; peak RSS where /proc is unavailable.
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+class MemoryProbe:
+    # tracemalloc heap and process RSS around each phase: "steady" is what the
+    # bot holds between phases (after a collection), "peak" the heap
+    # high-water mark while the phase runs. Totals include the fake Discord
+    # (this module); the allocation sites listed leave it out.
+
+    def __init__(self, top: int = 10):
+        self.top = top
+        self.records = []
+        self.steady_top = []
+
+    def wrap(self, kind: str, handler):
+        async def measured(**payload):
+            gc.collect()
+            steady_heap, _ = tracemalloc.get_traced_memory()
+            steady_rss = rss_bytes()
+            if kind in CLOSE_PHASES:
+                snapshot = tracemalloc.take_snapshot().filter_traces((
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, __file__),
+                    tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+                ))
+                self.steady_top = [
+                    {"where": str(stat.traceback), "bytes": stat.size, "count": stat.count}
+                    for stat in snapshot.statistics("lineno")[:self.top]
+                ]
+            tracemalloc.reset_peak()
+            try:
+                await handler(**payload)
+            finally:
+                _, peak_heap = tracemalloc.get_traced_memory()
+                self.records.append({
+                    "phase": kind,
+                    "steady_heap": steady_heap,
+                    "steady_rss": steady_rss,
+                    "peak_heap": peak_heap,
+                    "rss_after": rss_bytes(),
+                })
+        return measured
+
+    def report(self) -> dict:
+        closes = [r for r in self.records if r["phase"] in CLOSE_PHASES] or self.records
+        mb = 1024 * 1024
+        return {
+            "steady_heap_mb": max((r["steady_heap"] for r in self.records), default=0) / mb,
+            "steady_rss_mb": max((r["steady_rss"] for r in self.records), default=0) / mb,
+            "close_peak_heap_mb": max((r["peak_heap"] for r in closes), default=0) / mb,
+            "close_rss_mb": max((r["rss_after"] for r in closes), default=0) / mb,
+            "closes": len([r for r in self.records if r["phase"] in CLOSE_PHASES]),
+            "steady_top": self.steady_top,
+        }
+
+
+def exif_report(contest, query: str = "50mm, f/1.8, 2025", runs: int = 100) -> dict:
+    import exif
+    terms, winners_only = exif.parse_query(query)
+    started = time.perf_counter()
+    for _ in range(runs):
+        matches, _ = contest.exif.search(terms, winners_only)
+    return {"photos": len(contest.exif), "query": query, "matches": matches,
+            "search_ms": (time.perf_counter() - started) / runs * 1000}
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+# === Runner ===
+async def simulate(args) -> dict:
+    loop = asyncio.get_running_loop()
+    start_epoch = datetime.fromisoformat(args.start).timestamp()
+    clock = VirtualClock(loop, start_epoch)
+
+    import main
+    import stores
+    import diagnostics
+    import jobs
+    import moderation as moderation_module
+    import discord
+    from outbound import OutboundScheduler
+    from moderation import ModerationQueue
+
+    # Everything that reads the wall clock follows the virtual one.
+    vdt = virtual_datetime(clock)
+    for module in (main, stores, jobs, moderation_module):
+        module.datetime = vdt
+    discord.utils.utcnow = lambda: datetime.fromtimestamp(clock.time(), timezone.utc)
+    main.job_scheduler.wall_clock = clock.time
+    # Virtual time only moves while the loop is idle, so lag always reads 0;
+    # sampling it every second would just spin the loop for weeks.
+    monitor = main.monitor_event_loop
+    main.monitor_event_loop = lambda lag, tasks: monitor(lag, tasks, interval=300)
+    main.outbound = OutboundScheduler(max_concurrency=main.OUTBOUND_CONCURRENCY, clock=loop.time)
+    main.moderation = ModerationQueue(main.outbound, batch_window=main.MODERATION_BATCH_SEC,
+                                      dm_coalesce_sec=main.MODERATION_DM_COALESCE_SEC,
+                                      max_pending=main.MODERATION_MAX_PENDING, clock=loop.time)
+
+    fake = FakeDiscord(loop, clock, latency=args.latency,
+                       unknown_emojis=[main.VOTE_EMOJI] if args.unknown_emoji else [])
+    main.attachment_validator.session = FakeSession(fake)
+    # Pipe reads do not hold virtual time back the way executor jobs do: a
+    # worker process would see every job time out. Same jobs, in a thread.
+    main.job_worker.enabled = False
+    probe = PhaseProbe(clock, fake)
+    load = LoadScript(main, fake, clock, random.Random(args.seed), args.posters, args.voters,
+                      args.votes_per_voter, args.rule_breakers)
+    probe.after = {"share": load.after_share, "open": load.after_open, "result": load.after_result}
+    memory = MemoryProbe() if tracemalloc.is_tracing() else None
+    for kind, handler in list(main.job_scheduler.handlers.items()):
+        if memory is not None:
+            handler = memory.wrap(kind, handler)
+        main.job_scheduler.handlers[kind] = probe.wrap(kind, handler)
+
+    # Real bot, fake transport: discord.py's own HTTPClient and
+    # ConnectionState handle every request and gateway event.
+    bot = main.bot
+    await bot._async_setup_hook()
+    bot.http._HTTPClient__session = FakeSession(fake)
+    bot.http.token = "simulation"
+    bot.http._global_over = asyncio.Event()
+    bot.http._global_over.set()
+    state = bot._connection
+    fake.state = state
+    state.user = discord.ClientUser(state=state, data=fake.bot_user)
+    state.application_id = BOT_USER_ID
+    await bot.setup_hook()
+    state._add_guild_from_data(fake.guild_payload())
+
+    message_latencies = []
+    handle_message = bot.on_message
+
+    async def timed_on_message(message):
+        started = time.perf_counter()
+        try:
+            await handle_message(message)
+        finally:
+            message_latencies.append(time.perf_counter() - started)
+    bot.on_message = timed_on_message
+
+    async def archiver():
+        while True:
+            await asyncio.sleep(60)
+            fake.sweep_archived_threads()
+
+    archive_task = loop.create_task(archiver())
+    real_started = time.perf_counter()
+    bot._ready.set()
+    bot.dispatch("ready")
+
+    end_epoch = start_epoch + args.weeks * 7 * 24 * 3600 + 6 * 3600
+    while clock.time() < end_epoch:
+        await asyncio.sleep(min(3600, end_epoch - clock.time()))
+        if args.verbose:
+            print(f"[sim] {clock.now().isoformat()} posts={load.posts} reactions={load.reactions}")
+
+    archive_task.cancel()
+    await main.supervisor.stop_all()
+
+    # Exported twice: the second run should only list threads.
+    exports = []
+    if args.export:
+        import export
+        channel = bot.get_channel(PHOTO_CHANNEL_ID)
+        out = main.EXPORT_DIR / "simulation" / ("parquet" if args.export == "parquet" else "votes.jsonl")
+        for _ in range(2):
+            exporter = export.ThreadExporter(
+                export.open_writer(args.export, out), export.ExportCursors(export.cursors_path(out)),
+                contest_id=load.contest.id,
+                vote_emojis={"weekly": load.contest.vote_emoji, "monthly": load.contest.monthly_vote_emoji},
+            )
+            calls_before = sum(fake.calls.values())
+            stats = await exporter.export_channel(channel)
+            exports.append(dict(stats, api_calls=sum(fake.calls.values()) - calls_before))
+    for contest in main.registry:
+        await contest.flush()
+
+    moderation_delays = [fake.deleted_at[m] - fake.created_at[m] for m in load.rule_breaking_posts
+                         if m in fake.deleted_at]
+    phases = defaultdict(list)
+    for record in probe.records:
+        phases[record["phase"]].append(record)
+    summary = {
+        kind: {
+            "runs": len(records),
+            "virtual_sec_mean": statistics.mean(r["virtual_sec"] for r in records),
+            "virtual_sec_max": max(r["virtual_sec"] for r in records),
+            "real_sec_mean": statistics.mean(r["real_sec"] for r in records),
+            "api_calls_mean": statistics.mean(r["api_calls"] for r in records),
+            "rate_limited": sum(r["rate_limited"] for r in records),
+            "errors": [r["error"] for r in records if r["error"]],
+        }
+        for kind, records in phases.items()
+    }
+    contest = load.contest
+    return {
+        "profile": args.profile,
+        "weeks": args.weeks,
+        "posters": args.posters,
+        "voters": args.voters,
+        "simulated_span": str(timedelta(seconds=int(clock.time() - start_epoch))),
+        "real_sec": time.perf_counter() - real_started,
+        "posts": load.posts,
+        "reactions": load.reactions,
+        "rankings": load.rankings,
+        "interaction_replies": len(fake.interaction_replies),
+        "on_message": {
+            "count": len(message_latencies),
+            "p50_ms": percentile(message_latencies, 0.5) * 1000,
+            "p99_ms": percentile(message_latencies, 0.99) * 1000,
+            "max_ms": max(message_latencies, default=0) * 1000,
+        },
+        "moderation_delay_sec": {
+            "count": len(moderation_delays),
+            "p50": percentile(moderation_delays, 0.5),
+            "max": max(moderation_delays, default=0),
+        },
+        "api_calls": dict(fake.calls.most_common()),
+        "rate_limited": dict(fake.rate_limited),
+        "api_errors": dict(fake.errors),
+        "outbound": main.outbound.stats(),
+        "moderation": dict(main.moderation.stats),
+        "attachment_checks": dict(main.attachment_validator.stats),
+        "image_cache": dict(main.blob_cache.stats, bytes=main.blob_cache.total_bytes, entries=len(main.blob_cache)),
+        "exif_index": exif_report(contest),
+        "result_dms": {
+            "sent": sum(1 for channel_id in fake.dm_channels for m in fake.messages[channel_id].values()
+                        if "Résultats" in m["content"]),
+            "recipients": len(fake.dm_channels),
+            "fanouts_pending": len(contest.notices.pending()),
+        },
+        "phases": summary,
+        "phase_runs": probe.records,
+        "weekly_winners": len(contest.winners.all()),
+        "monthly_winners": len(contest.winners.monthly_all()),
+        "week_no": contest.monthly.data.get("week_no"),
+        "lean": main.LEAN,
+        "exports": exports,
+        "discord_caches": diagnostics.cache_sizes(bot),
+        "memory": memory.report() if memory is not None else None,
+    }
+
+
+def print_report(report: dict):
+    print(f"Simulated {report['simulated_span']} in {report['real_sec']:.1f}s "
+          f"({report['posts']} posts, {report['reactions']} reactions, {report['rankings']} ranking choices, "
+          f"{report['interaction_replies']} interaction replies)")
+    print(f"on_message: {report['on_message']['count']} handled, p50 {report['on_message']['p50_ms']:.2f} ms, "
+          f"p99 {report['on_message']['p99_ms']:.2f} ms")
+    md = report["moderation_delay_sec"]
+    print(f"moderation: {md['count']} rule-breaking posts removed, p50 {md['p50']:.1f}s, max {md['max']:.1f}s")
+    print()
+    print(f"{'phase':15} {'runs':>4} {'sim s (mean)':>13} {'sim s (max)':>12} {'real s':>8} {'API calls':>10} {'429s':>5}")
+    for kind, s in report["phases"].items():
+        print(f"{kind:15} {s['runs']:>4} {s['virtual_sec_mean']:>13.1f} {s['virtual_sec_max']:>12.1f} "
+              f"{s['real_sec_mean']:>8.3f} {s['api_calls_mean']:>10.0f} {s['rate_limited']:>5}")
+        for error in s["errors"]:
+            print(f"    error: {error}")
+    print()
+    print("API calls:")
+    for route, count in report["api_calls"].items():
+        limited = report["rate_limited"].get(route, 0)
+        print(f"  {count:>7}  {route}" + (f"  ({limited} × 429)" if limited else ""))
+    if report["api_errors"]:
+        print("API errors:", report["api_errors"])
+    print(f"\nattachment checks: {report['attachment_checks']}")
+    print(f"image cache: {report['image_cache']}")
+    print(f"EXIF index: {report['exif_index']}")
+    print(f"result DMs: {report['result_dms']}")
+    print(f"weeks closed: {report['week_no']}, weekly winners: {report['weekly_winners']}, "
+          f"monthly winners: {report['monthly_winners']}")
+    print(f"discord.py caches{' (lean)' if report['lean'] else ''}: "
+          + ", ".join(f"{k}={v}" for k, v in report["discord_caches"].items()))
+    for i, stats in enumerate(report["exports"], 1):
+        print(f"export run {i}: " + ", ".join(f"{k}={v}" for k, v in stats.items()))
+    mem = report["memory"]
+    if mem:
+        print(f"\nmemory: steady heap {mem['steady_heap_mb']:.1f} MB, steady RSS {mem['steady_rss_mb']:.1f} MB; "
+              f"during {mem['closes']} close(s): heap peak {mem['close_peak_heap_mb']:.1f} MB, "
+              f"RSS after {mem['close_rss_mb']:.1f} MB")
+        for stat in mem["steady_top"][:5]:
+            print(f"  {stat['bytes'] / 1024:>9.1f} KiB  {stat['count']:>7}  {stat['where']}")
+
+
+def main_cli(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="club")
+    parser.add_argument("--weeks", type=int)
+    parser.add_argument("--posters", type=int)
+    parser.add_argument("--voters", type=int)
+    parser.add_argument("--votes-per-voter", type=int)
+    parser.add_argument("--rule-breakers", type=float, help="share of posters who break a channel rule")
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated API round trip in seconds")
+    parser.add_argument("--unknown-emoji", action="store_true",
+                        help="make the vote emoji unknown so the ✅ fallback is exercised")
+    parser.add_argument("--start", default="2025-01-05T12:00:00+01:00", help="simulated start time (ISO 8601)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--data-dir", help="keep the bot's data here instead of a temporary directory")
+    parser.add_argument("--json", help="write the full report to this file")
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--export", choices=("jsonl", "parquet"), help="export the vote threads at the end, twice")
+    parser.add_argument("--lean", action="store_true", help="run the bot with LEAN=1 (low-memory profile)")
+    parser.add_argument("--ranked", action="store_true", help="vote with ranked ballots (RANKED_VOTES=1)")
+    parser.add_argument("--notify", action="store_true",
+                        help="DM participants their results after each close (NOTIFY_PARTICIPANTS=1)")
+    parser.add_argument("--memory", action="store_true",
+                        help="trace allocations and report steady-state and close-time memory")
+    parser.add_argument("--rss-budget-mb", type=float, help="fail when RSS exceeds this (implies --memory)")
+    parser.add_argument("--heap-budget-mb", type=float,
+                        help="fail when the traced heap peaks above this during a close (implies --memory)")
+    args = parser.parse_args(argv)
+    for key, value in PROFILES[args.profile].items():
+        if getattr(args, key) is None:
+            setattr(args, key, value)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir or tmp
+        # main.py reads its settings at import time.
+        os.environ.update({
+            "DISCORD_TOKEN": "simulation",
+            "PHOTO_CHANNEL_ID": str(PHOTO_CHANNEL_ID),
+            "PHOTO_RESULT_CHANNEL_ID": str(RESULT_CHANNEL_ID),
+            "REPORTER_ROLE_ID": str(ROLE_IDS[0]),
+            "REPORTER_BORDEAUX_ROLE_ID": str(ROLE_IDS[1]),
+            "GUILD_ID": str(GUILD_ID),
+            "DATA_DIR": data_dir,
+            "CONTESTS_FILE": os.path.join(data_dir, "contests.json"),
+            "TEST_MODE": "0",
+            "METRICS_PORT": "0",
+            "LEAN": "1" if args.lean else os.environ.get("LEAN", "0"),
+            "RANKED_VOTES": "1" if args.ranked else os.environ.get("RANKED_VOTES", "0"),
+            "NOTIFY_PARTICIPANTS": "1" if args.notify else os.environ.get("NOTIFY_PARTICIPANTS", "0"),
+        })
+        if args.memory or args.rss_budget_mb or args.heap_budget_mb:
+            # Started before main is imported so its module-level state counts.
+            tracemalloc.start()
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        loop = VirtualClockLoop()
+        asyncio.set_event_loop(loop)
+        try:
+            report = loop.run_until_complete(simulate(args))
+        finally:
+            for task in asyncio.all_tasks(loop):
+                task.cancel()
+            loop.run_until_complete(asyncio.sleep(0))
+            loop.close()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+    failed = any(s["errors"] for s in report["phases"].values())
+    mem = report["memory"]
+    if mem and args.rss_budget_mb and max(mem["steady_rss_mb"], mem["close_rss_mb"]) > args.rss_budget_mb:
+        print(f"RSS over budget ({args.rss_budget_mb:g} MB)")
+        failed = True
+    if mem and args.heap_budget_mb and mem["close_peak_heap_mb"] > args.heap_budget_mb:
+        print(f"heap peak during a close over budget ({args.heap_budget_mb:g} MB)")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,203 @@
+import os
+import json
+import atexit
+import asyncio
+import weakref
+from pathlib import Path
+from datetime import datetime
+
+SEQ_KEY = "_journal_seq"
+
+_open_stores = weakref.WeakSet()
+
+
+class JournaledStore:
+    # JSON snapshot + append-only journal. Mutations are applied in memory and
+    # journaled; the file work happens in batches, off the event loop.
+    #
+    # Subclasses implement snapshot() / restore(data) / apply(op) and mutate
+    # only through self.commit(op), so replaying the journal and live updates
+    # share the same code path.
+
+    def __init__(self, path: Path, write_delay: float = 0.5, compact_every: int = 500):
+        self.path = path
+        self.journal_path = path.with_name(path.name + ".journal")
+        self.write_delay = write_delay
+        self.compact_every = compact_every
+        self.last_error = None
+        self._seq = 0
+        self._journal_len = 0
+        self._pending = []
+        self._flush_task = None
+        self._lock = None
+        _open_stores.add(self)
+
+    # --- subclass hooks ---
+    def snapshot(self) -> dict:
+        raise NotImplementedError
+
+    def restore(self, data: dict):
+        raise NotImplementedError
+
+    def apply(self, op: dict):
+        raise NotImplementedError
+
+    def memory_parts(self) -> dict:
+        # The live containers, by name, for /diagnostic: measured in place,
+        # not through snapshot(), which would build a copy on the event loop.
+        raise NotImplementedError
+
+    # --- loading ---
+    def load(self):
+        data = None
+        if self.path.exists():
+            try:
+                with self.path.open("r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except Exception as e:
+                self._report("snapshot unreadable, moved aside", e)
+                self._move_aside(self.path)
+                data = None
+        data = dict(data or {})
+        self._seq = int(data.pop(SEQ_KEY, 0))
+        self.restore(data)
+
+        if self.journal_path.exists():
+            try:
+                with self.journal_path.open("r", encoding="utf-8") as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            op = json.loads(line)
+                        except ValueError:
+                            # Torn last line from a crash mid-append.
+                            break
+                        self._journal_len += 1
+                        if int(op.get("seq", 0)) <= self._seq:
+                            continue
+                        self.apply(op)
+                        self._seq = int(op["seq"])
+            except Exception as e:
+                self._report("journal replay failed", e)
+
+        if not self.path.exists():
+            self.flush_sync(compact=True)
+
+    def _move_aside(self, path: Path):
+        try:
+            path.replace(path.with_name(f"{path.name}.corrupt-{datetime.now().strftime('%Y%m%d%H%M%S')}"))
+        except Exception:
+            pass
+
+    def _report(self, what: str, error: Exception):
+        self.last_error = f"{what}: {error}"
+        print(f"{type(self).__name__} ({self.path.name}): {what}: {error}")
+
+    # --- mutations ---
+    def commit(self, op: dict):
+        self._seq += 1
+        op["seq"] = self._seq
+        self.apply(op)
+        self._pending.append(json.dumps(op, ensure_ascii=False, separators=(",", ":")))
+        self._schedule()
+
+    def _schedule(self):
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush_sync()
+            return
+        self._flush_task = loop.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.write_delay)
+        await self._write_batch(compact=False)
+
+    # --- writing ---
+    def _take_batch(self, compact: bool):
+        lines = self._pending
+        self._pending = []
+        if compact or self._journal_len + len(lines) >= self.compact_every:
+            data = dict(self.snapshot())
+            data[SEQ_KEY] = self._seq
+            return lines, json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        return lines, None
+
+    def _write(self, lines, snapshot_text):
+        if lines:
+            with self.journal_path.open("a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        if snapshot_text is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with tmp.open("w", encoding="utf-8") as f:
+                f.write(snapshot_text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            # Ops up to the snapshot seq are skipped on replay, so a crash
+            # before this truncate is harmless.
+            with self.journal_path.open("w", encoding="utf-8"):
+                pass
+
+    def _written(self, lines, snapshot_text):
+        self._journal_len = 0 if snapshot_text is not None else self._journal_len + len(lines)
+        self.last_error = None
+
+    def _requeue(self, lines):
+        self._pending = lines + self._pending
+
+    async def _write_batch(self, compact: bool) -> bool:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self._pending and not compact:
+                return True
+            lines, snapshot_text = self._take_batch(compact)
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._write, lines, snapshot_text)
+            except Exception as e:
+                self._requeue(lines)
+                self._report("write failed, will retry", e)
+                return False
+            self._written(lines, snapshot_text)
+            return True
+
+    async def flush(self) -> bool:
+        # Call at the end of a contest phase: drains pending ops to the
+        # journal (fsynced). Compaction still waits for compact_every ops.
+        return await self._write_batch(compact=False)
+
+    def flush_sync(self, compact: bool = False) -> bool:
+        lines, snapshot_text = self._take_batch(compact)
+        try:
+            self._write(lines, snapshot_text)
+        except Exception as e:
+            self._requeue(lines)
+            self._report("write failed", e)
+            return False
+        self._written(lines, snapshot_text)
+        return True
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+
+async def flush_all() -> bool:
+    ok = True
+    for store in list(_open_stores):
+        ok = await store.flush() and ok
+    return ok
+
+
+@atexit.register
+def _flush_at_exit():
+    for store in list(_open_stores):
+        if store._pending:
+            store.flush_sync()
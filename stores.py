@@ -0,0 +1,889 @@
+import heapq
+from collections import Counter
+from pathlib import Path
+from datetime import datetime
+
+from storage import JournaledStore
+from contest_logic import FALLBACK_VOTE_EMOJI, votes_from_counts
+from phash import HammingIndex
+from exif import search_terms
+
+
+# Records held by the stores: one per vote-thread entry or weekly submission,
+# so __slots__ instead of a dict each. They become dicts again only in
+# snapshots and in what the stores return.
+class TallyEntry:
+    __slots__ = ("kind", "author_id", "author_mention", "image_url", "counts")
+
+    def __init__(self, kind: str, author_id: int, author_mention: str, image_url: str, counts: dict):
+        self.kind = kind
+        self.author_id = author_id
+        self.author_mention = author_mention
+        self.image_url = image_url
+        self.counts = counts
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        return cls(d["kind"], int(d["author_id"]), d["author_mention"], d["image_url"], dict(d.get("counts") or {}))
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": self.kind,
+            "author_id": self.author_id,
+            "author_mention": self.author_mention,
+            "image_url": self.image_url,
+            "counts": dict(self.counts)
+        }
+
+
+class Submission:
+    __slots__ = ("message_id", "attachment_url", "created_at")
+
+    def __init__(self, message_id: int, attachment_url: str, created_at: str):
+        self.message_id = message_id
+        self.attachment_url = attachment_url
+        self.created_at = created_at
+
+    def to_dict(self) -> dict:
+        return {"message_id": self.message_id, "attachment_url": self.attachment_url, "created_at": self.created_at}
+
+
+# Simple JSON-backed winners store
+class WinnersStore(JournaledStore):
+    def __init__(self, path: Path, **options):
+        super().__init__(path, **options)
+        self._winners = set()
+        self._monthly_winners = set()
+        self.load()
+
+    def memory_parts(self):
+        return {"winners": self._winners, "monthly_winners": self._monthly_winners}
+
+    def snapshot(self):
+        return {
+            "winners": sorted(self._winners),
+            "monthly_winners": sorted(self._monthly_winners)
+        }
+
+    def restore(self, data):
+        self._winners = set(int(x) for x in data.get("winners", []))
+        self._monthly_winners = set(int(x) for x in data.get("monthly_winners", []))
+
+    def apply(self, op):
+        target = self._monthly_winners if op["set"] == "monthly" else self._winners
+        if op["op"] == "add":
+            target.add(int(op["user_id"]))
+        elif op["op"] == "remove":
+            target.discard(int(op["user_id"]))
+
+    def add(self, user_id: int):
+        if user_id not in self._winners:
+            self.commit({"op": "add", "set": "weekly", "user_id": user_id})
+
+    def remove_weekly(self, user_id: int) -> bool:
+        if user_id in self._winners:
+            self.commit({"op": "remove", "set": "weekly", "user_id": user_id})
+            return True
+        return False
+
+    def remove_monthly(self, user_id: int) -> bool:
+        if user_id in self._monthly_winners:
+            self.commit({"op": "remove", "set": "monthly", "user_id": user_id})
+            return True
+        return False
+
+    def contains(self, user_id: int) -> bool:
+        return user_id in self._winners
+
+    def all(self):
+        return sorted(self._winners)
+
+    # Monthly winners methods
+    def add_monthly(self, user_id: int):
+        if user_id not in self._monthly_winners:
+            self.commit({"op": "add", "set": "monthly", "user_id": user_id})
+
+    def monthly_contains(self, user_id: int) -> bool:
+        return user_id in self._monthly_winners
+
+    def monthly_all(self):
+        return sorted(self._monthly_winners)
+
+
+
+# Monthly persistence (weekly winners + monthly contest state)
+class MonthlyStore(JournaledStore):
+    def __init__(self, path: Path, tz, **options):
+        super().__init__(path, **options)
+        self.tz = tz
+        self.data = self._empty()
+        self.load()
+
+    @staticmethod
+    def _empty():
+        return {
+            "weekly": [],
+            "week_no": 0,
+            "last_monthly_week_no": 0,
+            "active": None
+        }
+
+    def memory_parts(self):
+        return {"data": self.data}
+
+    def snapshot(self):
+        return self.data
+
+    def restore(self, data):
+        self.data = self._empty()
+        self.data.update(data)
+
+    def apply(self, op):
+        kind = op["op"]
+        if kind == "begin_new_week":
+            self.data["week_no"] = int(self.data.get("week_no", 0)) + 1
+        elif kind == "add_weekly_winner":
+            self.data["weekly"].append(op["entry"])
+        elif kind == "mark_monthly_consumed":
+            self.data["last_monthly_week_no"] = int(self.data.get("last_monthly_week_no", 0)) + 4
+        elif kind == "set_active":
+            self.data["active"] = op["active"]
+        elif kind == "clear_active":
+            self.data["active"] = None
+        elif kind == "set_active_closed":
+            if self.data.get("active"):
+                self.data["active"]["closed"] = True
+
+    def begin_new_week(self):
+        self.commit({"op": "begin_new_week"})
+
+    def add_weekly_winner(self, author_id: int, author_mention: str, image_url: str, votes: int,
+                          image_sha256: str = None):
+        entry = {
+            "author_id": author_id,
+            "author_mention": author_mention,
+            "image_url": image_url,
+            "votes": int(votes),
+            "week_no": int(self.data.get("week_no", 0)),
+            "created_at": datetime.now(self.tz).isoformat()
+        }
+        if image_sha256:
+            # Key of the local copy in the image cache (blobcache.py).
+            entry["image_sha256"] = image_sha256
+        self.commit({"op": "add_weekly_winner", "entry": entry})
+
+    def months_due(self) -> bool:
+        return (int(self.data.get("week_no", 0)) - int(self.data.get("last_monthly_week_no", 0))) >= 4
+
+    def get_last_4_weeks_entries(self):
+        last_done = int(self.data.get("last_monthly_week_no", 0))
+        target_weeks = {last_done + 1, last_done + 2, last_done + 3, last_done + 4}
+        return [e for e in self.data.get("weekly", []) if int(e.get("week_no", 0)) in target_weeks]
+
+    def mark_monthly_consumed(self):
+        self.commit({"op": "mark_monthly_consumed"})
+
+    def set_active(self, thread_id: int, thread_jump_url: str, opened_at_iso: str, ends_at_iso: str):
+        self.commit({"op": "set_active", "active": {
+            "thread_id": thread_id,
+            "thread_jump_url": thread_jump_url,
+            "opened_at": opened_at_iso,
+            "ends_at": ends_at_iso,
+            "closed": False
+        }})
+
+    def clear_active(self):
+        self.commit({"op": "clear_active"})
+
+    def get_active(self):
+        return self.data.get("active")
+
+    def set_active_closed(self):
+        if self.data.get("active"):
+            self.commit({"op": "set_active_closed"})
+
+    def parse_active_ends_at(self):
+        active = self.get_active()
+        if not active:
+            return None
+        try:
+            return datetime.fromisoformat(active["ends_at"])
+        except Exception:
+            return None
+
+
+
+# Weekly contest state (open vote thread, like MonthlyStore["active"])
+class WeeklyStore(JournaledStore):
+    def __init__(self, path: Path, **options):
+        super().__init__(path, **options)
+        self.data = {"active": None}
+        self.load()
+
+    def memory_parts(self):
+        return {"data": self.data}
+
+    def snapshot(self):
+        return self.data
+
+    def restore(self, data):
+        self.data = {"active": data.get("active")}
+
+    def apply(self, op):
+        kind = op["op"]
+        if kind == "set_active":
+            self.data["active"] = op["active"]
+        elif kind == "add_vote_message":
+            if self.data.get("active"):
+                self.data["active"]["vote_message_ids"].append(op["message_id"])
+        elif kind == "clear_active":
+            self.data["active"] = None
+
+    def set_active(self, thread_id: int, thread_jump_url: str, intro_message_id: int, opened_at_iso: str):
+        self.commit({"op": "set_active", "active": {
+            "thread_id": thread_id,
+            "thread_jump_url": thread_jump_url,
+            "intro_message_id": intro_message_id,
+            "vote_message_ids": [],
+            "opened_at": opened_at_iso
+        }})
+
+    def add_vote_message(self, message_id: int):
+        self.commit({"op": "add_vote_message", "message_id": message_id})
+
+    def get_active(self):
+        return self.data.get("active")
+
+    def clear_active(self):
+        if self.data.get("active"):
+            self.commit({"op": "clear_active"})
+
+
+
+# Live vote tally (kept current by reaction events, checkpointed to disk)
+class VoteTally(JournaledStore):
+    def __init__(self, path: Path, vote_emoji: str, monthly_vote_emoji: str, **options):
+        super().__init__(path, **options)
+        self.vote_emoji = vote_emoji
+        self.monthly_vote_emoji = monthly_vote_emoji
+        self._threads = {}
+        self._by_message = {}
+        self.load()
+
+    def memory_parts(self):
+        return {"threads": self._threads, "by_message": self._by_message}
+
+    def snapshot(self):
+        return {
+            "threads": {
+                str(thread_id): {str(message_id): entry.to_dict() for message_id, entry in messages.items()}
+                for thread_id, messages in self._threads.items()
+            }
+        }
+
+    def restore(self, data):
+        self._threads = {}
+        self._by_message = {}
+        for thread_id, messages in data.get("threads", {}).items():
+            self._threads[int(thread_id)] = {}
+            for message_id, entry in messages.items():
+                self._put(int(thread_id), int(message_id), TallyEntry.from_dict(entry))
+
+    def _put(self, thread_id: int, message_id: int, entry: TallyEntry):
+        self._threads.setdefault(thread_id, {})[message_id] = entry
+        self._by_message[message_id] = entry
+
+    def apply(self, op):
+        kind = op["op"]
+        if kind == "register":
+            self._put(int(op["thread_id"]), int(op["message_id"]), TallyEntry.from_dict(op["entry"]))
+        elif kind == "reaction":
+            entry = self._by_message.get(int(op["message_id"]))
+            if entry is not None:
+                counts = entry.counts
+                counts[op["emoji"]] = max(0, counts.get(op["emoji"], 0) + int(op["delta"]))
+        elif kind == "clear":
+            # emoji None: every reaction of the message was removed.
+            entry = self._by_message.get(int(op["message_id"]))
+            if entry is not None:
+                if op["emoji"] is None:
+                    entry.counts.clear()
+                else:
+                    entry.counts.pop(op["emoji"], None)
+        elif kind == "remove":
+            message_id = int(op["message_id"])
+            if self._by_message.pop(message_id, None) is not None:
+                for messages in self._threads.values():
+                    messages.pop(message_id, None)
+        elif kind == "ensure_thread":
+            self._threads.setdefault(int(op["thread_id"]), {})
+        elif kind == "discard_thread":
+            for message_id in self._threads.pop(int(op["thread_id"]), {}):
+                self._by_message.pop(message_id, None)
+
+    def tracked_emojis(self, kind: str):
+        if kind == "monthly":
+            return (self.monthly_vote_emoji, FALLBACK_VOTE_EMOJI)
+        return (self.vote_emoji, FALLBACK_VOTE_EMOJI)
+
+    def register(self, thread_id: int, message_id: int, kind: str, author_id: int, author_mention: str,
+                 image_url: str, counts: dict = None):
+        self.commit({"op": "register", "thread_id": thread_id, "message_id": message_id, "entry": {
+            "kind": kind,
+            "author_id": int(author_id),
+            "author_mention": author_mention,
+            "image_url": image_url,
+            "counts": dict(counts or {})
+        }})
+
+    def apply_reaction(self, message_id: int, emoji: str, delta: int) -> bool:
+        entry = self._by_message.get(message_id)
+        if entry is None or emoji not in self.tracked_emojis(entry.kind):
+            return False
+        self.commit({"op": "reaction", "message_id": message_id, "emoji": emoji, "delta": delta})
+        return True
+
+    def clear_reactions(self, message_id: int, emoji: str = None) -> bool:
+        # A moderator cleared the message's reactions, all or one emoji's.
+        entry = self._by_message.get(message_id)
+        if entry is None or (emoji is not None and emoji not in entry.counts):
+            return False
+        self.commit({"op": "clear", "message_id": message_id, "emoji": emoji})
+        return True
+
+    def remove_message(self, message_id: int) -> bool:
+        # A deleted entry: it can no longer win.
+        if message_id not in self._by_message:
+            return False
+        self.commit({"op": "remove", "message_id": message_id})
+        return True
+
+    def ensure_thread(self, thread_id: int):
+        if thread_id not in self._threads:
+            self.commit({"op": "ensure_thread", "thread_id": thread_id})
+
+    def has_thread(self, thread_id: int) -> bool:
+        return thread_id in self._threads
+
+    def thread_ids(self):
+        return list(self._threads)
+
+    def author_of(self, message_id: int):
+        entry = self._by_message.get(message_id)
+        return entry.author_id if entry is not None else None
+
+    def entries_for(self, thread_id: int, vote_emoji: str):
+        messages = self._threads.get(thread_id)
+        if messages is None:
+            return None
+        return [
+            {
+                "message_id": message_id,
+                "author_id": entry.author_id,
+                "author_mention": entry.author_mention,
+                "image_url": entry.image_url,
+                "votes": votes_from_counts(entry.counts, vote_emoji)
+            }
+            for message_id, entry in messages.items()
+        ]
+
+    def discard_thread(self, thread_id: int):
+        if thread_id in self._threads:
+            self.commit({"op": "discard_thread", "thread_id": thread_id})
+
+
+
+# Weekly submission index (one photo per author, persisted across restarts)
+class SubmissionIndex(JournaledStore):
+    def __init__(self, path: Path, **options):
+        super().__init__(path, **options)
+        self.call_at = None
+        self.last_seen_at = None
+        self._by_author = {}
+        self._by_message = {}
+        # Anything recorded before this process started may have missed gateway events.
+        self.stale = False
+        self.load()
+        self.stale = self.call_at is not None
+
+    @staticmethod
+    def _parse(value):
+        if not value:
+            return None
+        try:
+            return datetime.fromisoformat(value)
+        except Exception:
+            return None
+
+    def memory_parts(self):
+        return {"user_submissions": self._by_author, "by_message": self._by_message}
+
+    def snapshot(self):
+        return {
+            "call_at": self.call_at.isoformat() if self.call_at else None,
+            "last_seen_at": self.last_seen_at.isoformat() if self.last_seen_at else None,
+            "submissions": {str(a): sub.to_dict() for a, sub in self._by_author.items()}
+        }
+
+    def restore(self, data):
+        self.call_at = self._parse(data.get("call_at"))
+        self.last_seen_at = self._parse(data.get("last_seen_at"))
+        self._by_author = {}
+        self._by_message = {}
+        for author_id, sub in data.get("submissions", {}).items():
+            self._put(int(author_id), int(sub["message_id"]), sub["attachment_url"], sub["created_at"])
+
+    def apply(self, op):
+        kind = op["op"]
+        if kind == "start_week":
+            self.call_at = self._parse(op["call_at"])
+            self.last_seen_at = self.call_at
+            self._by_author = {}
+            self._by_message = {}
+        elif kind == "end_week":
+            self.call_at = None
+            self._by_author = {}
+            self._by_message = {}
+        elif kind == "add":
+            self._put(int(op["author_id"]), int(op["message_id"]), op["attachment_url"], op["created_at"])
+            created_at = self._parse(op["created_at"])
+            if self.last_seen_at is None or created_at > self.last_seen_at:
+                self.last_seen_at = created_at
+        elif kind == "remove":
+            author_id = self._by_message.pop(int(op["message_id"]), None)
+            if author_id is not None:
+                self._by_author.pop(author_id, None)
+
+    def _put(self, author_id: int, message_id: int, attachment_url: str, created_at_iso: str):
+        self._by_author[author_id] = Submission(message_id, attachment_url, created_at_iso)
+        self._by_message[message_id] = author_id
+
+    def start_week(self, call_at: datetime):
+        self.commit({"op": "start_week", "call_at": call_at.isoformat()})
+        self.stale = False
+
+    def end_week(self):
+        self.commit({"op": "end_week"})
+        self.stale = False
+
+    def mark_stale(self):
+        if self.call_at is not None:
+            self.stale = True
+
+    def has_submitted(self, author_id: int) -> bool:
+        return author_id in self._by_author
+
+    def add(self, author_id: int, message_id: int, attachment_url: str, created_at: datetime):
+        if author_id in self._by_author:
+            return False
+        self.commit({"op": "add", "author_id": author_id, "message_id": message_id,
+                     "attachment_url": attachment_url, "created_at": created_at.isoformat()})
+        return True
+
+    def remove_message(self, message_id: int) -> bool:
+        if message_id not in self._by_message:
+            return False
+        self.commit({"op": "remove", "message_id": message_id})
+        return True
+
+    def submissions(self):
+        subs = [dict(sub.to_dict(), author_id=author_id) for author_id, sub in self._by_author.items()]
+        subs.sort(key=lambda sub: sub["created_at"])
+        return subs
+
+    def __len__(self):
+        return len(self._by_author)
+
+
+
+# Perceptual hashes of every accepted submission and weekly winner, for
+# duplicate and repost detection. The lookup tables are rebuilt from the
+# flat list on load; only the list is persisted.
+class ImageHashIndex(JournaledStore):
+    def __init__(self, path: Path, **options):
+        super().__init__(path, **options)
+        self._images = []
+        self._by_url = {}
+        self._by_message = {}
+        self._index = HammingIndex()
+        self.load()
+
+    def memory_parts(self):
+        return {"images": self._images, "by_url": self._by_url, "by_message": self._by_message, "index": self._index}
+
+    def snapshot(self):
+        return {"images": self._images}
+
+    def restore(self, data):
+        self._images = []
+        self._by_url = {}
+        self._by_message = {}
+        self._index = HammingIndex()
+        for image in data.get("images", []):
+            self._put(dict(image))
+
+    def apply(self, op):
+        kind = op["op"]
+        if kind == "add":
+            self._put(dict(op["image"]))
+        elif kind == "mark_winner":
+            image = self._by_url.get(op["url"])
+            if image is not None:
+                image["winner"] = True
+        elif kind == "remove":
+            image = self._by_message.pop(op["message_id"], None)
+            if image is not None:
+                self._images.remove(image)
+                del self._by_url[image["url"]]
+                self._index.remove(int(image["hash"]), image)
+
+    def _put(self, image: dict):
+        self._images.append(image)
+        self._by_url[image["url"]] = image
+        if image["message_id"] is not None and not image["winner"]:
+            self._by_message[image["message_id"]] = image
+        self._index.add(int(image["hash"]), image)
+
+    def add(self, image_hash: int, url: str, author_id: int, message_id: int = None, created_at: datetime = None,
+            winner: bool = False):
+        if url in self._by_url:
+            return
+        self.commit({"op": "add", "image": {
+            "hash": image_hash,
+            "url": url,
+            "author_id": int(author_id),
+            "message_id": message_id,
+            "created_at": created_at.isoformat() if created_at else None,
+            "winner": winner,
+        }})
+
+    def mark_winner(self, url: str) -> bool:
+        image = self._by_url.get(url)
+        if image is None:
+            return False
+        if not image["winner"]:
+            self.commit({"op": "mark_winner", "url": url})
+        return True
+
+    def remove_message(self, message_id: int) -> bool:
+        # A deleted submission; winners stay, they still block reposts.
+        image = self._by_message.get(message_id)
+        if image is None or image["winner"]:
+            return False
+        self.commit({"op": "remove", "message_id": message_id})
+        return True
+
+    def has_url(self, url: str) -> bool:
+        return url in self._by_url
+
+    def near(self, image_hash: int, max_distance: int):
+        # Closest first.
+        return sorted(self._index.search(image_hash, max_distance), key=lambda m: m[0])
+
+    def __len__(self):
+        return len(self._images)
+
+
+# EXIF shooting data of accepted submissions and weekly winners, for
+# /recherche. Only the photos are persisted; the inverted index (search term
+# -> photo URLs, see exif.search_terms) is rebuilt on load and kept up to
+# date by every op, so a query is a few set intersections.
+class ExifIndex(JournaledStore):
+    def __init__(self, path: Path, **options):
+        super().__init__(path, **options)
+        self._photos = {}
+        self._by_message = {}
+        self._postings = {}
+        self._winners = set()
+        self.load()
+
+    def memory_parts(self):
+        return {"photos": self._photos, "by_message": self._by_message, "postings": self._postings, "winners": self._winners}
+
+    def snapshot(self):
+        return {"photos": list(self._photos.values())}
+
+    def restore(self, data):
+        self._photos = {}
+        self._by_message = {}
+        self._postings = {}
+        self._winners = set()
+        for photo in data.get("photos", []):
+            self._put(dict(photo))
+
+    def apply(self, op):
+        kind = op["op"]
+        if kind == "add":
+            self._put(dict(op["photo"]))
+        elif kind == "mark_winner":
+            photo = self._photos.get(op["url"])
+            if photo is not None:
+                photo["winner"] = True
+                self._winners.add(photo["url"])
+        elif kind == "remove":
+            url = self._by_message.pop(op["message_id"], None)
+            photo = self._photos.pop(url, None)
+            if photo is not None:
+                for term in search_terms(photo["exif"]):
+                    urls = self._postings[term]
+                    urls.discard(url)
+                    if not urls:
+                        del self._postings[term]
+                self._winners.discard(url)
+
+    def _put(self, photo: dict):
+        url = photo["url"]
+        self._photos[url] = photo
+        if photo.get("message_id") is not None:
+            self._by_message[photo["message_id"]] = url
+        for term in search_terms(photo["exif"]):
+            self._postings.setdefault(term, set()).add(url)
+        if photo["winner"]:
+            self._winners.add(url)
+
+    def add(self, url: str, author_id: int, info: dict, message_id: int = None, created_at: datetime = None,
+            winner: bool = False):
+        if url in self._photos:
+            return
+        self.commit({"op": "add", "photo": {
+            "url": url,
+            "author_id": int(author_id),
+            "message_id": message_id,
+            "created_at": created_at.isoformat() if created_at else None,
+            "winner": winner,
+            "exif": info,
+        }})
+
+    def mark_winner(self, url: str) -> bool:
+        photo = self._photos.get(url)
+        if photo is None:
+            return False
+        if not photo["winner"]:
+            self.commit({"op": "mark_winner", "url": url})
+        return True
+
+    def remove_message(self, message_id: int) -> bool:
+        if message_id not in self._by_message:
+            return False
+        self.commit({"op": "remove", "message_id": message_id})
+        return True
+
+    def has_url(self, url: str) -> bool:
+        return url in self._photos
+
+    def search(self, terms, winners_only: bool = False, limit: int = 10):
+        # (number of matches, first `limit` of them, latest shot first). All
+        # terms must match; smallest posting set first.
+        sets = [self._postings.get(term, set()) for term in terms]
+        if winners_only:
+            sets.append(self._winners)
+        if sets:
+            sets.sort(key=len)
+            urls = set(sets[0])
+            for s in sets[1:]:
+                if not urls:
+                    break
+                urls &= s
+        else:
+            urls = self._photos.keys()
+        photos = heapq.nlargest(limit, (self._photos[u] for u in urls),
+                                key=lambda p: p["exif"].get("taken_at") or p["created_at"] or "")
+        return len(urls), photos
+
+    def __len__(self):
+        return len(self._photos)
+
+
+# Ranked ballots of the vote threads opened in ranked mode. A ballot is the
+# voter's ranking as indexes into the thread's list of ranked photos, -1 for
+# an empty slot, so a thousand five-photo ballots take a few kilobytes.
+class BallotBox(JournaledStore):
+    def __init__(self, path: Path, **options):
+        super().__init__(path, **options)
+        self._threads = {}
+        self.load()
+
+    def memory_parts(self):
+        return {"threads": self._threads}
+
+    def snapshot(self):
+        return {"threads": {
+            str(thread_id): {
+                "open": t["open"],
+                "size": t["size"],
+                "entries": t["entries"],
+                "ballots": {str(voter_id): ballot for voter_id, ballot in t["ballots"].items()},
+            }
+            for thread_id, t in self._threads.items()
+        }}
+
+    def restore(self, data):
+        self._threads = {}
+        for thread_id, t in data.get("threads", {}).items():
+            self._threads[int(thread_id)] = {
+                "open": t["open"],
+                "size": t["size"],
+                "entries": list(t["entries"]),
+                "index": {message_id: i for i, message_id in enumerate(t["entries"])},
+                "ballots": {int(voter_id): list(ballot) for voter_id, ballot in t["ballots"].items()},
+            }
+
+    def apply(self, op):
+        kind = op["op"]
+        thread_id = int(op["thread_id"])
+        if kind == "open":
+            self._threads[thread_id] = {"open": True, "size": int(op["size"]), "entries": [], "index": {},
+                                        "ballots": {}}
+            return
+        t = self._threads.get(thread_id)
+        if t is None:
+            return
+        if kind == "rank":
+            message_id = int(op["message_id"])
+            i = t["index"].get(message_id)
+            if i is None:
+                i = t["index"][message_id] = len(t["entries"])
+                t["entries"].append(message_id)
+            voter_id = int(op["voter_id"])
+            ballot = [x if x != i else -1 for x in t["ballots"].get(voter_id, [])]
+            rank = op["rank"]
+            if rank is not None:
+                ballot += [-1] * (rank + 1 - len(ballot))
+                ballot[rank] = i
+            while ballot and ballot[-1] == -1:
+                ballot.pop()
+            if ballot:
+                t["ballots"][voter_id] = ballot
+            else:
+                t["ballots"].pop(voter_id, None)
+        elif kind == "close":
+            t["open"] = False
+        elif kind == "discard":
+            del self._threads[thread_id]
+
+    def open_thread(self, thread_id: int, size: int):
+        self.commit({"op": "open", "thread_id": thread_id, "size": size})
+
+    def has_thread(self, thread_id: int) -> bool:
+        return thread_id in self._threads
+
+    def is_open(self, thread_id: int) -> bool:
+        t = self._threads.get(thread_id)
+        return t is not None and t["open"]
+
+    def size(self, thread_id: int) -> int:
+        # Photos a ballot of this thread can rank.
+        t = self._threads.get(thread_id)
+        return t["size"] if t is not None else 0
+
+    def rank(self, thread_id: int, voter_id: int, message_id: int, rank):
+        # Puts the photo at 0-based `rank` on the voter's ballot (None takes
+        # it off), replacing whatever was there. Returns the new ballot.
+        t = self._threads[thread_id]
+        if rank is not None and not 0 <= rank < t["size"]:
+            raise ValueError(f"rank {rank} outside a {t['size']}-photo ballot")
+        self.commit({"op": "rank", "thread_id": thread_id, "voter_id": voter_id, "message_id": message_id,
+                     "rank": rank})
+        return self.ballot(thread_id, voter_id)
+
+    def ballot(self, thread_id: int, voter_id: int):
+        # Message ids best first, None for an empty slot.
+        t = self._threads.get(thread_id)
+        if t is None:
+            return []
+        return [t["entries"][i] if i >= 0 else None for i in t["ballots"].get(voter_id, [])]
+
+    def ballots(self, thread_id: int):
+        t = self._threads.get(thread_id)
+        if t is None:
+            return []
+        entries = t["entries"]
+        return [[entries[i] if i >= 0 else None for i in ballot] for ballot in t["ballots"].values()]
+
+    def ranked_counts(self, thread_id: int) -> dict:
+        # message id -> number of ballots ranking that photo.
+        t = self._threads.get(thread_id)
+        if t is None:
+            return {}
+        counts = Counter(i for ballot in t["ballots"].values() for i in ballot if i >= 0)
+        return {t["entries"][i]: count for i, count in counts.items()}
+
+    def close_thread(self, thread_id: int):
+        if self.is_open(thread_id):
+            self.commit({"op": "close", "thread_id": thread_id})
+
+    def discard_thread(self, thread_id: int):
+        if thread_id in self._threads:
+            self.commit({"op": "discard", "thread_id": thread_id})
+
+
+class ResultNotices(JournaledStore):
+    # Result DMs still to send, one fan-out per closed thread. Each recipient
+    # is settled (sent, or DMs closed) once; the cursor is the first index not
+    # settled yet and `settled` holds the ones past it that finished early, so
+    # a restart resends nothing.
+    def __init__(self, path: Path, **options):
+        super().__init__(path, **options)
+        self._fanouts = {}
+        self.load()
+
+    def memory_parts(self):
+        return {"fanouts": self._fanouts}
+
+    def snapshot(self):
+        return {"fanouts": {
+            str(thread_id): dict(f, settled=sorted(f["settled"])) for thread_id, f in self._fanouts.items()
+        }}
+
+    def restore(self, data):
+        self._fanouts = {}
+        for thread_id, f in data.get("fanouts", {}).items():
+            self._fanouts[int(thread_id)] = {
+                "kind": f["kind"],
+                "jump_url": f["jump_url"],
+                "ranked": f["ranked"],
+                "recipients": [list(r) for r in f["recipients"]],
+                "cursor": f["cursor"],
+                "settled": set(f["settled"]),
+            }
+
+    def apply(self, op):
+        kind = op["op"]
+        thread_id = int(op["thread_id"])
+        if kind == "queue":
+            self._fanouts[thread_id] = {"kind": op["kind"], "jump_url": op["jump_url"], "ranked": op["ranked"],
+                                        "recipients": [list(r) for r in op["recipients"]], "cursor": 0,
+                                        "settled": set()}
+            return
+        f = self._fanouts.get(thread_id)
+        if f is None:
+            return
+        if kind == "settle":
+            f["settled"].add(int(op["index"]))
+            while f["cursor"] in f["settled"]:
+                f["settled"].discard(f["cursor"])
+                f["cursor"] += 1
+            if f["cursor"] >= len(f["recipients"]):
+                del self._fanouts[thread_id]
+
+    def queue(self, thread_id: int, kind: str, jump_url: str, ranked: bool, recipients):
+        # recipients: (author_id, rank, votes, tied) from participant_ranks.
+        if thread_id in self._fanouts or not recipients:
+            return
+        self.commit({"op": "queue", "thread_id": thread_id, "kind": kind, "jump_url": jump_url, "ranked": ranked,
+                     "recipients": [list(r) for r in recipients]})
+
+    def pending(self):
+        # (thread_id, fan-out) for every fan-out with recipients left.
+        return list(self._fanouts.items())
+
+    def unsettled(self, thread_id: int):
+        # (index, recipient) still to send, in order.
+        f = self._fanouts.get(thread_id)
+        if f is None:
+            return []
+        return [(i, f["recipients"][i]) for i in range(f["cursor"], len(f["recipients"])) if i not in f["settled"]]
+
+    def settle(self, thread_id: int, index: int):
+        if thread_id in self._fanouts:
+            self.commit({"op": "settle", "thread_id": thread_id, "index": index})
@@ -0,0 +1,64 @@
+import json
+import asyncio
+import hashlib
+
+
+class TaskSupervisor:
+    # Owns the bot's long-lived tasks. ensure() is idempotent per name, so
+    # calling it again on a gateway reconnect never starts a duplicate, and a
+    # task that crashes is restarted with exponential backoff.
+
+    def __init__(self, restart_delay: float = 5.0, max_restart_delay: float = 300.0):
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self._tasks = {}
+        self._restarts = {}
+        self._errors = {}
+
+    def ensure(self, name: str, factory, restart: bool = True) -> asyncio.Task:
+        task = self._tasks.get(name)
+        if task is not None and not task.done():
+            return task
+        task = asyncio.get_running_loop().create_task(self._supervise(name, factory, restart), name=name)
+        self._tasks[name] = task
+        return task
+
+    async def _supervise(self, name: str, factory, restart: bool):
+        delay = self.restart_delay
+        while True:
+            try:
+                await factory()
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._errors[name] = repr(e)
+                print(f"TaskSupervisor: {name} crashed:", e)
+                if not restart:
+                    return
+            self._restarts[name] = self._restarts.get(name, 0) + 1
+            print(f"TaskSupervisor: restarting {name} in {delay:.0f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_restart_delay)
+
+    def status(self):
+        return {
+            name: {
+                "running": not task.done(),
+                "restarts": self._restarts.get(name, 0),
+                "last_error": self._errors.get(name),
+            }
+            for name, task in self._tasks.items()
+        }
+
+    async def stop_all(self):
+        tasks = [t for t in self._tasks.values() if not t.done()]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def command_tree_hash(tree, application_id) -> str:
+    payload = sorted((cmd.to_dict(tree) for cmd in tree.get_commands()), key=lambda c: c["name"])
+    blob = json.dumps({"application_id": application_id, "commands": payload}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
@@ -0,0 +1,79 @@
+import asyncio
+from collections import OrderedDict
+
+import discord
+
+from contest_logic import FALLBACK_VOTE_EMOJI, unique_votes
+
+# Exact vote counting: instead of trusting reaction.count, list who reacted
+# to each entry. One close walks every entry's reaction users concurrently,
+# so a 200-photo thread takes about as long as its most-voted entry.
+
+REACTION_PAGE_SIZE = 100  # Discord's maximum for GET .../reactions/{emoji}
+
+
+def reaction_route(emoji: str) -> str:
+    # The emoji as the reactions route wants it: unicode as is, a custom
+    # emoji ("<:vote:123…>", what add_reaction accepts) as "vote:123…".
+    return discord.PartialEmoji.from_str(emoji)._as_reaction()
+
+
+class VoterCounter:
+    def __init__(self, http, concurrency: int = 8, max_cached: int = 5000):
+        self.http = http
+        self.concurrency = concurrency
+        self.max_cached = max_cached
+        # message_id -> {emoji: pages of user ids}, LRU by message. Reaction
+        # events drop a message's pages, so a re-run only fetches the entries
+        # whose votes changed.
+        self._pages = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "pages": 0, "errors": 0}
+
+    def invalidate(self, message_id: int):
+        self._pages.pop(message_id, None)
+
+    async def voters(self, channel_id: int, message_id: int, emoji: str) -> set:
+        cached = self._pages.get(message_id)
+        if cached is not None and emoji in cached:
+            self._pages.move_to_end(message_id)
+            self.stats["hits"] += 1
+            return {user_id for page in cached[emoji] for user_id in page}
+
+        self.stats["misses"] += 1
+        pages = []
+        after = None
+        route_emoji = reaction_route(emoji)
+        while True:
+            data = await self.http.get_reaction_users(channel_id, message_id, route_emoji, REACTION_PAGE_SIZE,
+                                                      after=after)
+            self.stats["pages"] += 1
+            page = [int(user["id"]) for user in data]
+            if page:
+                pages.append(page)
+            if len(data) < REACTION_PAGE_SIZE:
+                break
+            after = page[-1]
+
+        self._pages.setdefault(message_id, {})[emoji] = pages
+        self._pages.move_to_end(message_id)
+        while len(self._pages) > self.max_cached:
+            self._pages.popitem(last=False)
+        return {user_id for page in pages for user_id in page}
+
+    async def count(self, channel_id: int, entries, vote_emoji: str, bot_id: int):
+        # Returns a copy of entries with "votes" recomputed from reaction users.
+        # An entry whose users cannot be listed keeps its tally count.
+        semaphore = asyncio.Semaphore(self.concurrency)
+        emojis = (vote_emoji,) if vote_emoji == FALLBACK_VOTE_EMOJI else (vote_emoji, FALLBACK_VOTE_EMOJI)
+
+        async def count_entry(entry):
+            async with semaphore:
+                try:
+                    voter_sets = [await self.voters(channel_id, entry["message_id"], emoji) for emoji in emojis]
+                except discord.HTTPException as e:
+                    self.stats["errors"] += 1
+                    print(f"VoterCounter: keeping tally count for message {entry['message_id']}:", e)
+                    return entry
+            return dict(entry, votes=unique_votes(voter_sets, {bot_id, entry["author_id"]}))
+
+        return await asyncio.gather(*(count_entry(e) for e in entries))
@@ -0,0 +1,345 @@
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import itertools
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# Heavy contest jobs (results recording, gallery builds) run in a
+# child process so the gateway loop never shares the GIL with them. The
+# gateway talks to it over the child's stdin/stdout, one JSON object per line:
+#
+#   gateway -> worker   {"id": 7, "kind": "gallery", "params": {...}}
+#                       {"cancel": 7}
+#   worker -> gateway   {"id": 7, "progress": [done, total]}
+#                       {"id": 7, "result": ...} | {"id": 7, "error": "..."}
+#                       {"id": 7, "cancelled": true}
+#
+# Jobs are plain functions job(params, job) in JOBS; they call
+# job.progress(done, total) now and then, which is also where a cancellation
+# takes effect. A job that ignores it is stopped by killing the worker, which
+# the gateway then restarts.
+
+PROGRESS_INTERVAL = 0.5
+_STREAM_LIMIT = 16 * 1024 * 1024
+
+
+class JobError(RuntimeError):
+    pass
+
+
+class JobCancelled(JobError):
+    pass
+
+
+class Job:
+    def __init__(self, job_id: int, report):
+        self.id = job_id
+        self.cancelled = threading.Event()
+        self._report = report
+        self._last = 0.0
+
+    def progress(self, done: int, total: int = None):
+        if self.cancelled.is_set():
+            raise JobCancelled(f"job {self.id} cancelled")
+        now = time.monotonic()
+        if now - self._last >= PROGRESS_INTERVAL or done == total:
+            self._last = now
+            self._report(done, total)
+
+
+# --- jobs (run in the worker process) ---
+
+_results_dbs = {}
+
+
+def _results_db(path: str):
+    from results_db import ResultsDB
+    db = _results_dbs.get(path)
+    if db is None:
+        db = _results_dbs[path] = ResultsDB(Path(path))
+    return db
+
+
+def job_record_results(params: dict, job: Job):
+    _results_db(params["db"]).record_contest(
+        params["contest_type"], params["week_no"], params["thread_id"], params["entries"],
+        params["winner_ids"], params["closed_at"]
+    )
+    return None
+
+
+def job_gallery(params: dict, job: Job):
+    import gallery
+    from blobcache import BlobCache
+    blobs = BlobCache(Path(params["blobs"]), max_bytes=1 << 62)
+    winners = gallery.collect_winners(_results_db(params["db"]), params["weekly"], blobs)
+    # JSON object keys are strings.
+    names = {int(k): v for k, v in params["names"].items()}
+    return gallery.build_gallery(Path(params["out"]), winners, names, params["title"], params["workers"],
+                                 progress=job.progress)
+
+
+def job_ping(params: dict, job: Job):
+    return {"pid": os.getpid()}
+
+
+JOBS = {
+    "record_results": job_record_results,
+    "gallery": job_gallery,
+    "ping": job_ping,
+}
+
+
+def serve(concurrency: int = 2):
+    # Worker process main loop. The protocol owns the real stdout; anything
+    # the jobs print goes to stderr, i.e. the bot's log.
+    out = os.fdopen(os.dup(sys.stdout.fileno()), "w", encoding="utf-8", buffering=1)
+    sys.stdout = sys.stderr
+    # Same for stdin: a process forked by a job (the gallery's renderers)
+    # closes sys.stdin on start, which would deadlock on the buffer lock held
+    # by the blocked read below.
+    inp = os.fdopen(os.dup(sys.stdin.fileno()), "r", encoding="utf-8")
+    sys.stdin = open(os.devnull)
+    out_lock = threading.Lock()
+    jobs = {}
+
+    def send(msg: dict):
+        line = json.dumps(msg, ensure_ascii=False, default=str, separators=(",", ":"))
+        with out_lock:
+            out.write(line + "\n")
+
+    def execute(job: Job, kind: str, params: dict):
+        try:
+            msg = {"id": job.id, "result": JOBS[kind](params, job)}
+        except JobCancelled:
+            msg = {"id": job.id, "cancelled": True}
+        except Exception as e:
+            msg = {"id": job.id, "error": f"{type(e).__name__}: {e}"}
+        jobs.pop(job.id, None)
+        send(msg)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for line in inp:
+            try:
+                msg = json.loads(line)
+            except ValueError:
+                continue
+            if "cancel" in msg:
+                job = jobs.get(msg["cancel"])
+                if job is not None:
+                    job.cancelled.set()
+                continue
+            job_id = msg["id"]
+            if msg.get("kind") not in JOBS:
+                send({"id": job_id, "error": f"unknown job {msg.get('kind')!r}"})
+                continue
+            job = jobs[job_id] = Job(job_id, lambda done, total, i=job_id: send({"id": i, "progress": [done, total]}))
+            pool.submit(execute, job, msg["kind"], msg.get("params") or {})
+        # stdin closed: the bot is gone; let running jobs finish their writes.
+        for job in jobs.values():
+            job.cancelled.set()
+
+
+# --- gateway side ---
+
+class _Pending:
+    __slots__ = ("kind", "future", "on_progress", "started", "progress", "job")
+
+    def __init__(self, kind, future, on_progress):
+        self.kind = kind
+        self.future = future
+        self.on_progress = on_progress
+        self.started = time.monotonic()
+        self.progress = None
+        self.job = None
+
+
+class JobWorker:
+    # Gateway-side handle on the worker process. run() is the only entry
+    # point; the process is started on first use and again after it died,
+    # with a growing delay if it keeps dying. With enabled=False jobs run in a
+    # thread of the bot process instead (same JOBS, same progress and
+    # cooperative cancellation, but no kill for a stuck job).
+
+    def __init__(self, enabled: bool = True, job_timeout: float = 600.0, kill_grace: float = 10.0,
+                 concurrency: int = 2, restart_delay: float = 1.0, max_restart_delay: float = 60.0):
+        self.enabled = enabled
+        self.job_timeout = job_timeout
+        self.kill_grace = kill_grace
+        self.concurrency = concurrency
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self._proc = None
+        self._reader = None
+        self._start_lock = None
+        self._next_delay = 0.0
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self.stats = {"completed": 0, "failed": 0, "cancelled": 0, "restarts": 0}
+
+    # --- process lifecycle ---
+    async def _ensure_started(self):
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._proc is not None and self._proc.returncode is None:
+                return
+            if self._proc is not None:
+                self.stats["restarts"] += 1
+                await asyncio.sleep(self._next_delay)
+                self._next_delay = min(max(self._next_delay * 2, self.restart_delay), self.max_restart_delay)
+            self._proc = await asyncio.create_subprocess_exec(
+                sys.executable, str(Path(__file__).resolve()), str(self.concurrency),
+                stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, limit=_STREAM_LIMIT,
+                # Own process group, so a kill also takes the job's renderers.
+                start_new_session=True,
+            )
+            self._reader = asyncio.get_running_loop().create_task(self._read(self._proc), name="worker_reader")
+
+    async def _read(self, proc):
+        while True:
+            line = await proc.stdout.readline()
+            if not line:
+                break
+            try:
+                msg = json.loads(line)
+            except ValueError:
+                continue
+            pending = self._pending.get(msg.get("id"))
+            if pending is None:
+                continue
+            if "progress" in msg:
+                pending.progress = tuple(msg["progress"])
+                if pending.on_progress is not None:
+                    pending.on_progress(*pending.progress)
+                continue
+            self._settle(msg["id"], msg)
+        await proc.wait()
+        print(f"JobWorker: worker process exited with status {proc.returncode}")
+        for job_id in list(self._pending):
+            if self._pending[job_id].job is proc:
+                self._settle(job_id, {"error": f"worker exited with status {proc.returncode}"})
+
+    def _settle(self, job_id: int, msg: dict):
+        pending = self._pending.pop(job_id, None)
+        if pending is None or pending.future.done():
+            return
+        if "result" in msg:
+            self.stats["completed"] += 1
+            self._next_delay = 0.0
+            pending.future.set_result(msg["result"])
+        elif msg.get("cancelled"):
+            self.stats["cancelled"] += 1
+            pending.future.set_exception(JobCancelled(f"{pending.kind} job {job_id} cancelled"))
+        else:
+            self.stats["failed"] += 1
+            pending.future.set_exception(JobError(f"{pending.kind} job {job_id} failed: {msg.get('error')}"))
+
+    # --- jobs ---
+    async def run(self, kind: str, params: dict, timeout: float = None, on_progress=None):
+        # Returns the job's result; raises JobError, or JobCancelled when it
+        # was cancelled or ran past its timeout.
+        loop = asyncio.get_running_loop()
+        job_id = next(self._ids)
+        pending = _Pending(kind, loop.create_future(), on_progress)
+        self._pending[job_id] = pending
+        try:
+            if self.enabled:
+                await self._ensure_started()
+                pending.job = self._proc
+                line = json.dumps({"id": job_id, "kind": kind, "params": params}, ensure_ascii=False, default=str)
+                self._proc.stdin.write(line.encode("utf-8") + b"\n")
+                await self._proc.stdin.drain()
+            else:
+                pending.job = Job(job_id, lambda done, total: loop.call_soon_threadsafe(self._progress, job_id, done, total))
+                loop.create_task(self._run_inline(job_id, kind, params, pending.job))
+            try:
+                return await asyncio.wait_for(asyncio.shield(pending.future), timeout or self.job_timeout)
+            except asyncio.TimeoutError:
+                print(f"JobWorker: {kind} job {job_id} timed out, cancelling")
+                self.cancel(job_id)
+                return await pending.future
+        except asyncio.CancelledError:
+            self.cancel(job_id)
+            raise
+        finally:
+            if self._pending.get(job_id) is pending and pending.future.done():
+                del self._pending[job_id]
+
+    def _progress(self, job_id: int, done, total):
+        pending = self._pending.get(job_id)
+        if pending is not None:
+            pending.progress = (done, total)
+            if pending.on_progress is not None:
+                pending.on_progress(done, total)
+
+    async def _run_inline(self, job_id: int, kind: str, params: dict, job: Job):
+        try:
+            msg = {"result": await asyncio.to_thread(JOBS[kind], params, job)}
+        except JobCancelled:
+            msg = {"cancelled": True}
+        except Exception as e:
+            msg = {"error": f"{type(e).__name__}: {e}"}
+        self._settle(job_id, msg)
+
+    def cancel(self, job_id: int) -> bool:
+        pending = self._pending.get(job_id)
+        if pending is None or pending.future.done():
+            return False
+        if isinstance(pending.job, Job):
+            pending.job.cancelled.set()
+            return True
+        proc = pending.job
+        if proc is None or proc.returncode is not None:
+            return False
+        try:
+            proc.stdin.write(json.dumps({"cancel": job_id}).encode("utf-8") + b"\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        asyncio.get_running_loop().call_later(self.kill_grace, self._kill_if_stuck, job_id, proc)
+        return True
+
+    def _kill_if_stuck(self, job_id: int, proc):
+        # The job ignored the cancellation: every job in this process goes
+        # down with it (they fail with JobError) and the next run() restarts it.
+        if job_id not in self._pending or proc.returncode is not None:
+            return
+        print(f"JobWorker: job {job_id} did not stop, killing worker process {proc.pid}")
+        self._settle(job_id, {"cancelled": True})
+        self._kill(proc)
+
+    @staticmethod
+    def _kill(proc):
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def running(self):
+        now = time.monotonic()
+        return [
+            {"id": job_id, "kind": p.kind, "elapsed": now - p.started, "progress": p.progress}
+            for job_id, p in self._pending.items()
+        ]
+
+    async def stop(self):
+        proc = self._proc
+        if proc is None or proc.returncode is not None:
+            return
+        proc.stdin.close()
+        try:
+            await asyncio.wait_for(proc.wait(), self.kill_grace)
+        except asyncio.TimeoutError:
+            self._kill(proc)
+            await proc.wait()
+        if self._reader is not None:
+            await self._reader
+
+
+if __name__ == "__main__":
+    serve(int(sys.argv[1]) if len(sys.argv) > 1 else 2)